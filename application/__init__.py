@@ -10,12 +10,15 @@ from flask_limiter.util import get_remote_address
 from datetime import datetime
 from jinja2 import filters
 from config import config_by_name
+import atexit
+import copy
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from sqlalchemy.exc import OperationalError
 from sqlalchemy import text
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from pythonjsonlogger import json
 import colorlog
 from uuid import uuid4
 import json as pyjson
@@ -31,61 +34,119 @@ login_manager = LoginManager()
 login_manager.login_message_category = "alert-info"
 login_manager.session_protection = "strong"
 
+from application.audit import audit_writer
+from application.jobs import job_runner
+from application.pdf_cache import pdf_cache
+from application.passwords import password_verifier
+from application.grading import init_grade_scale
+
 # Define Nigeria timezone (WAT, UTC+1)
 NIGERIA_TZ = pytz.timezone('Africa/Lagos')
 
-class PrettyJsonFormatter(json.JsonFormatter):
-    """Custom JSON formatter with pretty printing and request context."""
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
+class CompactJsonFormatter(logging.Formatter):
+    """Single-line JSON formatter; request fields are captured on the request thread by RequestContextFilter."""
     def format(self, record):
-        record.asctime = self.formatTime(record, self.datefmt)
-        nigeria_time = datetime.now(NIGERIA_TZ)
-        log_record = self.process_log_record(record.__dict__.copy())
-
-        if has_request_context():
-            log_record['blueprint'] = request.blueprint or "no-blueprint"
-            log_record['endpoint'] = request.endpoint or "no-endpoint"
-            log_record['url'] = request.url
-            log_record['request_id'] = getattr(request, 'request_id', 'no-request-id')
-        else:
-            log_record['blueprint'] = None
-            log_record['endpoint'] = None
-            log_record['url'] = None
-            log_record['request_id'] = None
-        log_record['timestamp'] = nigeria_time.isoformat()
-
-        filtered_record = {
+        nigeria_time = datetime.fromtimestamp(record.created, NIGERIA_TZ)
+        log_record = {
             'asctime': nigeria_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'name': log_record['name'],
-            'levelname': log_record['levelname'],
-            'pathname': log_record['pathname'],
-            'lineno': log_record['lineno'],
-            'funcName': log_record['funcName'],
+            'name': record.name,
+            'levelname': record.levelname,
+            'pathname': record.pathname,
+            'lineno': record.lineno,
+            'funcName': record.funcName,
             'message': record.getMessage(),
-            'blueprint': log_record['blueprint'],
-            'endpoint': log_record['endpoint'],
-            'url': log_record['url'],
-            'request_id': log_record['request_id'],
-            'timestamp': log_record['timestamp'],
-            'exc_info': str(record.exc_info) if record.exc_info else None
+            'blueprint': getattr(record, 'blueprint', None),
+            'endpoint': getattr(record, 'endpoint', None),
+            'url': getattr(record, 'url', None),
+            'request_id': getattr(record, 'request_id', None),
+            'timestamp': nigeria_time.isoformat(),
         }
+        if record.exc_info:
+            log_record['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            log_record['exc_info'] = record.exc_text
+        return pyjson.dumps(log_record, ensure_ascii=False, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Copy request details onto the record before it leaves the request thread."""
+    def filter(self, record):
+        if has_request_context():
+            record.blueprint = request.blueprint or "no-blueprint"
+            record.endpoint = request.endpoint or "no-endpoint"
+            record.url = request.url
+            record.request_id = getattr(request, 'request_id', 'no-request-id')
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a configured fraction of sub-WARNING records per logger; warnings and errors always pass."""
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        return rate is None or random.random() < rate
+
+class ProcessLocalQueueListener(QueueListener):
+    """QueueListener whose thread is started on first use in each process.
+
+    The app is created at import time, so a preloading server (gunicorn --preload) builds the listener in the
+    master; a thread started there would not exist in the forked workers and their logs would never be written.
+    """
+    def __init__(self, queue, *handlers, **kwargs):
+        super().__init__(queue, *handlers, **kwargs)
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # After a fork the parent's thread object came along without its thread
+            self._thread = None
+            self._pid = os.getpid()
+            self.start()
+
+    def running(self):
+        """Whether this process's listener thread is up."""
+        return self._pid == os.getpid() and self._thread is not None
+
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler that keeps exception text and extra attributes for the listener thread."""
+    def __init__(self, queue, listener=None):
+        super().__init__(queue)
+        self.listener = listener
+
+    def enqueue(self, record):
+        if self.listener is not None:
+            self.listener.ensure_started()
+        # Never block a request on logging; drop the record if the listener has fallen behind
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
 
-        return pyjson.dumps(filtered_record, indent=2, ensure_ascii=False) + "\n"
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+_log_listener = None
 
 @login_manager.user_loader
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=1, max=10),
-    retry=retry_if_exception_type(OperationalError)
-)
 def load_user(user_id):
     from .models import User
     try:
         user_id_int = int(user_id)
-        db.session.execute(text("SELECT 1"))
-        user = User.query.get(user_id_int)
+        user = User.load_cached(user_id_int)
         if user and user.active:
             app.logger.debug(f"User {user.username} (ID: {user_id}) loaded successfully",
                            extra={"user_id": user_id, "username": user.username})
@@ -108,7 +169,8 @@ def datetimeformat(value, format_string="%d %B %Y"):
     return value.strftime(format_string) if hasattr(value, 'strftime') else value
 
 def setup_logging(app):
-    """Configure advanced logging with pretty-printed JSON for files."""
+    """Route app and SQLAlchemy logs through a queue so formatting and file I/O happen off the request thread."""
+    global _log_listener
     log_dir = app.config.get("LOG_DIR", "/home/gigo/AAIS/logs")
     if not os.path.exists(log_dir):
         try:
@@ -119,11 +181,7 @@ def setup_logging(app):
 
     if app.logger.handlers:
         app.logger.handlers.clear()
-
-    json_formatter = PrettyJsonFormatter(
-        '%(asctime)s %(name)s %(levelname)s %(pathname)s %(lineno)d %(funcName)s %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    stop_log_listener()
 
     color_formatter = colorlog.ColoredFormatter(
         "%(log_color)s%(asctime)s - %(name)s - %(levelname)s - "
@@ -131,28 +189,41 @@ def setup_logging(app):
         datefmt="%Y-%m-%d %H:%M:%S"
     )
 
+    output_handlers = []
     if os.getenv("PYTHONANYWHERE") != "true":
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(color_formatter)
-        app.logger.addHandler(console_handler)
+        output_handlers.append(console_handler)
 
     file_handler = RotatingFileHandler(
         os.path.join(log_dir, "flask_app.log"),
-        maxBytes=50480,
-        backupCount=5
+        maxBytes=app.config.get("LOG_MAX_BYTES", 10 * 1024 * 1024),
+        backupCount=app.config.get("LOG_BACKUP_COUNT", 5),
+        delay=True
     )
     file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(json_formatter)
+    file_handler.setFormatter(CompactJsonFormatter())
+    output_handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=app.config.get("LOG_QUEUE_SIZE", 10000))
+    # Started by the first record each process logs, not here
+    _log_listener = ProcessLocalQueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    queue_handler = ContextQueueHandler(log_queue, _log_listener)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(app.config.get("LOG_SAMPLING", {})))
 
-    app.logger.addHandler(file_handler)
+    app.logger.addHandler(queue_handler)
     app.logger.setLevel(logging.INFO)
 
     sqlalchemy_logger = logging.getLogger('sqlalchemy.engine')
     sqlalchemy_logger.handlers.clear()
-    sqlalchemy_logger.addHandler(file_handler)
+    sqlalchemy_logger.addHandler(queue_handler)
     sqlalchemy_logger.setLevel(logging.WARNING)
 
+    for logger_name, level in app.config.get("LOG_LEVELS", {}).items():
+        logging.getLogger(logger_name).setLevel(level)
+
     @app.before_request
     def add_request_id():
         request.request_id = str(uuid4())
@@ -160,6 +231,14 @@ def setup_logging(app):
 
     app.logger.info("Advanced logging setup complete", extra={"env": app.config.get("FLASK_ENV", "unknown")})
 
+@atexit.register
+def stop_log_listener():
+    """Drain the log queue and close the output handlers."""
+    if _log_listener is not None and _log_listener.running():
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+
 def create_app(config_name=None):
     """Create and configure the Flask application."""
     app = Flask(__name__)
@@ -172,6 +251,7 @@ def create_app(config_name=None):
     # Call init_app for configuration-specific validation
     if hasattr(config_by_name[env], "init_app"):
         config_by_name[env].init_app(app)
+    init_grade_scale(app)
 
     session_config = {
         "SESSION_COOKIE_HTTPONLY": True,
@@ -194,6 +274,7 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"  # Matches /portal
     bcrypt.init_app(app)
+    password_verifier.init_app(app)
     try:
         limiter.init_app(app)
     except Exception as e:
@@ -201,6 +282,14 @@ def create_app(config_name=None):
         raise RuntimeError("Failed to initialize Flask-Limiter.") from e
 
     setup_logging(app)
+    audit_writer.init_app(app)
+    job_runner.init_app(app)
+    pdf_cache.init_app(app)
+
+    @app.before_request
+    def reset_request_caches():
+        from application.models import Session
+        Session.invalidate_current_session_cache()
 
     from application.auth.routes import auth_bp
     from application.admin.routes import admin_bp
@@ -219,6 +308,15 @@ def create_app(config_name=None):
         app.logger.error(f"Error registering blueprints: {str(e)}", exc_info=True)
         raise RuntimeError("Failed to register blueprints.") from e
 
+    from application.report_cards import report_cards_cli
+    app.cli.add_command(report_cards_cli)
+    from application.enrollment import enrollment_cli
+    app.cli.add_command(enrollment_cli)
+    from application.search import search_cli
+    app.cli.add_command(search_cli)
+    from application.student_import import student_import_cli
+    app.cli.add_command(student_import_cli)
+
     @app.errorhandler(404)
     def not_found_error(error):
         app.logger.warning(f"404 Error: {error}", extra={"path": request.path})
@@ -1,23 +1,42 @@
 from datetime import datetime
 from urllib.parse import unquote
-from sqlalchemy import func, or_, case
-from sqlalchemy.orm import joinedload
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload, contains_eager
 from sqlalchemy.exc import OperationalError, IntegrityError
 from sqlalchemy.sql import text
 from flask import (
-    render_template, redirect, url_for, flash, make_response, request, Response, jsonify, current_app as app, session
+    render_template, redirect, url_for, flash, make_response, request, jsonify, current_app as app, session,
+    abort, send_file
 )
 from flask_login import login_required, current_user
 from flask_wtf.csrf import generate_csrf
 from . import admin_bp
 from ..models import (
     Student, User, Subject, Result, Session, StudentClassHistory, UserSessionPreference,
-    RoleEnum, TermEnum, Classes, Teacher, class_subject, class_teacher, FeePayment, AdminPrivilege, AuditLog, StudentTermSummary
+    RoleEnum, TermEnum, Classes, Teacher, class_subject, class_teacher, FeePayment, AdminPrivilege, AuditLog, StudentTermSummary,
+    EnrollmentSnapshot
 )
+from ..audit import record_audit
+from ..catalogue import bump_subject_catalogue
+from ..promotion import plan_promotion, apply_promotion
+from ..student_import import import_students, read_rows, run_import_job, save_upload
+from ..score_sheets import build_score_template, read_score_sheet, apply_score_sheet
+from ..sequences import allocate_reg_nos
+from ..search import (
+    index_students, remove_students_from_index, search_student_ids, matching_class_ids, rank_column, ranked_sort_key
+)
+from ..enrollment import (
+    refresh_enrollment_snapshot, remove_from_enrollment_snapshot, update_snapshot_hierarchy, enrollment_stats
+)
+from ..jobs import job_runner
+from ..report_cards import generate_class_report_cards
 from ..helpers import (
     get_subjects_by_class_name, update_results_helper, save_result, db, populate_form_with_results,
     generate_excel_broadsheet, prepare_broadsheet_data, generate_employee_id, group_students_by_class,
-    get_students_query, save_class_wide_fields, apply_filters_to_students_query, require_session_and_term, handle_db_errors
+    get_students_query, save_class_wide_fields, apply_filters_to_students_query, require_session_and_term, handle_db_errors,
+    rebuild_term_summaries, save_results_bulk, generate_school_broadsheet, TERM_ORDER,
+    keyset_paginate, student_sort_columns, student_sort_key, class_roster_sort_columns, class_roster_sort_key,
+    cached_count, students_total
 )
 from ..auth.forms import (
     EditStudentForm, ResultForm, SubjectForm, DeleteForm, SessionForm, ApproveForm, classForm,
@@ -35,6 +54,8 @@ import base64
 from itertools import groupby
 from operator import itemgetter
 import re
+import hashlib
+import json
 
 # admin_bp = Blueprint("admins", __name__)
 
@@ -55,14 +76,18 @@ def admin_before_request():
     if not session.get('mfa_verified', False) and current_user.mfa_secret:
         return redirect(url_for("auth.mfa_verify"))
 
+# Stats polls revalidate with ETags, so they keep the Cache-Control set by stats_response
+REVALIDATED_ENDPOINTS = {"admins.get_stats", "admins.get_student_stats_by_class"}
+
 @admin_bp.after_request
 def add_csrf_token(response):
     """Add security headers to every response."""
     response.headers['X-CSRFToken'] = generate_csrf()
     response.headers['X-Content-Type-Options'] = 'nosniff'
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    if request.endpoint not in REVALIDATED_ENDPOINTS:
+        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
     return response
 
 # ------------------------------
@@ -127,7 +152,7 @@ def create_admin():
                 can_view_reports=form.can_view_reports.data
             )
             db.session.add(privileges)
-            db.session.add(AuditLog(user_id=current_user.id, action=f"Created admin {username}"))
+            record_audit(current_user.id, f"Created admin {username}")
             db.session.commit()
 
             totp = pyotp.TOTP(new_user.mfa_secret)
@@ -205,6 +230,7 @@ def edit_admin(user_id):
                 admin.set_password(form.password.data)
                 flash("Password updated successfully.", "alert-info")
 
+            User.invalidate_cache(admin.id)
             db.session.commit()
             flash(f"Admin '{admin.username}' updated successfully.", "alert-success")
             return redirect(url_for("admins.view_admins"))
@@ -242,6 +268,7 @@ def edit_admin_privileges(user_id):
             privileges.can_manage_teachers = form.can_manage_teachers.data
             privileges.can_manage_subjects = form.can_manage_subjects.data
             privileges.can_view_reports = form.can_view_reports.data
+            User.invalidate_cache(admin.id)
             db.session.commit()
             flash(f"Privileges for '{admin.username}' updated successfully.", "alert-success")
             return redirect(url_for("admins.view_admins"))
@@ -271,6 +298,7 @@ def delete_admin(user_id):
             UserSessionPreference.query.filter_by(user_id=admin.id).delete()
             db.session.delete(admin)
             db.session.commit()
+            Session.invalidate_current_session_cache()
             flash(f"Admin '{admin.username}' deleted successfully.", "alert-success")
         except OperationalError as e:
             db.session.rollback()
@@ -318,6 +346,7 @@ def manage_sessions():
                 )
                 db.session.add(preference)
             db.session.commit()
+            Session.invalidate_current_session_cache()
             flash(f"Your current session set to {selected_session.year} ({term_str}).", "alert-success")
             app.logger.info(f"User {current_user.username} set session to {selected_session.year} and term to {term_str}")
             return redirect(url_for("admins.manage_sessions"))
@@ -371,7 +400,7 @@ def add_student():
             db.session.add(student)
             db.session.flush()
 
-            student.reg_no = f"{app.config.get('REG_NO_PREFIX', 'AAIS/0559/')}{student.id:03}"
+            student.reg_no = allocate_reg_nos(1)[0]
             user = User(username=student.reg_no, role=RoleEnum.STUDENT.value)
             user.set_password(student.reg_no)
             student.user = user
@@ -386,6 +415,8 @@ def add_student():
                 is_active=True
             )
             db.session.add(class_history)
+            refresh_enrollment_snapshot([student.id])
+            index_students([student])
             db.session.commit()
 
             flash(f"Student registered successfully. Registration Number: {student.reg_no}.", "alert-success")
@@ -406,13 +437,64 @@ def add_student():
         current_term=current_term.value if current_term else "None"
     )
 
+@admin_bp.route("/import_students", methods=["GET", "POST"])
+@login_required
+def import_students_upload():
+    """Register students in bulk from an uploaded CSV or XLSX file and report per-row errors."""
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("No current session or term set. Please set one first.", "alert-danger")
+        return redirect(url_for("admins.manage_sessions"))
+
+    report = None
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename.lower().endswith((".csv", ".xlsx")):
+            flash("Upload a .csv or .xlsx file.", "alert-danger")
+            return redirect(url_for("admins.import_students_upload"))
+        dry_run = request.form.get("dry_run") == "1"
+        if not dry_run and (request.content_length or 0) > app.config["IMPORT_BACKGROUND_BYTES"]:
+            job_id = job_runner.start(
+                "student_import", current_user.id, run_import_job,
+                save_upload(upload), upload.filename, current_session.id, current_term.value, current_user.id
+            )
+            record_audit(current_user.id, f"Started student import from {upload.filename}")
+            db.session.commit()
+            return redirect(url_for("admins.job_status", job_id=job_id))
+        try:
+            report = import_students(
+                read_rows(upload.stream, upload.filename), current_session, current_term.value, dry_run=dry_run
+            )
+            if not dry_run and report.imported:
+                record_audit(current_user.id, f"Imported {len(report.imported)} students from {upload.filename}")
+                db.session.commit()
+            verb = "validated" if dry_run else "registered"
+            flash(
+                f"{len(report.imported)} of {report.rows} rows {verb}; {len(report.errors)} rows have errors.",
+                "alert-success" if not report.errors else "alert-warning"
+            )
+            if report.stopped:
+                flash(f"Import stopped early: {report.stopped}", "alert-danger")
+        except ValueError as e:
+            app.logger.error(f"Student import from {upload.filename} rejected: {str(e)}")
+            flash(f"Import failed: {str(e)}", "alert-danger")
+        except OperationalError as e:
+            app.logger.error(f"Database error importing students: {str(e)}")
+            flash("Database error occurred. Rows already registered have been kept.", "alert-danger")
+    return render_template(
+        "admin/students/import_students.html",
+        report=report,
+        current_term=current_term.value,
+        session_year=current_session.year
+    )
+
 @admin_bp.route("/students/<string:action>", methods=["GET", "POST"])
 @login_required
 @require_session_and_term
 @handle_db_errors
 def students(current_session, current_term, action):
     """View and filter students across all classes."""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 10
     enrollment_status = request.args.get('enrollment_status', 'active')
     fee_status = request.args.get('fee_status', '')
@@ -423,8 +505,10 @@ def students(current_session, current_term, action):
     students_query = apply_filters_to_students_query(
         students_query, enrollment_status, fee_status, approval_status, current_session, current_term, term
     )
-    students_query = students_query.order_by(Classes.hierarchy, Student.first_name.asc())
-    paginated_students = students_query.paginate(page=page, per_page=per_page, error_out=False)
+    total = students_total(students_query, current_session, term, enrollment_status, fee_status, approval_status)
+    paginated_students = keyset_paginate(
+        students_query, student_sort_columns(), student_sort_key, cursor=cursor, per_page=per_page, total=total
+    )
     students_classes = group_students_by_class(paginated_students.items)
     form = DeleteForm()
     classes = Classes.query.order_by(Classes.hierarchy).all()
@@ -501,6 +585,8 @@ def edit_student(current_session, current_term, student_id, action):
             if user:
                 user.username = form.reg_no.data
 
+            refresh_enrollment_snapshot([student.id])
+            index_students([student])
             db.session.commit()
             flash("Student updated successfully!", "alert-success")
             return redirect(url_for("admins.students", action=action))
@@ -548,14 +634,18 @@ def delete_student(student_id, action):
                 class_name = student_class_history.class_ref.name
 
             app.logger.info(f"Preparing to delete student {student_id}")
-            db.session.add(AuditLog(user_id=current_user.id, action=f"Deleted student {student_id}"))
+            record_audit(current_user.id, f"Deleted student {student_id}")
+            # Before the delete: its flush cascades to the snapshot rows the counters are decremented from
+            remove_from_enrollment_snapshot([student_id])
+            remove_students_from_index([student_id])
             user = User.query.get(student.user_id) if student.user_id else None
+            # Delete the student explicitly: User.student has no delete cascade, so deleting only the user
+            # would just null student.user_id and leave the student behind
+            app.logger.info(f"Deleting student {student_id}")
+            db.session.delete(student)
             if user:
-                app.logger.info(f"Deleting user {user.id} for student {student_id} with cascading to Student")
+                app.logger.info(f"Deleting user {user.id} for student {student_id}")
                 db.session.delete(user)
-            else:
-                app.logger.info(f"Deleting student {student_id} directly (no user associated)")
-                db.session.delete(student)
 
             app.logger.info(f"Committing deletion for student {student_id}")
             db.session.commit()
@@ -606,6 +696,7 @@ def student_reenroll(student_id):
                 is_active=True
             )
             db.session.add(new_enrollment)
+        refresh_enrollment_snapshot([student_id])
         db.session.commit()
         return jsonify({
             "success": True,
@@ -655,6 +746,7 @@ def manage_classes():
                     cls.name = form.name.data.strip()
                     cls.section = form.section.data.strip()
                     cls.hierarchy = form.hierarchy.data
+                    update_snapshot_hierarchy(cls.id, cls.hierarchy)
                     db.session.commit()
                     flash("Class updated successfully!", "alert-success")
                 except IntegrityError as e:
@@ -721,11 +813,10 @@ def students_by_class(class_name, action):
         return jsonify({"error": f"Class '{class_name}' not found."}), 404
 
     form = DeleteForm()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     per_page = 5
     term = request.args.get('term', current_term.value)
-    term_order = {t.value: i for i, t in enumerate(TermEnum, 1)}
-    target_term_order = term_order.get(term, 1)
+    target_term_order = TERM_ORDER.get(term, 1)
 
     try:
         student_histories_query = (
@@ -736,21 +827,17 @@ def students_by_class(class_name, action):
                 StudentClassHistory.class_id == class_record.id,
                 StudentClassHistory.is_active == True,
                 StudentClassHistory.leave_date.is_(None),
-                case(
-                    *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                    else_=1
-                ) <= target_term_order,
-                or_(
-                    StudentClassHistory.end_term.is_(None),
-                    case(
-                        *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                        else_=4
-                    ) >= target_term_order
-                )
+                StudentClassHistory.enrolled_in_term(target_term_order)
             )
-            .order_by(Student.last_name.asc())
+            .options(contains_eager(StudentClassHistory.student))
+        )
+        total = cached_count(
+            ("students_by_class", current_session.id, term, class_record.id), student_histories_query
+        )
+        student_histories_pagination = keyset_paginate(
+            student_histories_query, class_roster_sort_columns(), class_roster_sort_key,
+            cursor=cursor, per_page=per_page, total=total
         )
-        student_histories_pagination = student_histories_query.paginate(page=page, per_page=per_page, error_out=False)
         students = [history.student for history in student_histories_pagination.items]
 
         return render_template(
@@ -826,6 +913,7 @@ def promote_student(class_name, student_id, action):
                 )
                 db.session.add(new_class_history)
 
+        refresh_enrollment_snapshot([student.id])
         db.session.commit()
         session_label = "current session" if session_choice == "current" else f"{target_session.year}"
         flash(f"{student.first_name} promoted to {next_class.name} in {session_label}.", "alert-success")
@@ -893,6 +981,7 @@ def demote_student(class_name, student_id, action):
                 )
                 db.session.add(new_class_history)
 
+        refresh_enrollment_snapshot([student.id])
         db.session.commit()
         session_label = "current session" if session_choice == "current" else f"{target_session.year}"
         flash(f"{student.first_name} demoted to {previous_class.name} in {session_label}.", "alert-success")
@@ -903,6 +992,66 @@ def demote_student(class_name, student_id, action):
         flash("Database error occurred.", "alert-danger")
         return redirect(url_for("admins.students_by_class", class_name=class_name, action=action))
 
+@admin_bp.route("/promote_classes", methods=["GET", "POST"])
+@login_required
+def promote_classes():
+    """Preview and apply a set-based promotion of a whole class, or of every class by hierarchy."""
+    if not current_user.privileges or not current_user.privileges.can_manage_classes:
+        flash("You do not have permission to promote classes.", "alert-danger")
+        return redirect(url_for("admins.admin_dashboard"))
+
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("No current session or term available.", "alert-danger")
+        return redirect(url_for("admins.manage_sessions"))
+
+    classes = Classes.query.order_by(Classes.hierarchy).all()
+    class_name = request.values.get("class_name", "").strip()
+    session_choice = request.values.get("session_choice", "next")
+    repeater_ids = {int(student_id) for student_id in request.form.getlist("repeaters") if student_id.isdigit()}
+
+    selected_class = next((cls for cls in classes if cls.name == class_name), None)
+    if class_name and not selected_class:
+        flash("Class not found.", "alert-danger")
+        return redirect(url_for("admins.promote_classes"))
+
+    target_session = current_session if session_choice == "current" else Session.query.filter(
+        Session.year > current_session.year
+    ).order_by(Session.year.asc()).first()
+    if not target_session:
+        flash("No next academic session available.", "alert-danger")
+        return render_template(
+            "admin/classes/bulk_promotion.html", classes=classes, class_name=class_name,
+            session_choice=session_choice, plan=None, repeater_ids=repeater_ids
+        )
+
+    try:
+        plan = plan_promotion(
+            current_session, target_session, current_term.value,
+            class_ids=[selected_class.id] if selected_class else None, repeater_ids=repeater_ids
+        )
+        if request.method == "POST" and request.form.get("confirm") == "1":
+            if request.form.get("plan_fingerprint") != plan.fingerprint():
+                # A resubmitted or stale confirm would otherwise promote the same students a second time
+                flash("These classes changed since the preview (it may already have been applied). Review the updated preview.", "alert-warning")
+            else:
+                moved = apply_promotion(plan)
+                scope = selected_class.name if selected_class else "all classes"
+                record_audit(current_user.id, f"Bulk promotion of {scope}: {plan.summary()}")
+                db.session.commit()
+                flash(f"Promotion complete for {scope}: {moved} students moved.", "alert-success")
+                return redirect(url_for("admins.promote_classes", class_name=class_name, session_choice=session_choice))
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error promoting {class_name or 'all classes'}: {str(e)}")
+        flash("Database error occurred.", "alert-danger")
+        plan = None
+
+    return render_template(
+        "admin/classes/bulk_promotion.html", classes=classes, class_name=class_name,
+        session_choice=session_choice, plan=plan, repeater_ids=repeater_ids
+    )
+
 @admin_bp.route("/delete_student_class_record/<string:class_name>/<int:student_id>/<string:action>", methods=["POST"])
 @login_required
 def delete_student_class_record(class_name, student_id, action):
@@ -929,6 +1078,7 @@ def delete_student_class_record(class_name, student_id, action):
         class_record.end_term = current_term.value
         class_record.leave_date = datetime.utcnow()
         class_record.is_active = False
+        refresh_enrollment_snapshot([student.id])
         db.session.commit()
         flash(f"Class record for {student.first_name} marked inactive in {current_term.value} term.", "alert-success")
     except OperationalError as e:
@@ -975,6 +1125,7 @@ def manage_subjects():
             subject = Subject.query.get(subject_id)
             if subject:
                 subject.deactivated = True
+                bump_subject_catalogue()
                 db.session.commit()
                 flash(f"Subject '{subject.name}' deactivated.", "alert-warning")
             else:
@@ -1010,6 +1161,7 @@ def edit_subject(subject_id):
         try:
             subject.name = form.name.data
             subject.section = form.section.data
+            bump_subject_catalogue()
             db.session.commit()
             flash("Subject updated successfully!", "alert-success")
             return redirect(url_for("admins.manage_subjects"))
@@ -1033,6 +1185,7 @@ def delete_subject(subject_id):
             subject = Subject.query.get_or_404(subject_id)
             Result.query.filter_by(subject_id=subject_id).delete()
             db.session.delete(subject)
+            bump_subject_catalogue()
             db.session.commit()
             flash("Subject and associated scores deleted successfully!", "alert-success")
         except OperationalError as e:
@@ -1088,6 +1241,7 @@ def assign_subject_to_class():
                         changes_made = True
                         app.logger.info(f"Assigned subject {subject.id} to class {class_.id} by user {current_user.username}")
             if changes_made:
+                bump_subject_catalogue()
                 db.session.commit()
                 flash(f"Assigned {len(selected_subjects)} subject(s) to {len(selected_classes)} class(es) successfully!", "alert-success")
             else:
@@ -1124,6 +1278,7 @@ def remove_subject_from_class():
 
         if subject in class_.subjects:
             class_.subjects.remove(subject)
+            bump_subject_catalogue()
             db.session.commit()
             flash(f"Removed {subject.name} from {class_.name} successfully.", "alert-success")
         else:
@@ -1152,6 +1307,7 @@ def edit_subject_assignment(class_name):
             class_.subjects.clear()
             for subject in subject_objects:
                 class_.subjects.append(subject)
+            bump_subject_catalogue()
             db.session.commit()
             flash(f"Updated subjects for {class_name} successfully.", "alert-success")
             return redirect(url_for("admins.assign_subject_to_class"))
@@ -1241,6 +1397,7 @@ def merge_subjects():
                     {"new_id": new_id, "old_ids": tuple(old_ids)}
                 )
 
+            bump_subject_catalogue()
             db.session.commit()
 
             for name, info in fully_common_subjects.items():
@@ -1248,6 +1405,7 @@ def merge_subjects():
             for name, info in partially_common_subjects.items():
                 Subject.query.filter(Subject.id.in_(info["old_ids"])).delete(synchronize_session=False)
 
+            bump_subject_catalogue()
             db.session.commit()
             flash("Subjects merged successfully!", "alert-success")
             return redirect(url_for("admins.manage_subjects"))
@@ -1388,7 +1546,6 @@ class ResultUpdateSchema(Schema):
     class_assessment = fields.Integer(allow_none=True, load_default=None)
     summative_test = fields.Integer(allow_none=True, load_default=None)
     exam = fields.Integer(allow_none=True, load_default=None)
-    position = fields.Str(allow_none=True, load_default=None)
 
     @validates_schema
     def validate_student_specific_fields(self, data, **kwargs):
@@ -1405,7 +1562,6 @@ def update_result_field():
     try:
         data = ResultUpdateSchema().load(request.get_json())
         data['next_term_begins'] = bleach.clean(data.get('next_term_begins', '')) if data.get('next_term_begins') else None
-        data['position'] = bleach.clean(data.get('position', '')) if data.get('position') else None
         data['date_issued'] = bleach.clean(data.get('date_issued', '')) if data.get('date_issued') else None
 
         current_session, current_term = Session.get_current_session_and_term(include_term=True)
@@ -1421,7 +1577,7 @@ def update_result_field():
             data=data,
             class_id=data["class_id"]
         )
-        db.session.add(AuditLog(user_id=current_user.id, action=f"Updated result for student {data['student_id']} in subject {data['subject_id']}"))
+        record_audit(current_user.id, f"Updated result for student {data['student_id']} in subject {data['subject_id']}")
         db.session.commit()
         app.logger.info(f"Result updated for student {data['student_id']} in subject {data['subject_id']} by user {current_user.username}")
 
@@ -1444,7 +1600,8 @@ def update_result_field():
             "grand_total": term_summary.grand_total if term_summary else None,
             "term_average": term_summary.term_average if term_summary else None,
             "cumulative_average": term_summary.cumulative_average if term_summary else None,
-            "subjects_offered": term_summary.subjects_offered if term_summary else None
+            "subjects_offered": term_summary.subjects_offered if term_summary else None,
+            "position": term_summary.position if term_summary else None
         })
     except ValidationError as e:
         return jsonify({"status": "error", "message": str(e.messages)}), 400
@@ -1543,11 +1700,6 @@ def update_broadsheet(class_name, action):
                 student_id, subject_id = int(student_id), int(subject_id)
                 value = None if not value.strip() else int(value)
                 results_data.setdefault(student_id, {}).setdefault(subject_id, {})[field] = value
-        elif key.startswith('position['):
-            match = re.match(r'position\[(\d+)\]', key)
-            if match:
-                student_id = int(match.group(1))
-                results_data.setdefault(student_id, {}).setdefault('position', value.strip() or None)
         elif key.startswith('next_term_begins['):
             match = re.match(r'next_term_begins\[(\d+)\]', key)
             if match:
@@ -1563,29 +1715,23 @@ def update_broadsheet(class_name, action):
         flash("No data submitted for update.", "alert-danger")
         return redirect(url_for('admins.broadsheet', class_name=class_name, action=action))
 
+    cells = []
+    student_fields = {}
+    for student_id, data in results_data.items():
+        student_fields[student_id] = {field: data.get(field) for field in ('next_term_begins', 'date_issued')}
+        for subject_id, scores in data.items():
+            if subject_id in ['next_term_begins', 'date_issued']:
+                continue
+            cells.append({"student_id": student_id, "subject_id": subject_id, **scores})
+
     try:
-        for student_id, data in results_data.items():
-            subject_scores = {k: v for k, v in data.items() if k not in ['position', 'next_term_begins', 'date_issued']}
-            position = data.get('position')
-            next_term_begins = data.get('next_term_begins')
-            date_issued = data.get('date_issued')
-            for subject_id, scores in subject_scores.items():
-                update_data = {
-                    "class_assessment": scores.get("class_assessment"),
-                    "summative_test": scores.get("summative_test"),
-                    "exam": scores.get("exam"),
-                    "next_term_begins": next_term_begins,
-                    "date_issued": date_issued,
-                    "position": position
-                }
-                save_result(
-                    student_id=student_id,
-                    subject_id=subject_id,
-                    term=current_term.value,
-                    session_id=current_session.id,
-                    data=update_data,
-                    class_id=class_record.id
-                )
+        save_results_bulk(
+            class_id=class_record.id,
+            session_id=current_session.id,
+            term=current_term.value,
+            cells=cells,
+            student_fields=student_fields
+        )
         db.session.commit()
         flash("Broadsheet updated successfully.", "alert-success")
     except ValueError as e:
@@ -1598,6 +1744,77 @@ def update_broadsheet(class_name, action):
         flash("Database error occurred.", "alert-danger")
     return redirect(url_for('admins.broadsheet', class_name=class_name, action=action))
 
+@admin_bp.route("/rebuild-summaries/<string:class_name>/<string:action>", methods=["POST"])
+@login_required
+def rebuild_summaries(class_name, action):
+    """Recompute all term summaries for a class from its saved results."""
+    class_name = unquote(class_name).strip()
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("Current session or term not set.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    class_record = Classes.query.filter_by(name=class_name).first_or_404()
+    try:
+        rebuilt = rebuild_term_summaries(class_record.id, current_session.id, current_term.value)
+        record_audit(current_user.id, f"Rebuilt term summaries for {class_name}")
+        db.session.commit()
+        flash(f"Rebuilt summaries for {rebuilt} student(s).", "alert-success")
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error rebuilding summaries for {class_name}: {str(e)}")
+        flash("Database error occurred.", "alert-danger")
+    return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+@admin_bp.route("/report-cards/<string:class_name>/<string:action>", methods=["POST"])
+@login_required
+def generate_report_cards(class_name, action):
+    """Start rendering report cards for a whole class as a background job."""
+    class_name = unquote(class_name).strip()
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("Current session or term not set.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    output_format = request.form.get("format", "zip")
+    if output_format not in ("zip", "pdf"):
+        flash("Invalid report card format.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    class_record = Classes.query.filter_by(name=class_name).first_or_404()
+    job_id = job_runner.start(
+        "report_cards", current_user.id, generate_class_report_cards,
+        class_record.id, current_session.id, current_term.value, output_format
+    )
+    record_audit(current_user.id, f"Generated report cards for {class_name}")
+    db.session.commit()
+    return redirect(url_for("admins.job_status", job_id=job_id))
+
+@admin_bp.route("/jobs/<string:job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """Show (or, for ?format=json, report) the progress of a background export."""
+    job = job_runner.get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        abort(404)
+    if request.args.get("format") == "json":
+        return jsonify({key: job[key] for key in ("status", "done", "total", "filename", "error")})
+    return render_template("admin/jobs/job_status.html", job=job)
+
+@admin_bp.route("/jobs/<string:job_id>/download", methods=["GET"])
+@login_required
+def download_job(job_id):
+    """Download the artifact of a finished background export."""
+    job = job_runner.get(job_id)
+    if job is None or job["user_id"] != current_user.id or job["status"] != "finished":
+        abort(404)
+    return send_file(
+        job_runner.artifact_path(job_id),
+        mimetype=job["mimetype"],
+        as_attachment=True,
+        download_name=job["filename"]
+    )
+
 @admin_bp.route("/download_broadsheet/<string:class_name>/<string:action>", methods=["GET"])
 @login_required
 def download_broadsheet(class_name, action):
@@ -1639,14 +1856,93 @@ def download_broadsheet(class_name, action):
     output = generate_excel_broadsheet(class_name, current_term.value, current_session.year, broadsheet_data, subjects, subject_averages)
 
     filename = f"Broadsheet_{class_name}_{current_term.value}_{current_session.year}.xlsx"
-    db.session.add(AuditLog(user_id=current_user.id, action=f"Downloaded broadsheet for {class_name}"))
+    record_audit(current_user.id, f"Downloaded broadsheet for {class_name}")
     db.session.commit()
-    return Response(
+    # Stream the spooled workbook in chunks rather than building the response body in memory
+    return send_file(
         output,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment;filename={filename}"}
+        as_attachment=True,
+        download_name=filename
     )
 
+@admin_bp.route("/score_template/<string:class_name>/<string:action>", methods=["GET"])
+@login_required
+def download_score_template(class_name, action):
+    """Download an Excel template pre-filled with the class roster and saved scores for offline entry."""
+    class_name = unquote(class_name).strip()
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("No current session or term set.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    class_record = Classes.query.filter_by(name=class_name).first_or_404()
+    try:
+        filename, output = build_score_template(class_record.id, current_session.id, current_term.value)
+    except ValueError as e:
+        flash(str(e), "alert-info")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+    except OperationalError as e:
+        app.logger.error(f"Database error building score template for {class_name}: {str(e)}")
+        flash("Database error occurred.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+    return send_file(
+        output,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=filename
+    )
+
+@admin_bp.route("/upload_scores/<string:class_name>/<string:action>", methods=["POST"])
+@login_required
+def upload_scores(class_name, action):
+    """Apply the edited cells of a filled score template in one transaction."""
+    class_name = unquote(class_name).strip()
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("No current session or term set.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    class_record = Classes.query.filter_by(name=class_name).first_or_404()
+    upload = request.files.get("file")
+    if not upload or not upload.filename.lower().endswith(".xlsx"):
+        flash("Upload the filled .xlsx score template.", "alert-danger")
+        return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+    try:
+        report = apply_score_sheet(
+            read_score_sheet(upload.stream), class_record.id, current_session.id, current_term.value
+        )
+        if report.changed:
+            record_audit(current_user.id, f"Uploaded {report.changed} scores for {class_name} from {upload.filename}")
+        db.session.commit()
+        flash(report.summary(), "alert-danger" if report.errors else "alert-warning" if report.conflicts else "alert-success")
+    except ValueError as e:
+        db.session.rollback()
+        app.logger.error(f"Score upload for {class_name} rejected: {str(e)}")
+        flash(str(e), "alert-danger")
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error uploading scores for {class_name}: {str(e)}")
+        flash("Database error occurred. No scores were saved.", "alert-danger")
+    return redirect(url_for("admins.broadsheet", class_name=class_name, action=action))
+
+@admin_bp.route("/school-broadsheet", methods=["POST"])
+@login_required
+def export_school_broadsheet():
+    """Start building a workbook with every class's broadsheet as a background job."""
+    current_session, current_term = Session.get_current_session_and_term(include_term=True)
+    if not current_session or not current_term:
+        flash("No current session or term set.", "alert-danger")
+        return redirect(url_for("admins.select_class", action="download_broadsheet"))
+
+    job_id = job_runner.start(
+        "school_broadsheet", current_user.id, generate_school_broadsheet, current_session.id, current_term.value
+    )
+    record_audit(current_user.id, f"Exported school broadsheet for {current_term.value} Term {current_session.year}")
+    db.session.commit()
+    return redirect(url_for("admins.job_status", job_id=job_id))
+
 @admin_bp.route("/update_broadsheet_field", methods=["POST"])
 @login_required
 @limiter.limit("20 per minute")
@@ -1654,8 +1950,6 @@ def update_broadsheet_field():
     try:
         data = ResultUpdateSchema().load(request.get_json())
         app.logger.info(f"Received data: {data}")
-        position = data.get('position')
-        data['position'] = bleach.clean(position) if position is not None else None  # Only clean if position is provided
 
         current_session, current_term = Session.get_current_session_and_term(include_term=True)
         if not current_session or not current_term:
@@ -1690,7 +1984,7 @@ def update_broadsheet_field():
             data=data,
             class_id=class_id
         )
-        db.session.add(AuditLog(user_id=current_user.id, action=f"Updated broadsheet field for student {student_id} {'in subject ' + str(subject_id) if subject_id else 'position'}"))
+        record_audit(current_user.id, f"Updated broadsheet field for student {student_id} {'in subject ' + str(subject_id) if subject_id else 'term summary'}")
         db.session.commit()
 
         term_summary = StudentTermSummary.query.filter_by(
@@ -1776,7 +2070,7 @@ def update_broadsheet_class_fields():
         )
 
         if updated_count > 0:
-            db.session.add(AuditLog(user_id=current_user.id, action=f"Updated next_term_begins/date_issued for class {class_id}"))
+            record_audit(current_user.id, f"Updated next_term_begins/date_issued for class {class_id}")
             db.session.commit()
             return jsonify({"status": "success", "message": "Class-wide update successful."})
         else:
@@ -1855,7 +2149,8 @@ def delete_teacher(teacher_id):
         )
 
         # Step 2: Handle the user and its dependencies
-        user = User.query.get(teacher.user_id)
+        teacher_id_user = teacher.user_id
+        user = User.query.get(teacher_id_user)
         if user:
             # Delete audit_log entries (from previous fix)
             db.session.execute(
@@ -1896,6 +2191,7 @@ def assign_subject_to_teacher():
         try:
             if subject not in teacher.subjects:
                 teacher.subjects.append(subject)
+                bump_subject_catalogue()
                 db.session.commit()
                 flash(f"Subject '{subject.name}' assigned to teacher '{teacher.last_name}, {teacher.first_name}'!", "alert-success")
             else:
@@ -2059,6 +2355,7 @@ def approve(student_id):
     if form.validate_on_submit():
         try:
             student.approved = True
+            refresh_enrollment_snapshot([student.id])
             db.session.commit()
             flash(f"Student {student.first_name} {student.last_name} approved successfully!", "alert-success")
             return redirect(url_for("admins.students", action="view"))
@@ -2068,59 +2365,19 @@ def approve(student_id):
             flash("Database error occurred.", "alert-danger")
     return render_template("admin/students/approve.html", form=form, student=student)
 
+def stats_response(stats):
+    """JSON stats with an ETag so dashboard polls get a 304 while the counts are unchanged."""
+    response = jsonify(stats)
+    response.set_etag(hashlib.sha1(json.dumps(stats, sort_keys=True).encode()).hexdigest())
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
 @admin_bp.route('/stats', methods=['GET'])
 @login_required
 def get_stats():
     current_session, current_term = Session.get_current_session_and_term(include_term=True)
     term = request.args.get('term', current_term.value)
-    term_order = {t.value: i for i, t in enumerate(TermEnum, 1)}
-    target_term_order = term_order.get(term, 1)
-
-    students_query = get_students_query(current_session, term).filter(
-        StudentClassHistory.is_active == True,
-        StudentClassHistory.leave_date.is_(None),
-        case(
-            *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-            else_=1
-        ) <= target_term_order,
-        or_(
-            StudentClassHistory.end_term.is_(None),
-            case(
-                *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                else_=4
-            ) >= target_term_order
-        )
-    )
-    total_students = students_query.count()
-    approved_students = students_query.filter(Student.approved == True).count()
-    fees_paid = FeePayment.query.filter_by(
-        session_id=current_session.id,
-        term=term,
-        has_paid_fee=True
-    ).join(Student).join(StudentClassHistory).filter(
-        StudentClassHistory.session_id == current_session.id,
-        StudentClassHistory.is_active == True,
-        StudentClassHistory.leave_date.is_(None),
-        case(
-            *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-            else_=1
-        ) <= target_term_order,
-        or_(
-            StudentClassHistory.end_term.is_(None),
-            case(
-                *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                else_=4
-            ) >= target_term_order
-        )
-    ).count()
-    fees_unpaid = total_students - fees_paid
-
-    return jsonify({
-        "total_students": total_students,
-        "approved_students": approved_students,
-        "fees_paid": fees_paid,
-        "fees_unpaid": fees_unpaid
-    })
+    return stats_response(enrollment_stats(current_session.id, term))
 
 @admin_bp.route('/toggle_fee_status/<int:student_id>', methods=['POST'])
 @login_required
@@ -2151,6 +2408,7 @@ def toggle_fee_status(student_id):
         else:
             fee_payment.has_paid_fee = not fee_payment.has_paid_fee
 
+        refresh_enrollment_snapshot([student_id])
         db.session.commit()
         status = "paid" if fee_payment.has_paid_fee else "unpaid"
         return jsonify({
@@ -2173,6 +2431,7 @@ def toggle_approval_status(student_id):
     student = Student.query.get_or_404(student_id)
     try:
         student.approved = not student.approved
+        refresh_enrollment_snapshot([student.id])
         db.session.commit()
         status = "approved" if student.approved else "deactivated"
         return jsonify({
@@ -2191,57 +2450,9 @@ def get_student_stats_by_class(class_name):
     class_name = unquote(class_name).strip()
     current_session, current_term = Session.get_current_session_and_term(include_term=True)
     term = request.args.get('term', current_term.value)
-    term_order = {t.value: i for i, t in enumerate(TermEnum, 1)}
-    target_term_order = term_order.get(term, 1)
 
     class_record = Classes.query.filter_by(name=class_name).first_or_404()
-    students_query = get_students_query(current_session, term).filter(
-        StudentClassHistory.class_id == class_record.id,
-        StudentClassHistory.is_active == True,
-        StudentClassHistory.leave_date.is_(None),
-        case(
-            *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-            else_=1
-        ) <= target_term_order,
-        or_(
-            StudentClassHistory.end_term.is_(None),
-            case(
-                *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                else_=4
-            ) >= target_term_order
-        )
-    )
-    total_students = students_query.count()
-    approved_students = students_query.filter(Student.approved == True).count()
-    fees_paid = FeePayment.query.filter_by(
-        session_id=current_session.id,
-        term=term,
-        has_paid_fee=True
-    ).join(Student).join(StudentClassHistory).filter(
-        StudentClassHistory.class_id == class_record.id,
-        StudentClassHistory.session_id == current_session.id,
-        StudentClassHistory.is_active == True,
-        StudentClassHistory.leave_date.is_(None),
-        case(
-            *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-            else_=1
-        ) <= target_term_order,
-        or_(
-            StudentClassHistory.end_term.is_(None),
-            case(
-                *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                else_=4
-            ) >= target_term_order
-        )
-    ).count()
-    fees_unpaid = total_students - fees_paid
-
-    return jsonify({
-        "total_students": total_students,
-        "approved_students": approved_students,
-        "fees_paid": fees_paid,
-        "fees_unpaid": fees_unpaid
-    })
+    return stats_response(enrollment_stats(current_session.id, term, class_record.id))
 
 
 
@@ -2292,7 +2503,7 @@ def get_student_stats_by_class(class_name):
 def search_students(action):
     """Search students across all classes with filtering."""
     search_query = request.args.get('query', '', type=str).strip()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     enrollment_status = request.args.get('enrollment_status', 'active')
     fee_status = request.args.get('fee_status', '')
     approval_status = request.args.get('approval_status', '')
@@ -2313,17 +2524,21 @@ def search_students(action):
             current_session,
             current_term
         )
+        sort_columns, sort_key = student_sort_columns(), student_sort_key
+        search_truncated = False
         if search_query:
-            search_filter = or_(
-                func.lower(Student.first_name).contains(search_query.lower()),
-                func.lower(Student.last_name).contains(search_query.lower()),
-                func.lower(Student.reg_no).contains(search_query.lower()),
-                func.lower(Classes.name).contains(search_query.lower())
-            )
-            students_query = students_query.filter(search_filter)
-
-        students_query = students_query.order_by(Classes.hierarchy, Student.last_name.asc())
-        pagination = students_query.paginate(page=page, per_page=10, error_out=False)
+            ranked = search_student_ids(search_query)
+            search_truncated = ranked.truncated
+            class_ids = matching_class_ids(search_query)
+            students_query = students_query.filter(or_(Student.id.in_(list(ranked)), Classes.id.in_(class_ids)))
+            if ranked:
+                sort_columns = [rank_column(ranked)] + sort_columns
+                sort_key = ranked_sort_key(ranked, lambda row: row[0], student_sort_key)
+
+        total = students_total(
+            students_query, current_session, current_term.value, enrollment_status, fee_status, approval_status, search_query
+        )
+        pagination = keyset_paginate(students_query, sort_columns, sort_key, cursor=cursor, per_page=10, total=total)
         students_classes = group_students_by_class(pagination.items)
 
         if not students_classes and enrollment_status == 'active' and not fee_status and not approval_status:
@@ -2340,6 +2555,7 @@ def search_students(action):
                 enrollment_status=enrollment_status,
                 fee_status=fee_status,
                 approval_status=approval_status,
+                search_truncated=search_truncated,
                 message="No students found matching the current filters."
             )
 
@@ -2355,7 +2571,8 @@ def search_students(action):
             session=current_session,
             enrollment_status=enrollment_status,
             fee_status=fee_status,
-            approval_status=approval_status
+            approval_status=approval_status,
+            search_truncated=search_truncated
         )
     except OperationalError as e:
         app.logger.error(f"Database error searching students: {str(e)}")
@@ -2367,7 +2584,7 @@ def search_students(action):
 def search_students_by_class(class_name, action):
     """Search students within a specific class."""
     search_query = request.args.get('query', '', type=str).strip()
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     class_name = unquote(class_name).strip()
     current_session, current_term = Session.get_current_session_and_term(include_term=True)
     if not current_session or not current_term:
@@ -2382,16 +2599,22 @@ def search_students_by_class(class_name, action):
             StudentClassHistory.class_id == class_record.id,
             StudentClassHistory.is_active == True,
             StudentClassHistory.leave_date.is_(None)
-        ).join(Student)
+        ).join(Student).options(contains_eager(StudentClassHistory.student))
+        sort_columns, sort_key = class_roster_sort_columns(), class_roster_sort_key
+        search_truncated = False
         if search_query:
-            search_filter = or_(
-                func.lower(Student.first_name).contains(search_query.lower()),
-                func.lower(Student.last_name).contains(search_query.lower()),
-                func.lower(Student.reg_no).contains(search_query.lower()),
-            )
-            students_query = students_query.filter(search_filter)
-
-        pagination = students_query.order_by(Student.last_name.asc()).paginate(page=page, per_page=5, error_out=False)
+            roster_ids = [student_id for (student_id,) in students_query.with_entities(StudentClassHistory.student_id)]
+            ranked = search_student_ids(search_query, roster_ids)
+            search_truncated = ranked.truncated
+            students_query = students_query.filter(StudentClassHistory.student_id.in_(list(ranked)))
+            if ranked:
+                sort_columns = [rank_column(ranked)] + sort_columns
+                sort_key = ranked_sort_key(ranked, lambda history: history.student, class_roster_sort_key)
+
+        total = cached_count(
+            ("search_students_by_class", current_session.id, class_record.id, search_query.lower()), students_query
+        )
+        pagination = keyset_paginate(students_query, sort_columns, sort_key, cursor=cursor, per_page=5, total=total)
         student_histories = pagination.items
         students = [history.student for history in student_histories]
 
@@ -2405,6 +2628,7 @@ def search_students_by_class(class_name, action):
             pagination=pagination,
             action=action,
             class_name=class_name,
+            search_truncated=search_truncated,
         )
     except OperationalError as e:
         app.logger.error(f"Database error searching students in class {class_name}: {str(e)}")
@@ -2430,13 +2654,10 @@ def print_student_message():
     try:
         active_students = (
             db.session.query(Student)
-            .join(StudentClassHistory, Student.id == StudentClassHistory.student_id)
+            .join(EnrollmentSnapshot, Student.id == EnrollmentSnapshot.student_id)
             .filter(
-                StudentClassHistory.session_id == current_session.id,
-                StudentClassHistory.is_active == True,
-                StudentClassHistory.leave_date.is_(None),
-                StudentClassHistory.start_term <= current_term.value,
-                (StudentClassHistory.end_term.is_(None) | (StudentClassHistory.end_term >= current_term.value))
+                EnrollmentSnapshot.session_id == current_session.id,
+                EnrollmentSnapshot.term == current_term.value
             )
             .order_by(Student.last_name, Student.first_name)
             .all()
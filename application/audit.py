@@ -0,0 +1,150 @@
+import atexit
+import os
+import queue
+import threading
+from sqlalchemy import event, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class AuditWriter:
+    """Queue AuditLog rows in-process and write them in batched multi-row INSERTs from a background thread.
+
+    Entries wait on the db session until its transaction commits, so a request that rolls back leaves no audit row.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._registered = False
+        self._info_key = f"audit_entries_{id(self)}"
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("AUDIT_ASYNC", True)
+        self.batch_size = app.config.get("AUDIT_BATCH_SIZE", 200)
+        self.flush_interval = app.config.get("AUDIT_FLUSH_INTERVAL", 2.0)
+        # Keep a queue that still holds entries from an earlier init_app, so they are written rather than lost
+        if self._queue is None or self._queue.empty():
+            self._queue = queue.Queue(maxsize=app.config.get("AUDIT_QUEUE_SIZE", 10000))
+        app.extensions["audit_writer"] = self
+        if not self._registered:
+            from . import db
+            atexit.register(self.shutdown)
+            event.listen(db.session, "after_commit", self._after_commit)
+            event.listen(db.session, "after_rollback", self._after_rollback)
+            self._registered = True
+
+    def record(self, user_id, action):
+        """Hold an audit entry until the session commits, or add it to the session when async writes are off or the queue is full."""
+        from . import db
+        from .models import AuditLog, nigeria_now
+        entry = {"user_id": user_id, "action": action[:100], "timestamp": nigeria_now()}
+        pending = db.session.info.setdefault(self._info_key, [])
+        if self.enabled and self._queue.qsize() + len(pending) < self._queue.maxsize:
+            pending.append(entry)
+            return
+        if self.enabled:
+            self.app.logger.warning("Audit queue full; writing audit entry synchronously")
+        db.session.add(AuditLog(**entry))
+
+    def _after_commit(self, session):
+        # Savepoint commits fire this too; only the outermost commit makes the entries durable
+        if session.in_nested_transaction():
+            return
+        entries = session.info.pop(self._info_key, None)
+        if not entries:
+            return
+        self._ensure_started()
+        for entry in entries:
+            try:
+                self._queue.put(entry, timeout=1)
+            except queue.Full:
+                self.app.logger.error(f"Audit queue full; dropping audit entry {entry['action']!r} for user {entry['user_id']}")
+
+    def _after_rollback(self, session):
+        if not session.in_nested_transaction():
+            session.info.pop(self._info_key, None)
+
+    def _ensure_started(self):
+        # Start lazily and restart after a fork so each worker process owns its own writer thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.flush_interval)
+            self.flush()
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything currently queued, one multi-row INSERT per batch."""
+        from . import db
+        from .models import AuditLog
+        written = 0
+        with self.app.app_context():
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                try:
+                    db.session.execute(insert(AuditLog), batch)
+                    db.session.commit()
+                    written += len(batch)
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Batched audit write failed, retrying row by row: {str(e)}")
+                    written += self._write_rows(batch)
+            db.session.remove()
+        return written
+
+    def _write_rows(self, batch):
+        from . import db
+        from .models import AuditLog
+        written = 0
+        for entry in batch:
+            try:
+                db.session.execute(insert(AuditLog), [entry])
+                db.session.commit()
+                written += 1
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                self.app.logger.error(f"Dropping audit entry {entry['action']!r} for user {entry['user_id']}: {str(e)}")
+        return written
+
+    def shutdown(self):
+        """Stop the writer thread and flush whatever is still queued."""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        if self._queue is not None and not self._queue.empty():
+            self.flush()
+
+
+audit_writer = AuditWriter()
+
+
+def record_audit(user_id, action):
+    """Record an audit entry without adding a database round trip to the request."""
+    audit_writer.record(user_id, action)
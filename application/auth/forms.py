@@ -48,7 +48,6 @@ class ResultForm(FlaskForm):
     next_term_begins = StringField("Next Term Begins", validators=[Optional()])
     date_issued = StringField("Date Issued", validators=[Optional()])
     last_term_average = FloatField("Last Term Average", validators=[Optional()])
-    position = StringField("Position", validators=[Optional()])
     submit = SubmitField("Load Results")
 
 
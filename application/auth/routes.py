@@ -4,8 +4,10 @@ from flask import (
 from flask_login import login_user, current_user, login_required, logout_user
 from sqlalchemy.exc import OperationalError
 from . import auth_bp
-from ..models import User, RoleEnum, AuditLog
+from ..models import User, RoleEnum
 from .. import db
+from ..audit import record_audit
+from ..passwords import password_verifier, VerifierBusy
 from .forms import StudentLoginForm, AdminLoginForm
 import bleach
 from application import limiter
@@ -38,7 +40,7 @@ def login():
                 if not user:
                     flash("User not found. Please check your username.", "alert-danger")
                     app.logger.warning(f"Login attempt with non-existent username: {username}")
-                elif not user.check_password(password):
+                elif not password_verifier.verify(user, password):
                     flash("Invalid password. Please try again.", "alert-danger")
                     app.logger.warning(f"Failed password attempt for user: {username}")
                 elif not user.active:
@@ -47,11 +49,20 @@ def login():
                 else:
                     login_user(user, remember=remember)
                     app.logger.info(f"User {username} logged in successfully with remember={remember}.")
-                    db.session.add(AuditLog(user_id=user.id, action="Logged in"))
+                    record_audit(user.id, "Logged in")
                     db.session.commit()
                     if user.mfa_secret:
                         return redirect(url_for("auth.mfa_verify"))
                     return redirect_based_on_role(user)
+            except VerifierBusy as e:
+                db.session.rollback()
+                app.logger.warning(f"Login for {username} turned away with {password_verifier.pending()} password checks pending")
+                flash("Too many people are signing in right now. Please try again in a few seconds.", "alert-warning")
+                response = app.make_response((
+                    render_template("auth/login.html", title="Login", student_form=student_form, admin_form=admin_form), 503
+                ))
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
             except OperationalError as e:
                 db.session.rollback()
                 app.logger.error(f"Database connection lost during login for {username}: {str(e)}")
@@ -93,7 +104,7 @@ def mfa_verify():
             if totp.verify(mfa_code):
                 session['mfa_verified'] = True
                 session['mfa_setup_complete'] = True
-                db.session.add(AuditLog(user_id=current_user.id, action="MFA verified"))
+                record_audit(current_user.id, "MFA verified")
                 db.session.commit()
                 app.logger.info(f"MFA verified for user {current_user.username}")
                 flash("MFA verification successful.", "alert-success")
@@ -112,7 +123,7 @@ def mfa_verify():
 @login_required
 def logout():
     username = current_user.username
-    db.session.add(AuditLog(user_id=current_user.id, action="Logged out"))
+    record_audit(current_user.id, "Logged out")
     db.session.commit()
     app.logger.info(f"User {username} logged out.")
     logout_user()
@@ -142,7 +153,7 @@ def redirect_based_on_role(user):
 
     logout_user()
     session.clear()
-    db.session.add(AuditLog(user_id=user.id, action="Logout due to invalid role"))
+    record_audit(user.id, "Logout due to invalid role")
     db.session.commit()
     app.logger.warning(f"Invalid role detected for user {user.username}: {user.role}")
     flash("Invalid user role detected. Contact admin.", "alert-danger")
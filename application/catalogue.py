@@ -0,0 +1,110 @@
+import threading
+import time
+
+from flask import current_app as app
+from sqlalchemy import insert, update
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import db
+from .models import CatalogueVersion, Subject, class_subject, detached_copy, teacher_subject
+
+_load_lock = threading.Lock()
+
+
+def _stored_version():
+    version = db.session.query(CatalogueVersion.version).filter_by(name=CatalogueVersion.SUBJECTS).scalar()
+    return version or 0
+
+
+def _load_catalogue(version):
+    subjects = {}
+    for subject in Subject.query.order_by(Subject.name.asc(), Subject.id).all():
+        cached = detached_copy(subject)
+        make_transient_to_detached(cached)
+        subjects[subject.id] = cached
+
+    by_class, by_teacher = {}, {}
+    # subjects is in name order, so each class's list comes out sorted by name as well
+    order = {subject_id: position for position, subject_id in enumerate(subjects)}
+    for class_id, subject_id in db.session.query(class_subject.c.class_id, class_subject.c.subject_id):
+        by_class.setdefault(class_id, []).append(subject_id)
+    for subject_ids in by_class.values():
+        subject_ids.sort(key=order.__getitem__)
+    for teacher_id, subject_id in db.session.query(teacher_subject.c.teacher_id, teacher_subject.c.subject_id):
+        by_teacher.setdefault(teacher_id, set()).add(subject_id)
+
+    return {
+        "version": version,
+        "subjects": subjects,
+        "by_class": {class_id: tuple(ids) for class_id, ids in by_class.items()},
+        "by_teacher": {teacher_id: frozenset(ids) for teacher_id, ids in by_teacher.items()},
+    }
+
+
+def _catalogue():
+    """The per-process subject catalogue, reloaded when catalogue_version moves.
+
+    The stored version is consulted at most once per SUBJECT_CATALOGUE_CHECK_INTERVAL seconds; between checks
+    every read is served from memory.
+    """
+    cache = app.extensions.setdefault("subject_catalogue", {})
+    now = time.monotonic()
+    catalogue = cache.get("catalogue")
+    if catalogue is not None and now < cache.get("check_after", 0):
+        return catalogue
+    with _load_lock:
+        version = _stored_version()
+        catalogue = cache.get("catalogue")
+        if catalogue is None or catalogue["version"] != version:
+            catalogue = _load_catalogue(version)
+            cache["catalogue"] = catalogue
+        cache["check_after"] = now + app.config.get("SUBJECT_CATALOGUE_CHECK_INTERVAL", 30)
+    return catalogue
+
+
+def _attached(catalogue, subject_ids):
+    subjects = catalogue["subjects"]
+    return [db.session.merge(subjects[subject_id], load=False) for subject_id in subject_ids if subject_id in subjects]
+
+
+def class_subjects(class_id, include_deactivated=False):
+    """Subjects assigned to a class, by name."""
+    catalogue = _catalogue()
+    subject_ids = catalogue["by_class"].get(class_id, ())
+    if not include_deactivated:
+        subject_ids = [subject_id for subject_id in subject_ids if not catalogue["subjects"][subject_id].deactivated]
+    return _attached(catalogue, subject_ids)
+
+
+def subjects_by_class(include_deactivated=False):
+    """Every class's subjects, as {class_id: [subjects by name]}."""
+    catalogue = _catalogue()
+    return {class_id: class_subjects(class_id, include_deactivated) for class_id in catalogue["by_class"]}
+
+
+def teacher_subject_ids(teacher_id):
+    """Ids of the subjects assigned to a teacher."""
+    return _catalogue()["by_teacher"].get(teacher_id, frozenset())
+
+
+def teacher_subjects(teacher_id):
+    """Subjects assigned to a teacher, by name."""
+    catalogue = _catalogue()
+    assigned = teacher_subject_ids(teacher_id)
+    return _attached(catalogue, [subject_id for subject_id in catalogue["subjects"] if subject_id in assigned])
+
+
+def bump_subject_catalogue():
+    """Mark the subject catalogue stale, inside the caller's transaction.
+
+    Call it before committing a change to subjects, class_subject or teacher_subject. This process reloads on its
+    next read; other processes reload once their next version check sees the committed bump.
+    """
+    result = db.session.execute(
+        update(CatalogueVersion)
+        .where(CatalogueVersion.name == CatalogueVersion.SUBJECTS)
+        .values(version=CatalogueVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(CatalogueVersion).values(name=CatalogueVersion.SUBJECTS, version=1))
+    app.extensions.get("subject_catalogue", {}).clear()
@@ -0,0 +1,275 @@
+from collections import defaultdict
+
+import click
+from flask import current_app as app
+from flask.cli import AppGroup
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import (
+    Classes, EnrollmentCounter, EnrollmentSnapshot, FeePayment, Session, Student, StudentClassHistory, TERM_ORDINALS
+)
+
+# Keeps IN lists and multi-row inserts well inside every backend's parameter limits
+SNAPSHOT_CHUNK_SIZE = 500
+
+
+def _chunks(items, size=SNAPSHOT_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def snapshot_rows(student_ids=None):
+    """Derive enrollment_snapshot rows from class histories, approvals and fee payments.
+
+    A student's latest enrollment in each session (by join date) counts when it is still active, and yields
+    one row for every term it covers - the same rule get_students_query applied before the snapshot existed.
+    """
+    history_query = (
+        db.session.query(
+            StudentClassHistory.id, StudentClassHistory.student_id, StudentClassHistory.session_id,
+            StudentClassHistory.class_id, StudentClassHistory.start_term, StudentClassHistory.end_term,
+            StudentClassHistory.is_active, StudentClassHistory.leave_date, Classes.hierarchy, Student.approved
+        )
+        .join(Student, Student.id == StudentClassHistory.student_id)
+        .outerjoin(Classes, Classes.id == StudentClassHistory.class_id)
+        .order_by(StudentClassHistory.join_date, StudentClassHistory.id)
+    )
+    fee_query = db.session.query(FeePayment.student_id, FeePayment.session_id, FeePayment.term).filter(
+        FeePayment.has_paid_fee == True
+    )
+    if student_ids is not None:
+        history_query = history_query.filter(StudentClassHistory.student_id.in_(student_ids))
+        fee_query = fee_query.filter(FeePayment.student_id.in_(student_ids))
+
+    latest = {}
+    for history in history_query:
+        latest[(history.student_id, history.session_id)] = history
+    paid = {tuple(row) for row in fee_query}
+
+    rows = []
+    for (student_id, session_id), history in latest.items():
+        if not history.is_active or history.leave_date is not None:
+            continue
+        start_order = TERM_ORDINALS.get(history.start_term, 1)
+        end_order = TERM_ORDINALS.get(history.end_term, 4) if history.end_term else 4
+        for term, term_order in TERM_ORDINALS.items():
+            if start_order <= term_order <= end_order:
+                rows.append({
+                    "session_id": session_id,
+                    "term": term,
+                    "student_id": student_id,
+                    "class_id": history.class_id,
+                    "hierarchy": history.hierarchy,
+                    "approved": bool(history.approved),
+                    "fee_paid": (student_id, session_id, term) in paid,
+                })
+    return rows
+
+
+def _counter_key(session_id, term, class_id):
+    return session_id, term, class_id or 0
+
+
+def _current_rows(student_ids):
+    rows = db.session.query(
+        EnrollmentSnapshot.session_id, EnrollmentSnapshot.term, EnrollmentSnapshot.class_id,
+        EnrollmentSnapshot.approved, EnrollmentSnapshot.fee_paid
+    ).filter(EnrollmentSnapshot.student_id.in_(student_ids))
+    return [row._asdict() for row in rows]
+
+
+def _bump_counter(session_id, term, class_id, total, approved, fees_paid):
+    # Relative updates so concurrent transactions touching the same class don't overwrite each other
+    result = db.session.execute(
+        update(EnrollmentCounter)
+        .where(
+            EnrollmentCounter.session_id == session_id,
+            EnrollmentCounter.term == term,
+            EnrollmentCounter.class_id == class_id
+        )
+        .values(
+            total=EnrollmentCounter.total + total,
+            approved=EnrollmentCounter.approved + approved,
+            fees_paid=EnrollmentCounter.fees_paid + fees_paid
+        )
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(EnrollmentCounter).values(
+                session_id=session_id, term=term, class_id=class_id,
+                total=total, approved=approved, fees_paid=fees_paid
+            ))
+    except IntegrityError:
+        # Another transaction created the counter first; add to it instead
+        _bump_counter(session_id, term, class_id, total, approved, fees_paid)
+
+
+def _apply_counter_deltas(old_rows, new_rows):
+    """Move enrollment_counter by the difference between a set of students' old and new snapshot rows."""
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for sign, rows in ((-1, old_rows), (1, new_rows)):
+        for row in rows:
+            delta = deltas[_counter_key(row["session_id"], row["term"], row["class_id"])]
+            delta[0] += sign
+            delta[1] += sign if row["approved"] else 0
+            delta[2] += sign if row["fee_paid"] else 0
+
+    for (session_id, term, class_id), (total, approved, fees_paid) in deltas.items():
+        if not (total or approved or fees_paid):
+            continue
+        _bump_counter(session_id, term, class_id, total, approved, fees_paid)
+
+
+def refresh_enrollment_snapshot(student_ids):
+    """Rewrite the snapshot rows and counters of the given students inside the caller's transaction.
+
+    Call it after changing a student's class history, approval or fee status and before committing,
+    so the snapshot commits (or rolls back) together with the change.
+    """
+    student_ids = sorted({student_id for student_id in student_ids if student_id is not None})
+    if not student_ids:
+        return 0
+    db.session.flush()
+    written = 0
+    for chunk in _chunks(student_ids):
+        old_rows = _current_rows(chunk)
+        db.session.execute(EnrollmentSnapshot.__table__.delete().where(EnrollmentSnapshot.student_id.in_(chunk)))
+        rows = snapshot_rows(chunk)
+        if rows:
+            db.session.execute(insert(EnrollmentSnapshot), rows)
+        _apply_counter_deltas(old_rows, rows)
+        written += len(rows)
+    return written
+
+
+def remove_from_enrollment_snapshot(student_ids):
+    """Drop deleted students' snapshot rows and take them off the counters."""
+    student_ids = sorted({student_id for student_id in student_ids if student_id is not None})
+    for chunk in _chunks(student_ids):
+        _apply_counter_deltas(_current_rows(chunk), [])
+        db.session.execute(EnrollmentSnapshot.__table__.delete().where(EnrollmentSnapshot.student_id.in_(chunk)))
+
+
+def rebuild_enrollment_snapshot():
+    """Recompute the whole snapshot from the class history and reset the counters; returns the rows written."""
+    db.session.execute(EnrollmentSnapshot.__table__.delete())
+    rows = snapshot_rows()
+    for chunk in _chunks(rows):
+        db.session.execute(insert(EnrollmentSnapshot), chunk)
+    reconcile_enrollment_counters(commit=False)
+    db.session.commit()
+    return len(rows)
+
+
+def update_snapshot_hierarchy(class_id, hierarchy):
+    """Carry a class's new hierarchy onto its snapshot rows."""
+    db.session.execute(
+        EnrollmentSnapshot.__table__.update()
+        .where(EnrollmentSnapshot.class_id == class_id)
+        .values(hierarchy=hierarchy)
+    )
+
+
+def count_enrollments(session_id=None, term=None):
+    """Recount enrolled, approved and fee-paying students per (session, term, class) from the snapshot."""
+    query = db.session.query(
+        EnrollmentSnapshot.session_id, EnrollmentSnapshot.term, EnrollmentSnapshot.class_id,
+        func.count(EnrollmentSnapshot.student_id),
+        func.sum(case((EnrollmentSnapshot.approved == True, 1), else_=0)),
+        func.sum(case((EnrollmentSnapshot.fee_paid == True, 1), else_=0)),
+    ).group_by(EnrollmentSnapshot.session_id, EnrollmentSnapshot.term, EnrollmentSnapshot.class_id)
+    if session_id is not None:
+        query = query.filter(EnrollmentSnapshot.session_id == session_id)
+    if term is not None:
+        query = query.filter(EnrollmentSnapshot.term == term)
+    counts = defaultdict(lambda: (0, 0, 0))
+    for row_session_id, row_term, class_id, total, approved, fees_paid in query:
+        key = _counter_key(row_session_id, row_term, class_id)
+        previous = counts[key]
+        counts[key] = (previous[0] + total, previous[1] + int(approved), previous[2] + int(fees_paid))
+    return dict(counts)
+
+
+def reconcile_enrollment_counters(session_id=None, term=None, commit=True):
+    """Overwrite counters that drifted from a full recount of the snapshot; returns how many were corrected."""
+    actual = count_enrollments(session_id, term)
+    query = EnrollmentCounter.query
+    if session_id is not None:
+        query = query.filter(EnrollmentCounter.session_id == session_id)
+    if term is not None:
+        query = query.filter(EnrollmentCounter.term == term)
+    stored = {
+        _counter_key(counter.session_id, counter.term, counter.class_id): counter
+        for counter in query.with_for_update()
+    }
+
+    corrected = 0
+    for key in set(actual) | set(stored):
+        total, approved, fees_paid = actual.get(key, (0, 0, 0))
+        counter = stored.get(key)
+        if counter is None:
+            db.session.add(EnrollmentCounter(
+                session_id=key[0], term=key[1], class_id=key[2], total=total, approved=approved, fees_paid=fees_paid
+            ))
+        elif (counter.total, counter.approved, counter.fees_paid) != (total, approved, fees_paid):
+            app.logger.warning(
+                f"Enrollment counter {key} drifted: stored {(counter.total, counter.approved, counter.fees_paid)}, "
+                f"recounted {(total, approved, fees_paid)}"
+            )
+            counter.total, counter.approved, counter.fees_paid = total, approved, fees_paid
+        else:
+            continue
+        corrected += 1
+    if commit:
+        db.session.commit()
+    return corrected
+
+
+def enrollment_stats(session_id, term, class_id=None):
+    """Read enrolled, approved and fee-paying counts for a term (optionally one class) from the counters.
+
+    Read-only; drift is corrected by the `flask enrollment-snapshot reconcile` cron command.
+    """
+    query = db.session.query(
+        func.coalesce(func.sum(EnrollmentCounter.total), 0),
+        func.coalesce(func.sum(EnrollmentCounter.approved), 0),
+        func.coalesce(func.sum(EnrollmentCounter.fees_paid), 0),
+    ).filter(EnrollmentCounter.session_id == session_id, EnrollmentCounter.term == term)
+    if class_id is not None:
+        query = query.filter(EnrollmentCounter.class_id == class_id)
+    total_students, approved_students, fees_paid = (int(value) for value in query.one())
+    return {
+        "total_students": total_students,
+        "approved_students": approved_students,
+        "fees_paid": fees_paid,
+        "fees_unpaid": total_students - fees_paid,
+    }
+
+
+enrollment_cli = AppGroup("enrollment-snapshot", help="Maintain the enrollment snapshot table.")
+
+
+@enrollment_cli.command("rebuild")
+def rebuild_command():
+    """Recompute enrollment_snapshot from the class history."""
+    written = rebuild_enrollment_snapshot()
+    app.logger.info(f"Rebuilt enrollment snapshot with {written} rows")
+    click.echo(f"Wrote {written} enrollment snapshot rows")
+
+
+@enrollment_cli.command("reconcile")
+@click.option("--session", "session_year", help="Session year, e.g. 2024/2025. Defaults to every session.")
+def reconcile_command(session_year):
+    """Recount the dashboard counters from the snapshot and fix any drift; suitable for cron."""
+    session_id = None
+    if session_year:
+        session_obj = Session.query.filter_by(year=session_year).first()
+        if session_obj is None:
+            raise click.ClickException("Session not found.")
+        session_id = session_obj.id
+    corrected = reconcile_enrollment_counters(session_id)
+    click.echo(f"Corrected {corrected} enrollment counters")
@@ -0,0 +1,332 @@
+import json
+import random
+from bisect import bisect_right
+from string import Formatter
+
+from flask import current_app, has_app_context
+
+# (lowest total, grade, remark) per band; a school overrides them with the GRADE_BOUNDARIES setting
+DEFAULT_GRADE_BOUNDARIES = [
+    (95, "A+", "Outstanding"),
+    (80, "A", "Excellent"),
+    (70, "B+", "Very Good"),
+    (65, "B", "Good"),
+    (60, "C+", "Credit"),
+    (50, "C", "Credit"),
+    (40, "D", "Poor"),
+    (30, "E", "Very Poor"),
+    (0, "F", "Failed"),
+]
+
+
+class GradeScale:
+    """Grade and subject remark bands held as a sorted threshold array and looked up with bisect.
+
+    Totals below the lowest threshold fall into the lowest band.
+    """
+
+    def __init__(self, boundaries):
+        bands = sorted((float(minimum), str(grade), str(remark)) for minimum, grade, remark in boundaries)
+        if not bands:
+            raise ValueError("A grade scale needs at least one band.")
+        self.thresholds = [minimum for minimum, _, _ in bands]
+        if len(set(self.thresholds)) != len(self.thresholds):
+            raise ValueError("Grade band thresholds must be distinct.")
+        self.bands = [(grade, remark) for _, grade, remark in bands]
+
+    def lookup(self, total):
+        """Return (grade, remark) for a total, or ("", "") when there is no total."""
+        if total is None:
+            return "", ""
+        return self.bands[max(bisect_right(self.thresholds, total) - 1, 0)]
+
+    def grade(self, total):
+        return self.lookup(total)[0]
+
+    def remark(self, total):
+        return self.lookup(total)[1]
+
+    def grade_many(self, totals):
+        """(grade, remark) for each of a class's totals, in order."""
+        return [self.lookup(total) for total in totals]
+
+
+def _compile(template):
+    # Split once into (literal, field) pieces so formatting a remark is a join, not a parse
+    return tuple((literal, field) for literal, field, _, _ in Formatter().parse(template))
+
+
+def _render(pieces, names):
+    return "".join(literal + (names[field] if field else "") for literal, field in pieces)
+
+
+def _names(student):
+    first_name = student.first_name if student else "Student"
+    last_name = student.last_name if student else ""
+    return {"first_name": first_name, "last_name": last_name, "full_name": f"{first_name} {last_name}".strip()}
+
+
+class RemarkTable:
+    """Term remark options per average band, parsed once and formatted with each student's names."""
+
+    def __init__(self, remarks):
+        self.thresholds = sorted(remarks)
+        self.options = [[_compile(template) for template in remarks[threshold]] for threshold in self.thresholds]
+
+    def _index(self, average):
+        return bisect_right(self.thresholds, average) - 1
+
+    def band(self, average):
+        """The threshold of the band an average falls in; remarks are regenerated when it changes."""
+        if average is None:
+            return None
+        return self.thresholds[max(self._index(average), 0)]
+
+    def remark(self, average, student=None, rng=random):
+        if average is None:
+            return ""
+        index = self._index(average)
+        if index < 0:
+            return ""
+        return _render(rng.choice(self.options[index]), _names(student))
+
+    def remark_many(self, averages_and_students, rng=random):
+        """A remark for each (average, student) pair, in order."""
+        return [self.remark(average, student, rng) for average, student in averages_and_students]
+
+
+PRINCIPAL_REMARKS = RemarkTable({
+    95: [
+        "Truly exceptional, {full_name}! Your stellar achievement is a shining example for all students at this school.",
+        "Phenomenal results, {first_name}! You’ve set a benchmark for excellence across nursery, primary, and secondary levels.",
+        "Superb performance, {full_name}! You’ve outdone yourself and brought pride to our institution.",
+        "{first_name}, your outstanding dedication has paid off brilliantly! A top-tier result worthy of celebration.",
+        "Absolutely remarkable, {full_name}! Your consistency and brilliance are unmatched in this term.",
+        "{first_name} {last_name}, you are a star pupil! Your exceptional scores reflect your hard work and potential.",
+        "An extraordinary feat, {first_name}! Your academic prowess inspires both peers and teachers alike."
+    ],
+    90: [
+        "Exceptional performance, {full_name}! You are an inspiration to others in this school, keep it up!",
+        "Outstanding results, {first_name}! You’ve set high standards that others should aspire to achieve.",
+        "Excellent work, {full_name}! You’ve proven yourself as a top performer across all levels.",
+        "{first_name}, your brilliant effort this term is commendable! A fantastic example for your classmates.",
+        "Well done, {full_name}! Your dedication to excellence shines through in these impressive results.",
+        "{first_name} {last_name}, you’ve shown remarkable skill and focus! A truly outstanding achievement.",
+        "A splendid performance, {first_name}! Your consistency is paving the way for a bright future."
+    ],
+    80: [
+        "Very impressive performance, {full_name}! Aim for even higher success in the next term.",
+        "Great job, {first_name}! Your efforts are commendable and show promise for greater heights.",
+        "Consistently good results, {full_name}. Keep striving for excellence in all you do!",
+        "{first_name}, you’ve done wonderfully this term! Push a little more to reach the top.",
+        "Well done, {full_name}! Your hard work is evident, and greater achievements are within reach.",
+        "{first_name} {last_name}, a solid effort! Maintain this pace and aim for perfection.",
+        "Bravo, {first_name}! Your performance is strong—keep building on this excellent foundation."
+    ],
+    70: [
+        "Good performance, {full_name}! With a little more effort, you’ll excel further in your studies.",
+        "{first_name}, you’ve done well this term, but there’s room to improve and shine brighter.",
+        "Nice results, {full_name}! Strive for greater achievements with focus and determination.",
+        "{first_name} {last_name}, a commendable effort! Keep pushing to unlock your full potential.",
+        "Well done, {full_name}! You’re on a good path—add more diligence for outstanding success.",
+        "{first_name}, your performance is solid! Aim higher by working on your weaker areas.",
+        "A promising result, {full_name}! Consistency and extra effort will take you far."
+    ],
+    65: [
+        "Satisfactory effort, {full_name}. Aim to push beyond the basics for better outcomes.",
+        "{first_name}, you’re doing alright, but consistency is key to reaching higher grades.",
+        "Good start, {full_name}! Work harder to climb to the next level of success.",
+        "{first_name} {last_name}, a fair performance! More focus will help you improve greatly.",
+        "{full_name}, you’ve laid a foundation—build on it with dedication and study.",
+        "{first_name}, your effort is noted! Aim higher by strengthening your skills this term.",
+        "Acceptable results, {full_name}. Step up your game to achieve more in your academics."
+    ],
+    60: [
+        "Fair performance, {full_name}. Keep pushing for better results in the coming terms.",
+        "{first_name}, you’re on the right track—focus on improving your weaker subjects.",
+        "A decent effort, {full_name}! Keep working hard to achieve more and excel.",
+        "{first_name} {last_name}, you’ve shown some progress! More effort will yield greater rewards.",
+        "{full_name}, an okay result—strengthen your study habits for a stronger outcome.",
+        "{first_name}, you’re moving forward! Target your challenges to boost your scores.",
+        "Moderate success, {full_name}. Determination will help you rise above this level."
+    ],
+    50: [
+        "An average performance, {full_name}. Aim for consistent improvement in all subjects.",
+        "{first_name}, your results are satisfactory, but you can do much better with effort.",
+        "A fair effort, {full_name}! Focus and determination will lead to greater success.",
+        "{first_name} {last_name}, you’re at the midpoint—work harder to stand out next term.",
+        "{full_name}, this is a starting point! Build your skills to improve your grades.",
+        "{first_name}, an acceptable result—push beyond average with serious study habits.",
+        "Room for growth, {full_name}! Take your studies seriously to see better outcomes."
+    ],
+    40: [
+        "Below average, {full_name}. Significant improvement is required to succeed.",
+        "{first_name}, your performance is concerning—seek guidance to improve this term.",
+        "You need to focus more, {full_name}! Extra effort will help you catch up.",
+        "{first_name} {last_name}, this isn’t your best—work with teachers to do better.",
+        "{full_name}, your results need attention! Take action to boost your understanding.",
+        "{first_name}, a weak performance—commit to studying harder for progress.",
+        "Low scores, {full_name}. Let’s work together to turn this around next term."
+    ],
+    30: [
+        "Poor results, {full_name}. A lot more effort is needed to improve your standing.",
+        "{first_name}, your performance requires immediate attention and serious work.",
+        "Seek extra help, {full_name}! Address your challenges to succeed this year.",
+        "{first_name} {last_name}, this is below expectations—let’s find ways to improve.",
+        "{full_name}, your scores are low—dedicate more time to your books and lessons.",
+        "{first_name}, a tough term—extra support can help you overcome these struggles.",
+        "Very concerning, {full_name}! Act now to avoid falling further behind."
+    ],
+    0: [
+        "Unacceptable performance, {full_name}. Take your studies seriously from now on.",
+        "{first_name}, drastic improvement is needed to progress in your academics.",
+        "This is not satisfactory, {full_name}! Immediate action is required to improve.",
+        "{first_name} {last_name}, a worrying result—commit to change this outcome.",
+        "{full_name}, your effort is lacking—focus on your education starting today.",
+        "{first_name}, this performance is poor—let’s work together to fix this urgently.",
+        "No progress, {full_name}! Serious dedication is needed to move forward."
+    ]
+})
+
+TEACHER_REMARKS = RemarkTable({
+    95: [
+        "Absolutely outstanding, {full_name}! You’re a model student for others to follow.",
+        "Exceptional effort, {first_name}! Your results shine brightly this term—keep it up!",
+        "Top-tier performance, {full_name}! Your hard work is truly impressive and inspiring.",
+        "{first_name} {last_name}, you’ve excelled brilliantly! A star in every subject.",
+        "{full_name}, your dedication is remarkable! You’ve set a high standard this term.",
+        "{first_name}, an amazing result! Your focus and brilliance are commendable.",
+        "Perfect scores, {full_name}! You’re a joy to teach and a pride to this class."
+    ],
+    90: [
+        "Outstanding performance, {full_name}! Keep shining in all your subjects.",
+        "{first_name}, your dedication to learning is inspiring—well done this term!",
+        "An exemplary effort, {full_name}! Your hard work has paid off wonderfully.",
+        "{first_name} {last_name}, fantastic results! You’re a leader among your peers.",
+        "{full_name}, you’ve done exceptionally well! Maintain this excellent momentum.",
+        "{first_name}, a brilliant term! Your consistency is paving your path to success.",
+        "Great work, {full_name}! Your effort stands out as one of the best this term."
+    ],
+    80: [
+        "A good performance, {full_name}! Focus on consistent excellence moving forward.",
+        "{first_name}, your hard work is paying off—keep aiming higher each term!",
+        "You’ve done very well, {full_name}! Push your limits for even better results.",
+        "{first_name} {last_name}, solid effort! You’re close to the top—keep going!",
+        "{full_name}, a strong showing! Build on this to reach outstanding heights.",
+        "{first_name}, well done! Your progress is notable—aim for perfection next time.",
+        "Impressive, {full_name}! Stay committed to rise even higher in your studies."
+    ],
+    70: [
+        "Good result, {full_name}! Practice more to perfect your skills this term.",
+        "{first_name}, you’re doing well—focus on weaker areas to improve further.",
+        "A good effort, {full_name}! Strive to achieve even better in your subjects.",
+        "{first_name} {last_name}, nice work! Extra study will boost your grades.",
+        "{full_name}, you’re on track—target your challenges for greater success.",
+        "{first_name}, a fair result! Keep up the effort to reach higher scores.",
+        "Promising, {full_name}! More attention to detail will lift your performance."
+    ],
+    65: [
+        "Decent result, {full_name}. Build on this foundation for better grades.",
+        "{first_name}, you’re improving—more effort will yield stronger outcomes.",
+        "Satisfactory, {full_name}! Aim higher with consistent practice and focus.",
+        "{first_name} {last_name}, a good base! Work harder to climb higher.",
+        "{full_name}, you’re getting there—strengthen your study habits now.",
+        "{first_name}, fair effort! Target key areas to improve your standing.",
+        "Acceptable, {full_name}! Step up your game to excel in your class."
+    ],
+    60: [
+        "Fair result, {full_name}. Put in more effort to rise above this level.",
+        "{first_name}, you’re progressing—focus on difficult topics to improve.",
+        "With more effort, {full_name}, your performance will improve significantly!",
+        "{first_name} {last_name}, an okay term! Push harder for better results.",
+        "{full_name}, you’re moving along—work on weak spots for growth.",
+        "{first_name}, a modest outcome! Extra study will make a big difference.",
+        "Moderate effort, {full_name}! Keep pushing to unlock your potential."
+    ],
+    50: [
+        "An average performance, {full_name}. Work on improving your fundamentals.",
+        "{first_name}, you’ve done okay—additional practice will help you grow.",
+        "Keep working on weaker subjects, {full_name}, to build a strong foundation!",
+        "{first_name} {last_name}, fair results! Aim higher with more effort.",
+        "{full_name}, this is average—focus more to improve your scores.",
+        "{first_name}, a starting point! Serious study will lift you up.",
+        "Room to grow, {full_name}! Dedicate time to see better progress."
+    ],
+    40: [
+        "Below average, {full_name}. Concentrate on improving your basics this term.",
+        "{first_name}, your performance is concerning—seek help to address challenges.",
+        "Weak results, {full_name}! Focus on understanding the core concepts.",
+        "{first_name} {last_name}, this needs work—let’s improve together.",
+        "{full_name}, low scores—commit to studying harder for better outcomes.",
+        "{first_name}, a tough term—extra support can turn this around.",
+        "Struggling, {full_name}! Let’s tackle your weak areas urgently."
+    ],
+    30: [
+        "Very poor performance, {full_name}. A focused study plan is necessary now.",
+        "{first_name}, you need additional support to overcome your difficulties.",
+        "Your results are below expectations, {full_name}! Put in much more effort.",
+        "{first_name} {last_name}, this is concerning—let’s work on improvement.",
+        "{full_name}, low grades—spend more time with your books and teachers.",
+        "{first_name}, a challenging term—seek help to boost your understanding.",
+        "Poor showing, {full_name}! Act quickly to improve your academics."
+    ],
+    0: [
+        "Unacceptable, {full_name}. Urgent attention to your studies is required.",
+        "{first_name}, a very poor performance—take your academics seriously now!",
+        "This is concerning, {full_name}! Take your studies more seriously.",
+        "{first_name} {last_name}, no progress—let’s change this urgently.",
+        "{full_name}, your effort is lacking—focus on your education today.",
+        "{first_name}, a worrying result—commit to improvement immediately.",
+        "Critical, {full_name}! Serious dedication is needed to move forward."
+    ]
+})
+
+DEFAULT_GRADE_SCALE = GradeScale(DEFAULT_GRADE_BOUNDARIES)
+
+
+def parse_grade_boundaries(boundaries):
+    """Build a GradeScale from a GRADE_BOUNDARIES setting, raising ValueError that names the setting if malformed.
+
+    The setting is a list of [lowest total, grade, remark] bands, or the same as a JSON string.
+    """
+    try:
+        parsed = json.loads(boundaries) if isinstance(boundaries, str) else boundaries
+        if not isinstance(parsed, (list, tuple)) or not all(
+            isinstance(band, (list, tuple)) and len(band) == 3 for band in parsed
+        ):
+            raise ValueError("expected a list of [lowest total, grade, remark] bands")
+        return GradeScale(parsed)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid GRADE_BOUNDARIES setting {boundaries!r}: {e}") from e
+
+
+def init_grade_scale(app):
+    """Parse and validate GRADE_BOUNDARIES once at startup, so a bad value stops the app instead of every grading call."""
+    boundaries = app.config.get("GRADE_BOUNDARIES")
+    if boundaries:
+        app.extensions["grade_scale"] = (boundaries, parse_grade_boundaries(boundaries))
+
+
+def grade_scale():
+    """The configured grade scale, rebuilt only when the GRADE_BOUNDARIES setting changes."""
+    if not has_app_context():
+        return DEFAULT_GRADE_SCALE
+    boundaries = current_app.config.get("GRADE_BOUNDARIES")
+    if not boundaries:
+        return DEFAULT_GRADE_SCALE
+    cached = current_app.extensions.get("grade_scale")
+    if cached is None or cached[0] != boundaries:
+        cached = (boundaries, parse_grade_boundaries(boundaries))
+        current_app.extensions["grade_scale"] = cached
+    return cached[1]
+
+
+def grade_totals(totals):
+    """Grade and remark a whole class's subject totals in one call; returns [(grade, remark), ...]."""
+    return grade_scale().grade_many(totals)
+
+
+def term_remarks(averages_and_students, rng=random):
+    """Principal and teacher remarks for each (term average, student) pair; returns [(principal, teacher), ...]."""
+    pairs = list(averages_and_students)
+    return list(zip(PRINCIPAL_REMARKS.remark_many(pairs, rng), TEACHER_REMARKS.remark_many(pairs, rng)))
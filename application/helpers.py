@@ -1,17 +1,30 @@
-import random
+import base64
+import binascii
+import json
+import math
+import re
+import tempfile
+import time
 import openpyxl
-from io import BytesIO
-from openpyxl.styles import Font, Border, Side, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Border, Side, Alignment, NamedStyle
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.page import PageMargins
 from flask import flash, redirect, url_for, current_app as app
-from sqlalchemy import or_, and_, case, func, exists
+from sqlalchemy import or_, and_, case, func, exists, select, update
 from sqlalchemy.exc import OperationalError
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, selectinload
 from functools import wraps
 
 from collections import defaultdict
 from . import db
-from .models import Student, Session, Subject, Result, StudentTermSummary, class_teacher, Classes, Teacher, TermEnum, StudentClassHistory, FeePayment, class_subject
+from .pdf_cache import pdf_cache
+from .enrollment import enrollment_stats
+from .grading import PRINCIPAL_REMARKS, TEACHER_REMARKS, grade_scale, grade_totals, term_remarks
+from .sequences import allocate_employee_id
+from .catalogue import class_subjects, subjects_by_class as catalogue_subjects_by_class
+from .models import Student, Session, Result, StudentTermSummary, class_teacher, Classes, TermEnum, StudentClassHistory, FeePayment, EnrollmentSnapshot, class_subject, TERM_ORDINALS
 from application.auth.forms import SubjectResultForm
 
 def require_session_and_term(f):
@@ -46,35 +59,13 @@ def validate_and_flash(form, redirect_url):
 
 def generate_employee_id(first_name, last_name):
     """Generate a unique employee ID in the format first_name.last_name with number if needed."""
-    # Convert to lowercase and remove any spaces or special characters
-    base_id = f"{first_name.lower()}.{last_name.lower()}"
-
     try:
-        # Query for existing teachers with similar employee IDs
-        existing_teachers = Teacher.query.filter(
-            Teacher.employee_id.like(f"{base_id}%")
-        ).order_by(Teacher.employee_id).all()
-
-        if not existing_teachers:
-            return base_id  # Return base ID if no existing matches
-
-        # Get all existing IDs
-        existing_ids = [teacher.employee_id for teacher in existing_teachers]
-
-        if base_id not in existing_ids:
-            return base_id  # Return base ID if it's not taken
-
-        # Find the next available number
-        counter = 1
-        while True:
-            new_id = f"{base_id}{counter}"
-            if new_id not in existing_ids:
-                return new_id
-            counter += 1
-
+        # Numbered from a per-name counter row instead of loading every similar employee ID
+        return allocate_employee_id(first_name, last_name)
     except Exception as e:
         app.logger.error(f"Error generating employee ID: {str(e)}")
         raise
+
 def get_teacher_classes(teacher_id, session_id, term):
     """Get classes assigned to a teacher for a specific session and term, falling back to previous if none exist."""
     current_assignments = db.session.query(Classes).join(class_teacher).filter(
@@ -97,12 +88,8 @@ def get_teacher_classes(teacher_id, session_id, term):
 def get_subjects_by_class_name(class_id, include_deactivated=False):
     """Get subjects assigned to a class via class_subject association."""
     try:
-        # Query subjects linked to this class via class_subject
-        query = Subject.query.join(class_subject).filter(class_subject.c.class_id == class_id)
-        if not include_deactivated:
-            query = query.filter(Subject.deactivated == False)
-        subjects = query.order_by(Subject.name.asc()).all()
-        return subjects
+        # Served from the versioned in-process catalogue rather than a class_subject join per page
+        return class_subjects(class_id, include_deactivated)
     except OperationalError as e:
         app.logger.error(f"Database error fetching subjects : {str(e)}")
         return []
@@ -123,247 +110,26 @@ def populate_form_with_results(form, subjects, results_dict):
 
 def calculate_grade(total):
     """Calculate grade based on total score."""
-    if total is None: return ""
-    if total >= 95: return "A+"
-    elif total >= 80: return "A"
-    elif total >= 70: return "B+"
-    elif total >= 65: return "B"
-    elif total >= 60: return "C+"
-    elif total >= 50: return "C"
-    elif total >= 40: return "D"
-    elif total >= 30: return "E"
-    return "F"
+    return grade_scale().grade(total)
 
 def generate_remark(total):
     """Generate remark based on total score."""
-    if total is None: return ""
-    if total >= 95: return "Outstanding"
-    elif total >= 80: return "Excellent"
-    elif total >= 70: return "Very Good"
-    elif total >= 65: return "Good"
-    elif total >= 60: return "Credit"
-    elif total >= 50: return "Credit"
-    elif total >= 40: return "Poor"
-    elif total >= 30: return "Very Poor"
-    return "Failed"
+    return grade_scale().remark(total)
 
 def get_threshold(average):
     """Determine the threshold range for a given average."""
-    if average is None:
-        return None
-    thresholds = [0, 30, 40, 50, 60, 65, 70, 80, 90, 95]
-    for i in range(len(thresholds) - 1):
-        if thresholds[i] <= average < thresholds[i + 1]:
-            return thresholds[i]
-    return thresholds[-1] if average >= thresholds[-1] else thresholds[0]
+    return PRINCIPAL_REMARKS.band(average)
 
 def generate_principal_remark(average, student=None):
     """Generate principal's remark based on average, optionally using student object."""
-    if average is None: return ""
-    first_name = student.first_name if student else "Student"
-    last_name = student.last_name if student else ""
-    full_name = f"{first_name} {last_name}".strip()
-
-    remarks = {
-        95: [
-            f"Truly exceptional, {full_name}! Your stellar achievement is a shining example for all students at this school.",
-            f"Phenomenal results, {first_name}! You’ve set a benchmark for excellence across nursery, primary, and secondary levels.",
-            f"Superb performance, {full_name}! You’ve outdone yourself and brought pride to our institution.",
-            f"{first_name}, your outstanding dedication has paid off brilliantly! A top-tier result worthy of celebration.",
-            f"Absolutely remarkable, {full_name}! Your consistency and brilliance are unmatched in this term.",
-            f"{first_name} {last_name}, you are a star pupil! Your exceptional scores reflect your hard work and potential.",
-            f"An extraordinary feat, {first_name}! Your academic prowess inspires both peers and teachers alike."
-        ],
-        90: [
-            f"Exceptional performance, {full_name}! You are an inspiration to others in this school, keep it up!",
-            f"Outstanding results, {first_name}! You’ve set high standards that others should aspire to achieve.",
-            f"Excellent work, {full_name}! You’ve proven yourself as a top performer across all levels.",
-            f"{first_name}, your brilliant effort this term is commendable! A fantastic example for your classmates.",
-            f"Well done, {full_name}! Your dedication to excellence shines through in these impressive results.",
-            f"{first_name} {last_name}, you’ve shown remarkable skill and focus! A truly outstanding achievement.",
-            f"A splendid performance, {first_name}! Your consistency is paving the way for a bright future."
-        ],
-        80: [
-            f"Very impressive performance, {full_name}! Aim for even higher success in the next term.",
-            f"Great job, {first_name}! Your efforts are commendable and show promise for greater heights.",
-            f"Consistently good results, {full_name}. Keep striving for excellence in all you do!",
-            f"{first_name}, you’ve done wonderfully this term! Push a little more to reach the top.",
-            f"Well done, {full_name}! Your hard work is evident, and greater achievements are within reach.",
-            f"{first_name} {last_name}, a solid effort! Maintain this pace and aim for perfection.",
-            f"Bravo, {first_name}! Your performance is strong—keep building on this excellent foundation."
-        ],
-        70: [
-            f"Good performance, {full_name}! With a little more effort, you’ll excel further in your studies.",
-            f"{first_name}, you’ve done well this term, but there’s room to improve and shine brighter.",
-            f"Nice results, {full_name}! Strive for greater achievements with focus and determination.",
-            f"{first_name} {last_name}, a commendable effort! Keep pushing to unlock your full potential.",
-            f"Well done, {full_name}! You’re on a good path—add more diligence for outstanding success.",
-            f"{first_name}, your performance is solid! Aim higher by working on your weaker areas.",
-            f"A promising result, {full_name}! Consistency and extra effort will take you far."
-        ],
-        65: [
-            f"Satisfactory effort, {full_name}. Aim to push beyond the basics for better outcomes.",
-            f"{first_name}, you’re doing alright, but consistency is key to reaching higher grades.",
-            f"Good start, {full_name}! Work harder to climb to the next level of success.",
-            f"{first_name} {last_name}, a fair performance! More focus will help you improve greatly.",
-            f"{full_name}, you’ve laid a foundation—build on it with dedication and study.",
-            f"{first_name}, your effort is noted! Aim higher by strengthening your skills this term.",
-            f"Acceptable results, {full_name}. Step up your game to achieve more in your academics."
-        ],
-        60: [
-            f"Fair performance, {full_name}. Keep pushing for better results in the coming terms.",
-            f"{first_name}, you’re on the right track—focus on improving your weaker subjects.",
-            f"A decent effort, {full_name}! Keep working hard to achieve more and excel.",
-            f"{first_name} {last_name}, you’ve shown some progress! More effort will yield greater rewards.",
-            f"{full_name}, an okay result—strengthen your study habits for a stronger outcome.",
-            f"{first_name}, you’re moving forward! Target your challenges to boost your scores.",
-            f"Moderate success, {full_name}. Determination will help you rise above this level."
-        ],
-        50: [
-            f"An average performance, {full_name}. Aim for consistent improvement in all subjects.",
-            f"{first_name}, your results are satisfactory, but you can do much better with effort.",
-            f"A fair effort, {full_name}! Focus and determination will lead to greater success.",
-            f"{first_name} {last_name}, you’re at the midpoint—work harder to stand out next term.",
-            f"{full_name}, this is a starting point! Build your skills to improve your grades.",
-            f"{first_name}, an acceptable result—push beyond average with serious study habits.",
-            f"Room for growth, {full_name}! Take your studies seriously to see better outcomes."
-        ],
-        40: [
-            f"Below average, {full_name}. Significant improvement is required to succeed.",
-            f"{first_name}, your performance is concerning—seek guidance to improve this term.",
-            f"You need to focus more, {full_name}! Extra effort will help you catch up.",
-            f"{first_name} {last_name}, this isn’t your best—work with teachers to do better.",
-            f"{full_name}, your results need attention! Take action to boost your understanding.",
-            f"{first_name}, a weak performance—commit to studying harder for progress.",
-            f"Low scores, {full_name}. Let’s work together to turn this around next term."
-        ],
-        30: [
-            f"Poor results, {full_name}. A lot more effort is needed to improve your standing.",
-            f"{first_name}, your performance requires immediate attention and serious work.",
-            f"Seek extra help, {full_name}! Address your challenges to succeed this year.",
-            f"{first_name} {last_name}, this is below expectations—let’s find ways to improve.",
-            f"{full_name}, your scores are low—dedicate more time to your books and lessons.",
-            f"{first_name}, a tough term—extra support can help you overcome these struggles.",
-            f"Very concerning, {full_name}! Act now to avoid falling further behind."
-        ],
-        0: [
-            f"Unacceptable performance, {full_name}. Take your studies seriously from now on.",
-            f"{first_name}, drastic improvement is needed to progress in your academics.",
-            f"This is not satisfactory, {full_name}! Immediate action is required to improve.",
-            f"{first_name} {last_name}, a worrying result—commit to change this outcome.",
-            f"{full_name}, your effort is lacking—focus on your education starting today.",
-            f"{first_name}, this performance is poor—let’s work together to fix this urgently.",
-            f"No progress, {full_name}! Serious dedication is needed to move forward."
-        ]
-    }
-    for threshold, options in sorted(remarks.items(), reverse=True):
-        if average >= threshold:
-            return random.choice(options)
-    return ""
+    return PRINCIPAL_REMARKS.remark(average, student)
 
 def generate_teacher_remark(average, student=None):
     """Generate teacher's remark based on average, optionally using student object."""
-    if average is None: return ""
-    first_name = student.first_name if student else "Student"
-    last_name = student.last_name if student else ""
-    full_name = f"{first_name} {last_name}".strip()
-
-    remarks = {
-        95: [
-            f"Absolutely outstanding, {full_name}! You’re a model student for others to follow.",
-            f"Exceptional effort, {first_name}! Your results shine brightly this term—keep it up!",
-            f"Top-tier performance, {full_name}! Your hard work is truly impressive and inspiring.",
-            f"{first_name} {last_name}, you’ve excelled brilliantly! A star in every subject.",
-            f"{full_name}, your dedication is remarkable! You’ve set a high standard this term.",
-            f"{first_name}, an amazing result! Your focus and brilliance are commendable.",
-            f"Perfect scores, {full_name}! You’re a joy to teach and a pride to this class."
-        ],
-        90: [
-            f"Outstanding performance, {full_name}! Keep shining in all your subjects.",
-            f"{first_name}, your dedication to learning is inspiring—well done this term!",
-            f"An exemplary effort, {full_name}! Your hard work has paid off wonderfully.",
-            f"{first_name} {last_name}, fantastic results! You’re a leader among your peers.",
-            f"{full_name}, you’ve done exceptionally well! Maintain this excellent momentum.",
-            f"{first_name}, a brilliant term! Your consistency is paving your path to success.",
-            f"Great work, {full_name}! Your effort stands out as one of the best this term."
-        ],
-        80: [
-            f"A good performance, {full_name}! Focus on consistent excellence moving forward.",
-            f"{first_name}, your hard work is paying off—keep aiming higher each term!",
-            f"You’ve done very well, {full_name}! Push your limits for even better results.",
-            f"{first_name} {last_name}, solid effort! You’re close to the top—keep going!",
-            f"{full_name}, a strong showing! Build on this to reach outstanding heights.",
-            f"{first_name}, well done! Your progress is notable—aim for perfection next time.",
-            f"Impressive, {full_name}! Stay committed to rise even higher in your studies."
-        ],
-        70: [
-            f"Good result, {full_name}! Practice more to perfect your skills this term.",
-            f"{first_name}, you’re doing well—focus on weaker areas to improve further.",
-            f"A good effort, {full_name}! Strive to achieve even better in your subjects.",
-            f"{first_name} {last_name}, nice work! Extra study will boost your grades.",
-            f"{full_name}, you’re on track—target your challenges for greater success.",
-            f"{first_name}, a fair result! Keep up the effort to reach higher scores.",
-            f"Promising, {full_name}! More attention to detail will lift your performance."
-        ],
-        65: [
-            f"Decent result, {full_name}. Build on this foundation for better grades.",
-            f"{first_name}, you’re improving—more effort will yield stronger outcomes.",
-            f"Satisfactory, {full_name}! Aim higher with consistent practice and focus.",
-            f"{first_name} {last_name}, a good base! Work harder to climb higher.",
-            f"{full_name}, you’re getting there—strengthen your study habits now.",
-            f"{first_name}, fair effort! Target key areas to improve your standing.",
-            f"Acceptable, {full_name}! Step up your game to excel in your class."
-        ],
-        60: [
-            f"Fair result, {full_name}. Put in more effort to rise above this level.",
-            f"{first_name}, you’re progressing—focus on difficult topics to improve.",
-            f"With more effort, {full_name}, your performance will improve significantly!",
-            f"{first_name} {last_name}, an okay term! Push harder for better results.",
-            f"{full_name}, you’re moving along—work on weak spots for growth.",
-            f"{first_name}, a modest outcome! Extra study will make a big difference.",
-            f"Moderate effort, {full_name}! Keep pushing to unlock your potential."
-        ],
-        50: [
-            f"An average performance, {full_name}. Work on improving your fundamentals.",
-            f"{first_name}, you’ve done okay—additional practice will help you grow.",
-            f"Keep working on weaker subjects, {full_name}, to build a strong foundation!",
-            f"{first_name} {last_name}, fair results! Aim higher with more effort.",
-            f"{full_name}, this is average—focus more to improve your scores.",
-            f"{first_name}, a starting point! Serious study will lift you up.",
-            f"Room to grow, {full_name}! Dedicate time to see better progress."
-        ],
-        40: [
-            f"Below average, {full_name}. Concentrate on improving your basics this term.",
-            f"{first_name}, your performance is concerning—seek help to address challenges.",
-            f"Weak results, {full_name}! Focus on understanding the core concepts.",
-            f"{first_name} {last_name}, this needs work—let’s improve together.",
-            f"{full_name}, low scores—commit to studying harder for better outcomes.",
-            f"{first_name}, a tough term—extra support can turn this around.",
-            f"Struggling, {full_name}! Let’s tackle your weak areas urgently."
-        ],
-        30: [
-            f"Very poor performance, {full_name}. A focused study plan is necessary now.",
-            f"{first_name}, you need additional support to overcome your difficulties.",
-            f"Your results are below expectations, {full_name}! Put in much more effort.",
-            f"{first_name} {last_name}, this is concerning—let’s work on improvement.",
-            f"{full_name}, low grades—spend more time with your books and teachers.",
-            f"{first_name}, a challenging term—seek help to boost your understanding.",
-            f"Poor showing, {full_name}! Act quickly to improve your academics."
-        ],
-        0: [
-            f"Unacceptable, {full_name}. Urgent attention to your studies is required.",
-            f"{first_name}, a very poor performance—take your academics seriously now!",
-            f"This is concerning, {full_name}! Take your studies more seriously.",
-            f"{first_name} {last_name}, no progress—let’s change this urgently.",
-            f"{full_name}, your effort is lacking—focus on your education today.",
-            f"{first_name}, a worrying result—commit to improvement immediately.",
-            f"Critical, {full_name}! Serious dedication is needed to move forward."
-        ]
-    }
-    for threshold, options in sorted(remarks.items(), reverse=True):
-        if average >= threshold:
-            return random.choice(options)
-    return ""
+    return TEACHER_REMARKS.remark(average, student)
+
+TERM_ORDER = TERM_ORDINALS
+SCORE_LIMITS = {"class_assessment": 20, "summative_test": 20, "exam": 60}
 
 def get_last_term(current_term):
     """Get the previous term."""
@@ -381,54 +147,72 @@ def calculate_average(results):
     count = len(non_zero_results)
     return total_sum / count if count > 0 else 0, count
 
+def cumulative_from_term_averages(term_averages, term):
+    """Average the non-zero term averages up to and including the given term."""
+    current_term_order = TERM_ORDER.get(term)
+    if current_term_order is None:
+        return 0
+    valid_avgs = [
+        avg for term_name, avg in term_averages.items()
+        if TERM_ORDER.get(term_name, 0) <= current_term_order and avg is not None and avg > 0
+    ]
+    return sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
+
 def calculate_cumulative_average(student_id, term, session_id):
     """Calculate cumulative average based on term averages within a session."""
     try:
-        # Define term order using TermEnum
-        term_order = {
-            TermEnum.FIRST.value: 1,
-            TermEnum.SECOND.value: 2,
-            TermEnum.THIRD.value: 3
-        }
-        current_term_order = term_order.get(term, 1)
-
         # Query term averages from StudentTermSummary for the session
         term_summaries = StudentTermSummary.query.filter_by(
             student_id=student_id,
             session_id=session_id
         ).all()
 
-        # Extract term averages up to the current term
-        term_averages = {}
-        for summary in term_summaries:
-            if summary.term in term_order and summary.term_average is not None:
-                term_averages[summary.term] = summary.term_average
-
-        # Calculate cumulative average based on the current term
-        if current_term_order == 1:  # First Term
-            return term_averages.get(TermEnum.FIRST.value, 0)
-        elif current_term_order == 2:  # Second Term
-            first_avg = term_averages.get(TermEnum.FIRST.value, 0)
-            second_avg = term_averages.get(TermEnum.SECOND.value, 0)
-            valid_avgs = [avg for avg in [first_avg, second_avg] if avg > 0]
-            return sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
-        elif current_term_order == 3:  # Third Term
-            first_avg = term_averages.get(TermEnum.FIRST.value, 0)
-            second_avg = term_averages.get(TermEnum.SECOND.value, 0)
-            third_avg = term_averages.get(TermEnum.THIRD.value, 0)
-            valid_avgs = [avg for avg in [first_avg, second_avg, third_avg] if avg > 0]
-            return sum(valid_avgs) / len(valid_avgs) if valid_avgs else 0
-        return 0  # Default case if term is invalid
+        term_averages = {
+            summary.term: summary.term_average
+            for summary in term_summaries
+            if summary.term in TERM_ORDER and summary.term_average is not None
+        }
+        return cumulative_from_term_averages(term_averages, term)
     except OperationalError as e:
         app.logger.error(f"Database error in calculate_cumulative_average: {str(e)}")
         raise
 
+def apply_result_delta(term_summary, old_total, new_total):
+    """Shift a term summary's grand total, subject count and term average by one Result's change in total."""
+    old_total = old_total or 0
+    new_total = new_total or 0
+    term_summary.grand_total = (term_summary.grand_total or 0) - old_total + new_total
+    term_summary.subjects_offered = (term_summary.subjects_offered or 0) - (old_total > 0) + (new_total > 0)
+    term_summary.term_average = (
+        round(term_summary.grand_total / term_summary.subjects_offered, 1) if term_summary.subjects_offered else 0
+    )
+
+def refresh_session_averages(term_summaries):
+    """Recompute cumulative and last-term averages across one student's term summaries for a session."""
+    term_averages = {
+        summary.term: summary.term_average
+        for summary in term_summaries
+        if summary.term_average is not None
+    }
+    summaries_by_class_term = {(summary.class_id, summary.term): summary for summary in term_summaries}
+    for summary in term_summaries:
+        summary.cumulative_average = round(cumulative_from_term_averages(term_averages, summary.term), 1)
+        last_term = get_last_term(summary.term)
+        last_summary = summaries_by_class_term.get((summary.class_id, last_term)) if last_term else None
+        summary.last_term_average = last_summary.term_average if last_summary else None
+
+def remarks_need_refresh(term_summary, previous_average):
+    """Check whether the average crossed a remark threshold or the summary has no remarks yet."""
+    average = term_summary.term_average
+    if average is None:
+        return False
+    return get_threshold(previous_average) != get_threshold(average) or term_summary.principal_remark is None
+
 def update_results_helper(student, term, session_id, form, result_form, class_id):
     """Update student results with form data, using session_id."""
     try:
         next_term_begins = result_form.next_term_begins.data
         date_issued = result_form.date_issued.data
-        position = result_form.position.data
 
         for subject_form in form.subjects:
             subject_id_raw = subject_form.subject_id.data
@@ -444,7 +228,6 @@ def update_results_helper(student, term, session_id, form, result_form, class_id
                 "exam": subject_form.exam.data or None,
                 "next_term_begins": next_term_begins or None,
                 "date_issued": date_issued or None,
-                "position": position or None,
             }
             save_result(student.id, subject_id, term, session_id, data, class_id=class_id)
     except Exception as e:
@@ -452,29 +235,34 @@ def update_results_helper(student, term, session_id, form, result_form, class_id
         raise
 
 def save_result(student_id, subject_id, term, session_id, data, class_id):
+    """Save one Result and update the student's term summary from the change in that result's total.
+
+    Class positions are not recomputed here; save_results_bulk and rebuild_term_summaries re-rank the class.
+    """
     try:
         class_assessment = int(data.get("class_assessment", 0)) if data.get("class_assessment") not in [None, '', '0'] else None
         summative_test = int(data.get("summative_test", 0)) if data.get("summative_test") not in [None, '', '0'] else None
         exam = int(data.get("exam", 0)) if data.get("exam") not in [None, '', '0'] else None
-        position = data.get("position")
         next_term_begins = data.get("next_term_begins")
         date_issued = data.get("date_issued")
 
-        student = Student.query.filter_by(id=student_id).first()
-        if not student:
+        # Lock the student's summaries for the session so concurrent saves apply their deltas one at a time
+        session_summaries = StudentTermSummary.query.filter_by(
+            student_id=student_id,
+            session_id=session_id
+        ).with_for_update().all()
+        term_summary = next(
+            (summary for summary in session_summaries if summary.term == term and summary.class_id == class_id),
+            None
+        )
+
+        if term_summary is None and db.session.get(Student, student_id) is None:
             raise ValueError(f"Student with ID {student_id} not found.")
 
-        # Calculate current_average BEFORE applying the new result
-        existing_results = Result.query.filter_by(
-            student_id=student_id,
-            term=term,
-            session_id=session_id,
-            class_id=class_id
-        ).all()
-        current_average = round(calculate_average(existing_results)[0], 1) if existing_results else None
-        current_threshold = get_threshold(current_average) if current_average is not None else None
+        current_average = term_summary.term_average if term_summary else None
 
         result = None
+        old_total = new_total = None
         if subject_id:
             total_components = [x for x in [class_assessment, summative_test, exam] if x is not None]
             total = sum(total_components) if total_components else None
@@ -492,6 +280,7 @@ def save_result(student_id, subject_id, term, session_id, data, class_id):
             if result or any([class_assessment, summative_test, exam]):
                 if result:
                     # Update existing result
+                    old_total = result.total
                     result.class_assessment = class_assessment
                     result.summative_test = summative_test
                     result.exam = exam
@@ -514,58 +303,46 @@ def save_result(student_id, subject_id, term, session_id, data, class_id):
                         remark=remark,
                     )
                     db.session.add(result)
+                new_total = total
 
                 db.session.flush()
 
-        # Calculate new aggregates AFTER applying the result
-        grand_total, average, cumulative_average, last_term_average, subjects_offered = calculate_results(student_id, term, session_id, class_id)
-        new_threshold = get_threshold(average) if average is not None else None
-
-        term_summary = StudentTermSummary.query.filter_by(
-            student_id=student_id,
-            term=term,
-            session_id=session_id,
-            class_id=class_id
-        ).first()
-
         if term_summary:
-            term_summary.grand_total = grand_total
-            term_summary.term_average = average
-            term_summary.cumulative_average = cumulative_average
-            term_summary.last_term_average = last_term_average
-            term_summary.subjects_offered = subjects_offered
-
-            if average is not None:
-                if current_threshold is None or current_threshold != new_threshold or term_summary.principal_remark is None:
-                    term_summary.principal_remark = generate_principal_remark(average, student)
-                    term_summary.teacher_remark = generate_teacher_remark(average, student)
-
-            if position is not None:
-                term_summary.position = None if position == "" else position
-            if next_term_begins is not None:
-                term_summary.next_term_begins = None if next_term_begins == "" else next_term_begins
-            if date_issued is not None:
-                term_summary.date_issued = None if date_issued == "" else date_issued
+            apply_result_delta(term_summary, old_total, new_total)
         else:
+            # No summary yet for this student/term, so seed it from the results already saved
+            results = Result.query.filter_by(
+                student_id=student_id,
+                term=term,
+                session_id=session_id,
+                class_id=class_id
+            ).all()
+            average, subjects_offered = calculate_average(results)
             term_summary = StudentTermSummary(
                 student_id=student_id,
                 term=term,
                 session_id=session_id,
                 class_id=class_id,
-                grand_total=grand_total,
-                term_average=average,
-                cumulative_average=cumulative_average,
-                last_term_average=last_term_average,
+                grand_total=sum(r.total for r in results if r.total is not None) or 0,
+                term_average=round(average, 1) if average else 0,
                 subjects_offered=subjects_offered,
-                principal_remark=generate_principal_remark(average, student) if average is not None else None,
-                teacher_remark=generate_teacher_remark(average, student) if average is not None else None,
-                position=None if position == "" else position,
-                next_term_begins=None if next_term_begins == "" else next_term_begins,
-                date_issued=None if date_issued == "" else date_issued,
             )
             db.session.add(term_summary)
+            session_summaries.append(term_summary)
+
+        refresh_session_averages(session_summaries)
+        if remarks_need_refresh(term_summary, current_average):
+            student = db.session.get(Student, student_id)
+            term_summary.principal_remark = generate_principal_remark(term_summary.term_average, student)
+            term_summary.teacher_remark = generate_teacher_remark(term_summary.term_average, student)
+
+        if next_term_begins is not None:
+            term_summary.next_term_begins = None if next_term_begins == "" else next_term_begins
+        if date_issued is not None:
+            term_summary.date_issued = None if date_issued == "" else date_issued
 
         db.session.commit()
+        pdf_cache.invalidate(session_id, term, class_id, student_id)
         return result
     except ValueError as e:
         db.session.rollback()
@@ -602,32 +379,250 @@ def save_class_wide_fields(class_id, session_id, term, data):
 
         updated = False
         for term_summary in term_summaries:
-            app.logger.info(f"Before update - term_summary.next_term_begins: {term_summary.next_term_begins}, date_issued: {term_summary.date_issued}")
+            app.logger.debug(f"Before update - term_summary.next_term_begins: {term_summary.next_term_begins}, date_issued: {term_summary.date_issued}")
             if next_term_begins is not None:  # None means no update from client
                 if next_term_begins == "":
                     term_summary.next_term_begins = None
-                    app.logger.info("next_term_begins cleared to None")
+                    app.logger.debug("next_term_begins cleared to None")
                 else:
                     term_summary.next_term_begins = next_term_begins
-                    app.logger.info(f"next_term_begins set to: {next_term_begins}")
+                    app.logger.debug(f"next_term_begins set to: {next_term_begins}")
                 updated = True
             if date_issued is not None:  # None means no update from client
                 if date_issued == "":
                     term_summary.date_issued = None
-                    app.logger.info("date_issued cleared to None")
+                    app.logger.debug("date_issued cleared to None")
                 else:
                     term_summary.date_issued = date_issued
-                    app.logger.info(f"date_issued set to: {date_issued}")
+                    app.logger.debug(f"date_issued set to: {date_issued}")
                 updated = True
-            app.logger.info(f"After update - term_summary.next_term_begins: {term_summary.next_term_begins}, date_issued: {term_summary.date_issued}")
+            app.logger.debug(f"After update - term_summary.next_term_begins: {term_summary.next_term_begins}, date_issued: {term_summary.date_issued}")
 
         db.session.flush()  # Ensure changes are staged
+        if updated:
+            pdf_cache.invalidate(session_id, term, class_id)
         return len(term_summaries) if updated else 0  # Return count only if changes were made
     except OperationalError as e:
         db.session.rollback()
         app.logger.error(f"Database error in save_class_wide_fields: {str(e)}")
         raise
 
+def recompute_term_summaries(class_id, session_id, term, student_ids, results_by_student):
+    """Recompute the term summaries of the given students from their already-loaded Result rows."""
+    summaries_by_student = defaultdict(list)
+    for summary in StudentTermSummary.query.filter(
+        StudentTermSummary.student_id.in_(student_ids),
+        StudentTermSummary.session_id == session_id
+    ).with_for_update().all():
+        summaries_by_student[summary.student_id].append(summary)
+
+    term_summaries = {}
+    stale_remarks = []
+    for student_id in student_ids:
+        student_results = results_by_student.get(student_id, [])
+        session_summaries = summaries_by_student[student_id]
+        term_summary = next(
+            (summary for summary in session_summaries if summary.term == term and summary.class_id == class_id),
+            None
+        )
+        if term_summary is None:
+            term_summary = StudentTermSummary(student_id=student_id, class_id=class_id, session_id=session_id, term=term)
+            db.session.add(term_summary)
+            session_summaries.append(term_summary)
+
+        previous_average = term_summary.term_average
+        average, subjects_offered = calculate_average(student_results)
+        term_summary.grand_total = sum(r.total for r in student_results if r.total is not None) or 0
+        term_summary.term_average = round(average, 1) if average else 0
+        term_summary.subjects_offered = subjects_offered
+        refresh_session_averages(session_summaries)
+        if remarks_need_refresh(term_summary, previous_average):
+            stale_remarks.append(term_summary)
+        term_summaries[student_id] = term_summary
+
+    if stale_remarks:
+        students = {
+            student.id: student
+            for student in Student.query.filter(Student.id.in_({summary.student_id for summary in stale_remarks})).all()
+        }
+        remarks = term_remarks(
+            (term_summary.term_average, students.get(term_summary.student_id)) for term_summary in stale_remarks
+        )
+        for term_summary, (principal_remark, teacher_remark) in zip(stale_remarks, remarks):
+            term_summary.principal_remark = principal_remark
+            term_summary.teacher_remark = teacher_remark
+    return term_summaries
+
+def rebuild_term_summaries(class_id, session_id, term):
+    """Recompute every StudentTermSummary aggregate for a class/term from its Result rows."""
+    try:
+        results = Result.query.filter_by(class_id=class_id, session_id=session_id, term=term).all()
+        results_by_student = defaultdict(list)
+        for result in results:
+            results_by_student[result.student_id].append(result)
+
+        existing_ids = db.session.query(StudentTermSummary.student_id).filter_by(
+            class_id=class_id, session_id=session_id, term=term
+        ).all()
+        student_ids = set(results_by_student) | {student_id for (student_id,) in existing_ids}
+        if not student_ids:
+            return 0
+
+        recompute_term_summaries(class_id, session_id, term, student_ids, results_by_student)
+        db.session.flush()
+        update_class_positions(class_id, session_id, term)
+        pdf_cache.invalidate(session_id, term, class_id)
+        app.logger.info(f"Rebuilt {len(student_ids)} term summaries for class {class_id}, session {session_id}, term {term}")
+        return len(student_ids)
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in rebuild_term_summaries: {str(e)}")
+        raise
+
+def parse_score(value):
+    """Convert a submitted score to an int, treating blanks and '0' strings as empty like save_result does."""
+    return int(value) if value not in [None, '', '0'] else None
+
+def save_results_bulk(class_id, session_id, term, cells, student_fields=None):
+    """Validate and upsert many Result cells for a class/term, recomputing each affected student's summary once.
+
+    ``cells`` is an iterable of dicts with student_id, subject_id and the score fields; ``student_fields`` maps
+    student_id to next_term_begins/date_issued. Class positions are recomputed afterwards. Changes are flushed,
+    not committed, so the caller owns the transaction.
+    """
+    student_fields = student_fields or {}
+    try:
+        scores_by_cell = {}
+        errors = []
+        for cell in cells:
+            key = (int(cell["student_id"]), int(cell["subject_id"]))
+            scores = {field: parse_score(cell.get(field)) for field in SCORE_LIMITS}
+            for field, limit in SCORE_LIMITS.items():
+                if scores[field] is not None and not 0 <= scores[field] <= limit:
+                    errors.append(f"{field} for student {key[0]}, subject {key[1]} must be between 0 and {limit}")
+            scores_by_cell[key] = scores
+
+        student_ids = {student_id for student_id, _ in scores_by_cell} | set(student_fields)
+        if not student_ids:
+            return 0
+
+        enrolled_ids = {
+            student_id for (student_id,) in db.session.query(StudentClassHistory.student_id).filter(
+                StudentClassHistory.session_id == session_id,
+                StudentClassHistory.class_id == class_id,
+                StudentClassHistory.student_id.in_(student_ids)
+            ).all()
+        }
+        class_subject_ids = {
+            subject_id for (subject_id,) in db.session.query(class_subject.c.subject_id).filter(
+                class_subject.c.class_id == class_id
+            ).all()
+        }
+        errors.extend(f"Student {student_id} is not enrolled in this class" for student_id in sorted(student_ids - enrolled_ids))
+        errors.extend(
+            f"Subject {subject_id} is not offered in this class"
+            for subject_id in sorted({subject_id for _, subject_id in scores_by_cell} - class_subject_ids)
+        )
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        results_by_student = defaultdict(list)
+        existing = {}
+        for result in Result.query.filter(
+            Result.class_id == class_id,
+            Result.session_id == session_id,
+            Result.term == term,
+            Result.student_id.in_(student_ids)
+        ).all():
+            results_by_student[result.student_id].append(result)
+            existing[(result.student_id, result.subject_id)] = result
+
+        new_results = []
+        saved = 0
+        totals = {}
+        for cell, scores in scores_by_cell.items():
+            total_components = [x for x in scores.values() if x is not None]
+            totals[cell] = sum(total_components) if total_components else None
+        grades = dict(zip(totals, grade_totals(totals.values())))
+        for (student_id, subject_id), scores in scores_by_cell.items():
+            total = totals[(student_id, subject_id)]
+            result = existing.get((student_id, subject_id))
+            if result is None and not any(scores.values()):
+                continue
+            if result is None:
+                result = Result(student_id=student_id, subject_id=subject_id, term=term, session_id=session_id, class_id=class_id)
+                new_results.append(result)
+                results_by_student[student_id].append(result)
+            result.class_assessment = scores["class_assessment"]
+            result.summative_test = scores["summative_test"]
+            result.exam = scores["exam"]
+            result.total = total
+            result.grade, result.remark = grades[(student_id, subject_id)]
+            saved += 1
+        db.session.add_all(new_results)
+
+        term_summaries = recompute_term_summaries(class_id, session_id, term, student_ids, results_by_student)
+        for student_id, fields in student_fields.items():
+            term_summary = term_summaries[student_id]
+            for field in ("next_term_begins", "date_issued"):
+                value = fields.get(field)
+                if value is not None:
+                    setattr(term_summary, field, None if value == "" else value)
+
+        db.session.flush()
+        update_class_positions(class_id, session_id, term)
+        pdf_cache.invalidate(session_id, term, class_id)
+        app.logger.info(f"Saved {saved} results for {len(student_ids)} students in class {class_id}, session {session_id}, term {term}")
+        return saved
+    except ValueError as e:
+        db.session.rollback()
+        app.logger.error(f"Invalid input in save_results_bulk: {str(e)}")
+        raise
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in save_results_bulk: {str(e)}")
+        raise
+
+def ordinal(number):
+    """Format a rank as an ordinal string, e.g. 1st, 2nd, 3rd, 11th, 22nd."""
+    if 10 <= number % 100 <= 20:
+        suffix = "th"
+    else:
+        suffix = {1: "st", 2: "nd", 3: "rd"}.get(number % 10, "th")
+    return f"{number}{suffix}"
+
+def update_class_positions(class_id, session_id, term):
+    """Rank a class's term summaries by term average and write ordinal positions back in one UPDATE."""
+    try:
+        rank = func.rank().over(
+            partition_by=StudentTermSummary.class_id,
+            order_by=StudentTermSummary.term_average.desc()
+        )
+        ranked = db.session.execute(
+            select(StudentTermSummary.id, rank.label("rank")).where(
+                StudentTermSummary.class_id == class_id,
+                StudentTermSummary.session_id == session_id,
+                StudentTermSummary.term == term,
+                StudentTermSummary.subjects_offered > 0
+            )
+        ).all()
+
+        positions = {summary_id: ordinal(position) for summary_id, position in ranked}
+        db.session.execute(
+            update(StudentTermSummary).where(
+                StudentTermSummary.class_id == class_id,
+                StudentTermSummary.session_id == session_id,
+                StudentTermSummary.term == term
+            ).values(
+                position=case(positions, value=StudentTermSummary.id, else_=None) if positions else None
+            ).execution_options(synchronize_session="fetch")
+        )
+        return len(positions)
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error in update_class_positions: {str(e)}")
+        raise
+
 def calculate_results(student_id, term, session_id, class_id):
     """Calculate student results and averages with optimized queries."""
     try:
@@ -660,160 +655,305 @@ def calculate_results(student_id, term, session_id, class_id):
         app.logger.error(f"Database error in calculate_results: {str(e)}")
         raise
 
-def prepare_broadsheet_data(students, subjects, term, session_year, class_id, session_id):
-    """Prepare data for broadsheet with class_id and session_id."""
+def load_broadsheet_records(class_id, session_id, term, student_ids):
+    """Fetch all Result and StudentTermSummary rows for a class/term in two queries, keyed by student_id.
+
+    Summaries are returned in descending term-average order so callers can list students by rank.
+    """
+    results_by_student = defaultdict(list)
+    summaries_by_student = {}
+    if not student_ids:
+        return results_by_student, summaries_by_student
+
+    results = Result.query.filter(
+        Result.class_id == class_id,
+        Result.session_id == session_id,
+        Result.term == term,
+        Result.student_id.in_(student_ids)
+    ).all()
+    for result in results:
+        results_by_student[result.student_id].append(result)
+
+    term_summaries = StudentTermSummary.query.filter(
+        StudentTermSummary.class_id == class_id,
+        StudentTermSummary.session_id == session_id,
+        StudentTermSummary.term == term,
+        StudentTermSummary.student_id.in_(student_ids)
+    ).order_by(StudentTermSummary.term_average.desc(), StudentTermSummary.student_id).all()
+    for term_summary in term_summaries:
+        summaries_by_student.setdefault(term_summary.student_id, term_summary)
+
+    return results_by_student, summaries_by_student
+
+def build_broadsheet_data(students, subjects, results_by_student, summaries_by_student):
+    """Pivot loaded Result/StudentTermSummary rows into per-student broadsheet rows and per-subject averages.
+
+    Students with a summary come first in the summaries' order; the rest follow in the given order.
+    """
     broadsheet_data = []
     subject_averages = {subject.id: {"total": 0, "count": 0} for subject in subjects}
-    try:
-        for student in students:
-            student_results = {
-                "student": student,
-                "results": {subject.id: None for subject in subjects},
-                "grand_total": "",
-                "average": "",
-                "cumulative_average": "",
-                "position": None,
-                "principal_remark": "",
-                "teacher_remark": "",
-                "next_term_begins": None,
-                "date_issued": None
-            }
+    students_by_id = {student.id: student for student in students}
+    ranked_students = [students_by_id[student_id] for student_id in summaries_by_student if student_id in students_by_id]
+    unranked_students = [student for student in students if student.id not in summaries_by_student]
+    for student in ranked_students + unranked_students:
+        student_results = {
+            "student": student,
+            "results": {subject.id: None for subject in subjects},
+            "grand_total": "",
+            "average": "",
+            "cumulative_average": "",
+            "position": None,
+            "principal_remark": "",
+            "teacher_remark": "",
+            "next_term_begins": None,
+            "date_issued": None
+        }
 
-            results = Result.query.filter_by(
-                student_id=student.id,
-                term=term,
-                session_id=session_id,
-                class_id=class_id
-            ).all()
+        results = results_by_student.get(student.id, [])
+        term_summary = summaries_by_student.get(student.id)
 
-            term_summary = StudentTermSummary.query.filter_by(
-                student_id=student.id,
-                term=term,
-                session_id=session_id,
-                class_id=class_id
-            ).first()
+        for result in results:
+            if result.subject_id in student_results["results"]:
+                student_results["results"][result.subject_id] = result
+                if result.total is not None and result.total > 0:
+                    subject_averages[result.subject_id]["total"] += result.total
+                    subject_averages[result.subject_id]["count"] += 1
 
-            for result in results:
-                if result.subject_id in student_results["results"]:
-                    student_results["results"][result.subject_id] = result
-                    if result.total is not None and result.total > 0:
-                        subject_averages[result.subject_id]["total"] += result.total
-                        subject_averages[result.subject_id]["count"] += 1
-
-            if term_summary:
-                student_results["grand_total"] = int(term_summary.grand_total) if term_summary.grand_total not in ("", None) else ""
-                student_results["average"] = float(term_summary.term_average) if term_summary.term_average not in ("", None) else ""
-                student_results["cumulative_average"] = float(term_summary.cumulative_average) if term_summary.cumulative_average not in ("", None) else ""
-                student_results["position"] = term_summary.position if term_summary.position not in ("", None) else ""
-                student_results["principal_remark"] = term_summary.principal_remark if term_summary.principal_remark not in ("", None) else ""
-                student_results["teacher_remark"] = term_summary.teacher_remark if term_summary.teacher_remark not in ("", None) else ""
-                student_results["next_term_begins"] = term_summary.next_term_begins
-                student_results["date_issued"] = term_summary.date_issued
-
-            broadsheet_data.append(student_results)
-
-        for subject_id, values in subject_averages.items():
-            values["average"] = round(values["total"] / values["count"], 1) if values["count"] else ""
-
-        broadsheet_data.sort(
-            key=lambda x: float(x["average"]) if isinstance(x["average"], (int, float, str)) and x["average"] not in ("", None) else 0,
-            reverse=True
-        )
+        if term_summary:
+            student_results["grand_total"] = int(term_summary.grand_total) if term_summary.grand_total not in ("", None) else ""
+            student_results["average"] = float(term_summary.term_average) if term_summary.term_average not in ("", None) else ""
+            student_results["cumulative_average"] = float(term_summary.cumulative_average) if term_summary.cumulative_average not in ("", None) else ""
+            student_results["position"] = term_summary.position if term_summary.position not in ("", None) else ""
+            student_results["principal_remark"] = term_summary.principal_remark if term_summary.principal_remark not in ("", None) else ""
+            student_results["teacher_remark"] = term_summary.teacher_remark if term_summary.teacher_remark not in ("", None) else ""
+            student_results["next_term_begins"] = term_summary.next_term_begins
+            student_results["date_issued"] = term_summary.date_issued
+
+        broadsheet_data.append(student_results)
+
+    for subject_id, values in subject_averages.items():
+        values["average"] = round(values["total"] / values["count"], 1) if values["count"] else ""
 
-        return broadsheet_data, subject_averages
+    return broadsheet_data, subject_averages
+
+def prepare_broadsheet_data(students, subjects, term, session_year, class_id, session_id):
+    """Prepare data for broadsheet with class_id and session_id."""
+    try:
+        results_by_student, summaries_by_student = load_broadsheet_records(
+            class_id, session_id, term, [student.id for student in students]
+        )
+        return build_broadsheet_data(students, subjects, results_by_student, summaries_by_student)
     except OperationalError as e:
         app.logger.error(f"Database error preparing broadsheet data: {str(e)}")
         raise
 
-def generate_excel_broadsheet(class_name, term, session_year, broadsheet_data, subjects, subject_averages):
-    """Generate an Excel broadsheet."""
-    workbook = openpyxl.Workbook()
-    sheet = workbook.active
-    sheet.title = f"Broadsheet_{class_name}_{term}"[:31]
+def load_school_broadsheet_records(session_id, term):
+    """Load every class's broadsheet inputs for a session/term in four queries plus the subject catalogue.
+
+    Returns (classes, students_by_class, subjects_by_class, results_by_class, summaries_by_class) where the per-class
+    values mirror what load_broadsheet_records returns for a single class.
+    """
+    classes = Classes.query.order_by(Classes.hierarchy).all()
+
+    students_by_class = defaultdict(dict)
+    for history in StudentClassHistory.query.filter(
+        StudentClassHistory.session_id == session_id,
+        StudentClassHistory.is_active == True,
+        StudentClassHistory.leave_date.is_(None)
+    ).options(joinedload(StudentClassHistory.student)).all():
+        students_by_class[history.class_id].setdefault(history.student_id, history.student)
+
+    subjects_by_class = defaultdict(list, catalogue_subjects_by_class())
+
+    results_by_class = defaultdict(lambda: defaultdict(list))
+    for result in Result.query.filter(Result.session_id == session_id, Result.term == term).all():
+        results_by_class[result.class_id][result.student_id].append(result)
 
-    header_font = Font(bold=True, size=16, name="Times New Roman")
-    sub_header_font = Font(bold=True, size=12, name="Times New Roman")
-    cell_font = Font(bold=True, size=12, name="Times New Roman")
+    summaries_by_class = defaultdict(dict)
+    for term_summary in StudentTermSummary.query.filter(
+        StudentTermSummary.session_id == session_id,
+        StudentTermSummary.term == term
+    ).order_by(StudentTermSummary.term_average.desc(), StudentTermSummary.student_id).all():
+        summaries_by_class[term_summary.class_id].setdefault(term_summary.student_id, term_summary)
+
+    return classes, students_by_class, subjects_by_class, results_by_class, summaries_by_class
+
+BROADSHEET_SPOOL_BYTES = 8 * 1024 * 1024  # Finished workbooks larger than this spill to disk
+SHEET_TITLE_INVALID = re.compile(r"[\[\]:*?/\\]")
+SHEET_TITLE_LENGTH = 31
+
+def broadsheet_named_styles():
+    """Named styles shared by every broadsheet cell, registered once per workbook instead of styled per cell."""
     border = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
-    alignment = Alignment(horizontal="center", vertical="center")
-
-    # Calculate the last column based on the number of students and their columns
-    last_column = 2 + len(broadsheet_data) * 4  # 4 columns per student (C/A, S/T, Exam, Total)
-    sheet.merge_cells(start_row=1, start_column=2, end_row=1, end_column=last_column)
-    sheet["B1"] = f"Broadsheet for {class_name} - Term: {term}, Session: {session_year}"
-    sheet["B1"].alignment = Alignment(horizontal="center", vertical="center")
-    sheet["B1"].font = header_font
-
-    # Set column widths
-    sheet.column_dimensions[get_column_letter(1)].width = 30
-    sheet.column_dimensions[get_column_letter(last_column)].width = 15
-
-    # Create headers with student names
-    headers = [""]
-    for student_data in broadsheet_data:
-        student = student_data["student"]
-        headers.extend([f"{student.first_name} {student.last_name}", "", "", ""])
-    headers.append("Class Average")
-    sheet.append(headers)
-
-    # Merge cells for student names and apply styling
-    for i, student_data in enumerate(broadsheet_data, start=2):
-        start_col = 2 + (i - 2) * 4
-        end_col = start_col + 3
-        for col in range(start_col, end_col + 1):
-            sheet.column_dimensions[get_column_letter(col)].width = 7
-        sheet.merge_cells(start_row=2, start_column=start_col, end_row=2, end_column=end_col)
-        cell = sheet.cell(row=2, column=start_col)
-        cell.alignment = alignment
-        cell.font = sub_header_font
-
-    # Add sub-headers for C/A, S/T, Exam, Total
-    sub_headers = ["Subjects"] + ["C/A", "S/T", "Exam", "Total"] * len(broadsheet_data) + [""]
-    sheet.append(sub_headers)
-
-    # Add subject rows with student results
-    for subject in subjects:
-        row = [subject.name]
+    return [
+        NamedStyle(name="broadsheet_title", font=Font(bold=True, size=16, name="Times New Roman"), border=border,
+                   alignment=Alignment(horizontal="center", vertical="center")),
+        NamedStyle(name="broadsheet_label", font=Font(bold=True, size=12, name="Times New Roman"), border=border,
+                   alignment=Alignment(horizontal="left", vertical="center")),
+        NamedStyle(name="broadsheet_cell", font=Font(bold=True, size=12, name="Times New Roman"), border=border,
+                   alignment=Alignment(horizontal="center", vertical="center")),
+    ]
+
+class BroadsheetWriter:
+    """Write broadsheets row by row into a write-only workbook, one worksheet per class.
+
+    Rows go straight to the worksheet's temporary file, so memory stays flat however many classes are added.
+    """
+
+    def __init__(self):
+        self.workbook = openpyxl.Workbook(write_only=True)
+        for style in broadsheet_named_styles():
+            self.workbook.add_named_style(style)
+        self._titles = set()
+
+    def _sheet_title(self, title):
+        """Make a class name a valid, unique sheet title: no []:*?/\\, at most 31 characters, numbered if taken."""
+        base = SHEET_TITLE_INVALID.sub("-", title).strip("' ") or "Sheet"
+        candidate = base[:SHEET_TITLE_LENGTH]
+        number = 1
+        # Excel compares sheet titles case-insensitively
+        while candidate.lower() in self._titles:
+            number += 1
+            suffix = f" ({number})"
+            candidate = base[:SHEET_TITLE_LENGTH - len(suffix)] + suffix
+        self._titles.add(candidate.lower())
+        return candidate
+
+    def _row(self, sheet, values, width, first_style="broadsheet_label", style="broadsheet_cell"):
+        row = []
+        for column in range(width):
+            cell = WriteOnlyCell(sheet, value=values[column] if column < len(values) else None)
+            cell.style = first_style if column == 0 else style
+            row.append(cell)
+        return row
+
+    def add_class(self, class_name, term, session_year, broadsheet_data, subjects, subject_averages, title=None):
+        """Append one class's broadsheet: students across in blocks of four columns, subjects down."""
+        sheet = self.workbook.create_sheet(title=self._sheet_title(title or f"Broadsheet_{class_name}_{term}"))
+        last_column = 2 + len(broadsheet_data) * 4  # 4 columns per student (C/A, S/T, Exam, Total)
+
+        # Write-only sheets need widths, merges and page setup before any row is written
+        sheet.column_dimensions[get_column_letter(1)].width = 30
+        for column in range(2, last_column):
+            sheet.column_dimensions[get_column_letter(column)].width = 7
+        sheet.column_dimensions[get_column_letter(last_column)].width = 15
+        sheet.merged_cells.add(CellRange(min_col=2, min_row=1, max_col=last_column, max_row=1))
+        for index in range(len(broadsheet_data)):
+            start_col = 2 + index * 4
+            sheet.merged_cells.add(CellRange(min_col=start_col, min_row=2, max_col=start_col + 3, max_row=2))
+        sheet.page_setup.orientation = "landscape"
+        sheet.page_setup.paperSize = 9  # A4
+        sheet.page_margins = PageMargins(left=0.252, right=0.252, top=0.75, bottom=0.75, header=0.299, footer=0.299)
+
+        sheet.append(self._row(
+            sheet, ["", f"Broadsheet for {class_name} - Term: {term}, Session: {session_year}"], last_column,
+            style="broadsheet_title"
+        ))
+
+        headers = [""]
         for student_data in broadsheet_data:
-            result = student_data["results"][subject.id]
-            row.extend([
-                result.class_assessment if result and result.class_assessment is not None else "",
-                result.summative_test if result and result.summative_test is not None else "",
-                result.exam if result and result.exam is not None else "",
-                result.total if result and result.total is not None else "",
-            ])
-        row.append(subject_averages[subject.id]["average"] or "")
-        sheet.append(row)
-
-    # Add aggregate rows: Grand Total, Average, Position
-    sheet.append([""])  # Empty row for spacing
-    sheet.append(["Grand Total"] + sum([[ "", "", "", d["grand_total"] or ""] for d in broadsheet_data], []) + [""])
-    sheet.append(["Average"] + sum([[ "", "", "", d["average"] or ""] for d in broadsheet_data], []) + [""])
-    sheet.append(["Cumulative Average"] + sum([[ "", "", "", d["cumulative_average"] or ""] for d in broadsheet_data], []) + [""])
-    sheet.append(["Position"] + sum([[ "", "", "", d["position"] or ""] for d in broadsheet_data], []) + [""])
-
-    # Set page setup for printing
-    sheet.page_setup.orientation = sheet.ORIENTATION_LANDSCAPE
-    sheet.page_setup.paperSize = sheet.PAPERSIZE_A4
-    sheet.page_margins.top = 0.75
-    sheet.page_margins.bottom = 0.75
-    sheet.page_margins.left = 0.252
-    sheet.page_margins.right = 0.252
-    sheet.page_margins.header = 0.299
-    sheet.page_margins.footer = 0.299
-
-    # Apply borders, fonts, and alignment to all cells
-    for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row, min_col=1, max_col=sheet.max_column):
-        for cell in row:
-            cell.border = border
-            cell.font = cell_font
-            cell.alignment = Alignment(horizontal="left" if cell.column == 1 else "center", vertical="center")
-
-    # Save the workbook to a BytesIO stream
-    output = BytesIO()
-    workbook.save(output)
-    output.seek(0)
-    return output
+            student = student_data["student"]
+            headers.extend([f"{student.first_name} {student.last_name}", "", "", ""])
+        headers.append("Class Average")
+        sheet.append(self._row(sheet, headers, last_column))
+        sheet.append(self._row(sheet, ["Subjects"] + ["C/A", "S/T", "Exam", "Total"] * len(broadsheet_data) + [""], last_column))
+
+        for subject in subjects:
+            row = [subject.name]
+            for student_data in broadsheet_data:
+                result = student_data["results"][subject.id]
+                row.extend([
+                    result.class_assessment if result and result.class_assessment is not None else "",
+                    result.summative_test if result and result.summative_test is not None else "",
+                    result.exam if result and result.exam is not None else "",
+                    result.total if result and result.total is not None else "",
+                ])
+            row.append(subject_averages[subject.id]["average"] or "")
+            sheet.append(self._row(sheet, row, last_column))
+
+        sheet.append(self._row(sheet, [""], last_column))  # Empty row for spacing
+        for label, field in (("Grand Total", "grand_total"), ("Average", "average"),
+                             ("Cumulative Average", "cumulative_average"), ("Position", "position")):
+            row = [label]
+            for student_data in broadsheet_data:
+                row.extend(["", "", "", student_data[field] or ""])
+            row.append("")
+            sheet.append(self._row(sheet, row, last_column))
+        return sheet
+
+    def add_table(self, title, headers, rows, widths=None):
+        """Append a plain sheet with a header row followed by data rows."""
+        sheet = self.workbook.create_sheet(title=self._sheet_title(title))
+        for column, width in enumerate(widths or [], start=1):
+            sheet.column_dimensions[get_column_letter(column)].width = width
+        sheet.append(self._row(sheet, headers, len(headers), style="broadsheet_label"))
+        for row in rows:
+            sheet.append(self._row(sheet, list(row), len(headers)))
+        return sheet
+
+    def save(self):
+        """Finish the workbook and return it as a file object positioned at the start."""
+        output = tempfile.SpooledTemporaryFile(max_size=BROADSHEET_SPOOL_BYTES)
+        self.workbook.save(output)
+        output.seek(0)
+        return output
+
+def generate_excel_broadsheet(class_name, term, session_year, broadsheet_data, subjects, subject_averages):
+    """Generate an Excel broadsheet."""
+    writer = BroadsheetWriter()
+    writer.add_class(class_name, term, session_year, broadsheet_data, subjects, subject_averages)
+    return writer.save()
+
+def generate_school_broadsheet(session_id, term, progress=None):
+    """Build one workbook with a class-averages summary sheet and a broadsheet sheet per class, by hierarchy.
+
+    Returns (filename, mimetype, data) for the background job runner.
+    """
+    progress = progress or (lambda done, total: None)
+    session_obj = db.session.get(Session, session_id)
+    if session_obj is None:
+        raise ValueError("Session not found.")
+    classes, students_by_class, subjects_by_class, results_by_class, summaries_by_class = load_school_broadsheet_records(
+        session_id, term
+    )
+    classes = [cls for cls in classes if students_by_class.get(cls.id) and subjects_by_class.get(cls.id)]
+    if not classes:
+        raise ValueError(f"No classes with students and subjects for {term} Term, {session_obj.year}.")
+
+    summary_rows = []
+    for cls in classes:
+        averages = [
+            summary.term_average for student_id, summary in summaries_by_class[cls.id].items()
+            if student_id in students_by_class[cls.id] and summary.subjects_offered
+        ]
+        summary_rows.append([
+            cls.name,
+            len(students_by_class[cls.id]),
+            len(averages),
+            round(sum(averages) / len(averages), 1) if averages else "",
+            max(averages) if averages else "",
+            min(averages) if averages else "",
+        ])
+
+    writer = BroadsheetWriter()
+    writer.add_table(
+        "Summary",
+        ["Class", "Students", "With Results", "Class Average", "Highest Average", "Lowest Average"],
+        summary_rows,
+        widths=[30, 12, 14, 15, 17, 17]
+    )
+    progress(0, len(classes))
+    for done, cls in enumerate(classes, start=1):
+        students = list(students_by_class[cls.id].values())
+        broadsheet_data, subject_averages = build_broadsheet_data(
+            students, subjects_by_class[cls.id], results_by_class[cls.id], summaries_by_class[cls.id]
+        )
+        writer.add_class(cls.name, term, session_obj.year, broadsheet_data, subjects_by_class[cls.id], subject_averages,
+                         title=cls.name)
+        progress(done, len(classes))
+
+    filename = f"School_Broadsheet_{term}_{session_obj.year}.xlsx".replace("/", "-")
+    return filename, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", writer.save().read()
 
 def group_students_by_class(students):
     """Group students by class name, sorted by hierarchy and student name."""
@@ -846,87 +986,159 @@ def group_students_by_class(students):
     )
     return dict(sorted_classes)
 
+# Sorts students without a class after every real class in keyset ordering
+UNASSIGNED_HIERARCHY = 2 ** 31 - 1
 
-def get_students_query(current_session, term=None):
-    term_order = {t.value: i for i, t in enumerate(TermEnum, 1)}
-    current_term = Session.get_current_session_and_term(include_term=True)[1]
-    current_term_order = term_order.get(current_term.value, 1) if current_term else 1
-    target_term = term if term else current_term.value
-    target_term_order = term_order.get(target_term, current_term_order)
+def student_sort_columns():
+    """Keyset ordering for student listings: class hierarchy, then name, then id as the tie-breaker."""
+    return [func.coalesce(Classes.hierarchy, UNASSIGNED_HIERARCHY), Student.first_name, Student.last_name, Student.id]
 
-    # Base query for latest enrollment
-    latest_enrollment_subquery = (
-        db.session.query(
-            StudentClassHistory.student_id,
-            func.max(StudentClassHistory.join_date).label('latest_join')
-        )
-        .filter(StudentClassHistory.session_id == current_session.id)
-        .group_by(StudentClassHistory.student_id)
-        .subquery('latest_enrollment')
+def student_sort_key(row):
+    """The student_sort_columns values of a (Student, class_name, hierarchy) row."""
+    student, _, hierarchy = row
+    return [hierarchy if hierarchy is not None else UNASSIGNED_HIERARCHY, student.first_name, student.last_name, student.id]
+
+def class_roster_sort_columns():
+    """Keyset ordering for a single class's roster, which shares one hierarchy: name, then id."""
+    return [Student.last_name, Student.first_name, Student.id]
+
+def class_roster_sort_key(history):
+    """The class_roster_sort_columns values of a StudentClassHistory row."""
+    return [history.student.last_name, history.student.first_name, history.student.id]
+
+def encode_page_cursor(key, direction, page):
+    """Encode a boundary row's sort key, the seek direction ("next" or "prev") and the page number as a URL-safe cursor."""
+    payload = json.dumps({"k": key, "d": direction, "p": page}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_page_cursor(cursor, key_length):
+    """Return (key, direction, page) from an opaque cursor; a missing or malformed cursor means the first page."""
+    if not cursor:
+        return None, "next", 1
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        key, direction, page = payload["k"], payload["d"], int(payload["p"])
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        return None, "next", 1
+    if direction not in ("next", "prev") or not isinstance(key, list) or len(key) != key_length or page < 1:
+        return None, "next", 1
+    return key, direction, page
+
+def _seek_filter(columns, key, after):
+    """Rows strictly after (or before) key in the lexicographic order of columns."""
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == key[j] for j in range(i)]
+        clauses.append(and_(*equal, column > key[i] if after else column < key[i]))
+    return or_(*clauses)
+
+class KeysetPage:
+    """One page of a keyset-paginated query with opaque cursors for its neighbours.
+
+    total is optional and may be approximate (cached); pages is derived from it when present.
+    """
+
+    def __init__(self, items, page, per_page, prev_cursor, next_cursor, total=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.has_prev = prev_cursor is not None
+        self.has_next = next_cursor is not None
+        self.total = total
+        self.pages = max(1, math.ceil(total / per_page)) if total is not None else None
+
+def keyset_paginate(query, sort_columns, key_of, cursor=None, per_page=10, total=None):
+    """Seek to the page a cursor points at, ordering by sort_columns, without OFFSET or a COUNT query.
+
+    key_of maps a result row to its sort_columns values; the last column must be unique.
+    """
+    key, direction, page = decode_page_cursor(cursor, len(sort_columns))
+    backwards = direction == "prev"
+    query = query.order_by(None).order_by(*(column.desc() if backwards else column.asc() for column in sort_columns))
+    if key is not None:
+        query = query.filter(_seek_filter(sort_columns, key, after=not backwards))
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = has_more, bool(rows)
+        if not has_prev:
+            page = 1
+    else:
+        has_prev, has_next = key is not None and page > 1, has_more
+    prev_cursor = encode_page_cursor(key_of(rows[0]), "prev", page - 1) if has_prev and rows else None
+    next_cursor = encode_page_cursor(key_of(rows[-1]), "next", page + 1) if has_next and rows else None
+    return KeysetPage(rows, page, per_page, prev_cursor, next_cursor, total)
+
+def cached_count(cache_key, query):
+    """Count a query's rows, reusing the result for PAGINATION_COUNT_TTL seconds; None when totals are off."""
+    if not app.config.get("PAGINATION_TOTALS", True):
+        return None
+    cache = app.extensions.setdefault("pagination_counts", {})
+    now = time.monotonic()
+    hit = cache.get(cache_key)
+    if hit is not None and now < hit[1]:
+        return hit[0]
+    if len(cache) >= 1000:
+        for stale_key in [k for k, (_, expires) in cache.items() if expires <= now]:
+            cache.pop(stale_key, None)
+    total = query.order_by(None).count()
+    cache[cache_key] = (total, now + app.config.get("PAGINATION_COUNT_TTL", 60))
+    return total
+
+def students_total(students_query, current_session, term, enrollment_status, fee_status, approval_status, search_query=""):
+    """Total for a student listing: from the enrollment counters when they cover the filters, else a cached count."""
+    if enrollment_status == 'active' and not search_query and not (fee_status and approval_status):
+        stats = enrollment_stats(current_session.id, term)
+        if fee_status:
+            return stats["fees_paid"] if fee_status == 'paid' else stats["fees_unpaid"]
+        if approval_status:
+            approved = stats["approved_students"]
+            return approved if approval_status == 'approved' else stats["total_students"] - approved
+        return stats["total_students"]
+    return cached_count(
+        ("students", current_session.id, term, enrollment_status, fee_status, approval_status, search_query.lower()),
+        students_query
     )
 
+
+def get_students_query(current_session, term=None):
+    target_term = term if term else Session.get_current_session_and_term(include_term=True)[1].value
+
+    # The snapshot holds each student's active enrollment for the term, maintained on every enrollment change
     query = (
         db.session.query(Student, Classes.name.label('class_name'), Classes.hierarchy)
         .join(
-            latest_enrollment_subquery,
-            Student.id == latest_enrollment_subquery.c.student_id,
-            isouter=True
-        )
-        .join(
-            StudentClassHistory,
+            EnrollmentSnapshot,
             and_(
-                Student.id == StudentClassHistory.student_id,
-                StudentClassHistory.session_id == current_session.id,
-                StudentClassHistory.join_date == latest_enrollment_subquery.c.latest_join,
-                StudentClassHistory.is_active == True,
-                StudentClassHistory.leave_date.is_(None),
-                case(
-                    *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                    else_=1
-                ) <= target_term_order,
-                or_(
-                    StudentClassHistory.end_term.is_(None),
-                    case(
-                        *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                        else_=4
-                    ) >= target_term_order
-                )
+                EnrollmentSnapshot.student_id == Student.id,
+                EnrollmentSnapshot.session_id == current_session.id,
+                EnrollmentSnapshot.term == target_term
             ),
             isouter=True
         )
-        .join(Classes, StudentClassHistory.class_id == Classes.id, isouter=True)
+        .join(Classes, EnrollmentSnapshot.class_id == Classes.id, isouter=True)
     )
 
-    return query.options(joinedload(Student.fee_payments), joinedload(Student.class_history))
+    # selectinload keeps one row per student, so LIMIT-based pages stay exact and cheap
+    return query.options(selectinload(Student.fee_payments), selectinload(Student.class_history))
 
 def apply_filters_to_students_query(students_query, enrollment_status, fee_status, approval_status, current_session, current_term, term=None):
     """Apply filters considering term-specific enrollment and promotion status."""
-    term_order = {t.value: i for i, t in enumerate(TermEnum, 1)}
-    current_term_order = term_order.get(current_term.value, 1)
+    current_term_order = TERM_ORDER.get(current_term.value, 1)
     target_term = term if term else current_term.value
-    target_term_order = term_order.get(target_term, current_term_order)
+    target_term_order = TERM_ORDER.get(target_term, current_term_order)
 
     # Define session range for inactivity (2023/2024 onwards)
     base_session = Session.query.filter_by(year="2023/2024").first()
     base_session_id = base_session.id if base_session else current_session.id  # Fallback
 
     if enrollment_status == 'active':
-        students_query = students_query.filter(
-            StudentClassHistory.is_active == True,
-            StudentClassHistory.leave_date.is_(None),
-            StudentClassHistory.session_id == current_session.id,
-            case(
-                *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                else_=1
-            ) <= target_term_order,
-            or_(
-                StudentClassHistory.end_term.is_(None),
-                case(
-                    *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                    else_=4
-                ) >= target_term_order
-            )
-        )
+        students_query = students_query.filter(EnrollmentSnapshot.student_id.isnot(None))
     elif enrollment_status == 'inactive':
         # Precompute the count of students in the current session
         session_student_count = db.session.query(
@@ -943,17 +1155,7 @@ def apply_filters_to_students_query(students_query, enrollment_status, fee_statu
                     StudentClassHistory.session_id == current_session.id,
                     StudentClassHistory.is_active == True,
                     StudentClassHistory.leave_date.is_(None),
-                    case(
-                        *[(StudentClassHistory.start_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                        else_=1
-                    ) <= target_term_order,
-                    or_(
-                        StudentClassHistory.end_term.is_(None),
-                        case(
-                            *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                            else_=4
-                        ) >= target_term_order
-                    )
+                    StudentClassHistory.enrolled_in_term(target_term_order)
                 )
             ).correlate(Student)
         )
@@ -970,10 +1172,10 @@ def apply_filters_to_students_query(students_query, enrollment_status, fee_statu
                             StudentClassHistory.is_active == False,
                             and_(
                                 StudentClassHistory.leave_date.isnot(None),
-                                case(
-                                    *[(StudentClassHistory.end_term == t.value, i) for i, t in enumerate(TermEnum, 1)],
-                                    else_=0
-                                ) <= target_term_order
+                                or_(
+                                    StudentClassHistory.end_term.is_(None),
+                                    StudentClassHistory.end_term_ord <= target_term_order
+                                )
                             )
                         )
                     ),
@@ -985,7 +1187,9 @@ def apply_filters_to_students_query(students_query, enrollment_status, fee_statu
             )
         )
 
-    if enrollment_status != 'inactive' and fee_status:
+    if enrollment_status == 'active' and fee_status:
+        students_query = students_query.filter(EnrollmentSnapshot.fee_paid == (fee_status == 'paid'))
+    elif enrollment_status != 'inactive' and fee_status:
         students_query = students_query.outerjoin(
             FeePayment,
             and_(
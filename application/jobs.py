@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class JobRunner:
+    """Run long exports on a background thread, tracking progress in small JSON files next to their artifacts.
+
+    State lives on disk rather than in memory so any web worker on the host can report on or serve a job.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.export_dir = app.config.get("EXPORT_DIR")
+        self.run_async = app.config.get("JOBS_ASYNC", True)
+        self.retention = app.config.get("EXPORT_RETENTION", 24 * 60 * 60)
+        app.extensions["job_runner"] = self
+
+    def prune(self):
+        """Delete job state, artifacts and leftover uploads in export_dir older than the retention period."""
+        if not self.retention or not os.path.isdir(self.export_dir):
+            return 0
+        cutoff = time.time() - self.retention
+        removed = 0
+        for entry in os.scandir(self.export_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # Already removed by another worker
+        return removed
+
+    def _state_path(self, job_id):
+        return os.path.join(self.export_dir, f"{job_id}.json")
+
+    def artifact_path(self, job_id):
+        return os.path.join(self.export_dir, f"{job_id}.bin")
+
+    def _write_state(self, state):
+        os.makedirs(self.export_dir, exist_ok=True)
+        tmp_path = self._state_path(state["id"]) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path(state["id"]))
+
+    def get(self, job_id):
+        """Return a job's state, or None for an unknown id."""
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def start(self, kind, user_id, target, *args, **kwargs):
+        """Queue target(*args, progress=..., **kwargs) and return the new job's id.
+
+        The target reports progress by calling progress(done, total) and returns (filename, mimetype, data).
+        Expired jobs are pruned first, so export_dir doesn't grow without bound.
+        """
+        self.prune()
+        state = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "user_id": user_id,
+            "status": "queued",
+            "done": 0,
+            "total": 0,
+            "filename": None,
+            "mimetype": None,
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+        }
+        self._write_state(state)
+        if self.run_async:
+            threading.Thread(target=self._run, args=(state, target, args, kwargs), name=f"job-{kind}", daemon=True).start()
+        else:
+            self._run(state, target, args, kwargs)
+        return state["id"]
+
+    def _run(self, state, target, args, kwargs):
+        from . import db
+
+        def progress(done, total):
+            state.update(done=done, total=total)
+            self._write_state(state)
+
+        with self.app.app_context():
+            state["status"] = "running"
+            self._write_state(state)
+            try:
+                filename, mimetype, data = target(*args, progress=progress, **kwargs)
+                with open(self.artifact_path(state["id"]), "wb") as f:
+                    f.write(data)
+                state.update(status="finished", filename=filename, mimetype=mimetype)
+            except ValueError as e:
+                state.update(status="failed", error=str(e))
+            except Exception as e:
+                self.app.logger.error(f"Job {state['id']} ({state['kind']}) failed: {str(e)}", exc_info=True)
+                state.update(status="failed", error="The export could not be generated.")
+            finally:
+                db.session.remove()
+            self._write_state(state)
+
+
+job_runner = JobRunner()
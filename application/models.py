@@ -1,11 +1,15 @@
 from application import db, bcrypt
+from flask import g, current_app
 from flask_login import UserMixin, current_user
+from sqlalchemy import inspect, and_, update
+from sqlalchemy.orm import joinedload, make_transient_to_detached
 from datetime import datetime
 from enum import Enum as PyEnum
+from collections import OrderedDict
 from cryptography.fernet import Fernet
 import os
-import random
-import string
+import threading
+import time
 import pytz
 
 key = os.getenv("ENCRYPTION_KEY") or Fernet.generate_key()
@@ -16,11 +20,26 @@ NIGERIA_TZ = pytz.timezone('Africa/Lagos')
 def nigeria_now():
     return datetime.now(NIGERIA_TZ)
 
+def detached_copy(instance):
+    """Copy an instance's column values into a new object that carries its identity but no db session."""
+    mapper = inspect(instance).mapper
+    copy = mapper.class_()
+    for attr in mapper.column_attrs:
+        setattr(copy, attr.key, getattr(instance, attr.key))
+    return copy
+
 class TermEnum(PyEnum):
     FIRST = "First"
     SECOND = "Second"
     THIRD = "Third"
 
+TERM_ORDINALS = {TermEnum.FIRST.value: 1, TermEnum.SECOND.value: 2, TermEnum.THIRD.value: 3}
+
+def term_ordinal_sql(column, default):
+    """SQL CASE mapping a termenum column to its ordinal, used for the stored term ordinal columns."""
+    whens = " ".join(f"WHEN '{term}' THEN {order}" for term, order in TERM_ORDINALS.items())
+    return f"CASE {column} {whens} ELSE {default} END"
+
 class RoleEnum(PyEnum):
     ADMIN = "admin"
     STUDENT = "student"
@@ -58,19 +77,49 @@ class Session(db.Model):
 
     @staticmethod
     def get_current_session():
-        return Session.query.filter_by(is_current=True).first()
+        """Return the is_current session, served from a short-lived per-process cache."""
+        cache = current_app.extensions.setdefault("current_session_cache", {})
+        cached = cache.get("session")
+        if cached is None or time.monotonic() >= cache.get("expires", 0):
+            session = Session.query.filter_by(is_current=True).first()
+            if not session:
+                return None
+            # Keep a detached copy so the cached row never belongs to a request's db session
+            cached = detached_copy(session)
+            make_transient_to_detached(cached)
+            cache["session"] = cached
+            cache["expires"] = time.monotonic() + current_app.config.get("CURRENT_SESSION_CACHE_TTL", 60)
+        return db.session.merge(cached, load=False)
+
+    @staticmethod
+    def invalidate_current_session_cache(include_process_cache=False):
+        """Drop the request's resolved session/term and, optionally, the cached is_current session."""
+        g.pop("current_session_and_term", None)
+        if include_process_cache:
+            current_app.extensions.get("current_session_cache", {}).clear()
 
     @staticmethod
     def get_current_session_and_term(include_term=False):
         if not current_user.is_authenticated:
             return None, None if include_term else None
 
-        preference = UserSessionPreference.query.filter_by(user_id=current_user.id).first()
+        resolved = g.setdefault("current_session_and_term", {})
+        if current_user.id not in resolved:
+            resolved[current_user.id] = Session._resolve_session_and_term()
+        session, term = resolved[current_user.id]
+        if not session:
+            return None, None if include_term else None
+        return (session, term) if include_term else session
+
+    @staticmethod
+    def _resolve_session_and_term():
+        """Look up the current user's session preference, creating one from the current session if missing."""
+        preference = current_user.session_preference
         if preference:
-            session = Session.query.get(preference.session_id)
+            session = db.session.get(Session, preference.session_id)
             term = TermEnum(preference.current_term) if preference.current_term else None
         else:
-            legacy_session = Session.query.filter_by(is_current=True).first()
+            legacy_session = Session.get_current_session()
             if legacy_session:
                 session = legacy_session
                 term = TermEnum(legacy_session.current_term) if legacy_session.current_term else TermEnum.FIRST
@@ -84,7 +133,7 @@ class Session(db.Model):
             else:
                 session = Session.query.order_by(Session.year.desc()).first()
                 if not session:
-                    return None, None if include_term else None
+                    return None, None
                 term = TermEnum.FIRST
                 preference = UserSessionPreference(
                     user_id=current_user.id,
@@ -94,7 +143,7 @@ class Session(db.Model):
                 db.session.add(preference)
                 db.session.commit()
 
-        return (session, term) if include_term else session
+        return session, term
 
 class StudentClassHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,17 +155,29 @@ class StudentClassHistory(db.Model):
     join_date = db.Column(db.DateTime, nullable=False, default=nigeria_now)
     leave_date = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Generated by the database so range filters on terms can use an index; an open-ended enrollment ends at 4
+    start_term_ord = db.Column(db.SmallInteger, db.Computed(term_ordinal_sql("start_term", 1), persisted=True))
+    end_term_ord = db.Column(db.SmallInteger, db.Computed(term_ordinal_sql("end_term", 4), persisted=True))
 
     session = db.relationship("Session", backref="class_history", lazy=True)
     class_ref = db.relationship("Classes", backref="class_history", lazy=True)
 
     __table_args__ = (
         db.Index('idx_student_session', 'student_id', 'session_id', unique=False),
+        db.Index('idx_class_history_session_class', 'session_id', 'class_id', 'is_active', 'leave_date',
+                 'start_term_ord', 'end_term_ord'),
+        db.Index('idx_class_history_session_term', 'session_id', 'is_active', 'leave_date',
+                 'start_term_ord', 'end_term_ord'),
     )
 
     def __repr__(self):
         return f"<StudentClassHistory Student: {self.student_id}, Class: {self.class_ref.name if self.class_ref else 'None'}, Session: {self.session.year}>"
 
+    @classmethod
+    def enrolled_in_term(cls, term_order):
+        """Sargable predicate for enrollments that cover the term with the given ordinal."""
+        return and_(cls.start_term_ord <= term_order, cls.end_term_ord >= term_order)
+
     def is_active_in_term(self, session_id, term):
         term_order = {TermEnum.FIRST.value: 1, TermEnum.SECOND.value: 2, TermEnum.THIRD.value: 3}
         start_order = term_order.get(self.start_term, 1)
@@ -176,6 +237,10 @@ class Student(db.Model, UserMixin):
     class_history = db.relationship("StudentClassHistory", backref="student", lazy=True, cascade="save-update, merge", passive_deletes=True)
     fee_payments = db.relationship("FeePayment", backref="student", lazy=True, cascade="save-update, merge", passive_deletes=True)
 
+    __table_args__ = (
+        db.Index('uq_student_reg_no', 'reg_no', unique=True),
+    )
+
     def get_full_name(self):
         names = [self.first_name]
         if self.middle_name:
@@ -229,15 +294,12 @@ class Student(db.Model, UserMixin):
 
     @classmethod
     def generate_reg_no(cls, session_year=None):
+        from .sequences import allocate_reg_nos  # sequences imports this module
+
         if not session_year:
             current_session = Session.get_current_session_and_term(include_term=False)
             session_year = current_session.year if current_session else datetime.now().year
-        random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-        reg_no = f"{session_year}/{random_suffix}"
-        while cls.query.filter_by(reg_no=reg_no).first():
-            random_suffix = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-            reg_no = f"{session_year}/{random_suffix}"
-        return reg_no
+        return allocate_reg_nos(1, prefix=f"{session_year}/")[0]
 
 class FeePayment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -246,6 +308,78 @@ class FeePayment(db.Model):
     term = db.Column(db.Enum("First", "Second", "Third", name="termenum"), nullable=True)
     has_paid_fee = db.Column(db.Boolean, nullable=False, default=False)
 
+    __table_args__ = (
+        db.Index('idx_fee_payment_session_term_paid', 'session_id', 'term', 'has_paid_fee', 'student_id'),
+    )
+
+class EnrollmentSnapshot(db.Model):
+    """One row per student actively enrolled in a session's term, kept in step with the class history.
+
+    Rows are rewritten by application.enrollment.refresh_enrollment_snapshot in the same transaction as
+    the change that affects them, so student lists and stats read it instead of re-deriving enrollments.
+    """
+    __tablename__ = "enrollment_snapshot"
+
+    session_id = db.Column(db.Integer, db.ForeignKey("session.id", ondelete="CASCADE"), primary_key=True)
+    term = db.Column(db.Enum("First", "Second", "Third", name="termenum"), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("student.id", ondelete="CASCADE"), primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey("classes.id", ondelete="CASCADE"), nullable=True)
+    hierarchy = db.Column(db.Integer, nullable=True)
+    approved = db.Column(db.Boolean, nullable=False, default=False)
+    fee_paid = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('idx_enrollment_snapshot_class', 'session_id', 'term', 'class_id', 'approved', 'fee_paid'),
+        db.Index('idx_enrollment_snapshot_hierarchy', 'session_id', 'term', 'hierarchy', 'student_id'),
+        db.Index('idx_enrollment_snapshot_student', 'student_id'),
+    )
+
+class StudentSearchToken(db.Model):
+    """Normalized search keys for a student: name words, their one-letter deletions and reg_no parts."""
+    __tablename__ = "student_search_token"
+
+    WORD = 0
+    DELETION = 1
+    MAX_LENGTH = 64
+
+    kind = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    token = db.Column(db.String(MAX_LENGTH), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("student.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        db.Index('idx_search_token_student', 'student_id'),
+    )
+
+class EnrollmentCounter(db.Model):
+    """Enrolled, approved and fee-paying student counts per session, term and class (0 for no class).
+
+    Adjusted by deltas whenever enrollment_snapshot rows change, and reconciled against a recount of the snapshot.
+    """
+    __tablename__ = "enrollment_counter"
+
+    session_id = db.Column(db.Integer, db.ForeignKey("session.id", ondelete="CASCADE"), primary_key=True)
+    term = db.Column(db.Enum("First", "Second", "Third", name="termenum"), primary_key=True)
+    class_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    approved = db.Column(db.Integer, nullable=False, default=0)
+    fees_paid = db.Column(db.Integer, nullable=False, default=0)
+
+class CatalogueVersion(db.Model):
+    """Version numbers bumped whenever a cached catalogue's source rows change, shared by every app process."""
+    __tablename__ = "catalogue_version"
+
+    SUBJECTS = "subjects"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class IdSequence(db.Model):
+    """Named counters handing out registration numbers and employee ids; next_value is the next unallocated one."""
+    __tablename__ = "id_sequence"
+
+    name = db.Column(db.String(150), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+
 class Classes(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -320,6 +454,8 @@ class StudentTermSummary(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('student_id', 'class_id', 'term', 'session_id', name='unique_term_summary'),
+        db.Index('idx_term_summary_student_session', 'student_id', 'session_id', 'term', 'class_id'),
+        db.Index('idx_term_summary_class_term', 'session_id', 'term', 'class_id', 'term_average'),
     )
 
 class Result(db.Model):
@@ -342,8 +478,12 @@ class Result(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('student_id', 'subject_id', 'class_id', 'term', 'session_id', name='unique_result'),
+        db.Index('idx_result_student_session_term', 'student_id', 'session_id', 'term', 'class_id'),
+        db.Index('idx_result_class_term', 'session_id', 'term', 'class_id', 'student_id'),
     )
 
+_user_cache_lock = threading.Lock()
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -351,6 +491,8 @@ class User(db.Model, UserMixin):
     role = db.Column(db.Enum("admin", "student", "teacher", name="roleenum"), nullable=False)
     active = db.Column(db.Boolean, nullable=False, default=True)
     mfa_secret = db.Column(db.String(32), nullable=True)
+    # Bumped by invalidate_cache; every process compares it with its cached copy on load
+    cache_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     student = db.relationship("Student", backref="user", uselist=False)
     privileges = db.relationship("AdminPrivilege", back_populates="user", uselist=False, lazy=True)
@@ -362,6 +504,55 @@ class User(db.Model, UserMixin):
     def check_password(self, password):
         return bcrypt.check_password_hash(self.password_hash, password)
 
+    @staticmethod
+    def load_cached(user_id):
+        """Load a user with privileges, served from a per-process LRU cache of at most USER_CACHE_SIZE users.
+
+        Each load reads the row's cache_version by primary key, so a change invalidated in one worker is seen by
+        every worker on its next request, and a deleted user is never served. The session preference changes
+        too often to cache and loads on first access.
+        """
+        version = db.session.query(User.cache_version).filter_by(id=user_id).scalar()
+        cache = current_app.extensions.setdefault("user_cache", OrderedDict())
+        with _user_cache_lock:
+            entry = cache.get(user_id)
+            if version is None:
+                cache.pop(user_id, None)
+                return None
+            if entry and entry[0] == version:
+                cache.move_to_end(user_id)
+                return db.session.merge(entry[1], load=False)
+
+        user = User.query.options(joinedload(User.privileges)).filter_by(id=user_id).first()
+        if not user:
+            return None
+
+        # Cache detached copies so later requests can merge them without reloading the user
+        cached = detached_copy(user)
+        cached.privileges = detached_copy(user.privileges) if user.privileges else None
+        for instance in (cached, cached.privileges):
+            if instance is not None:
+                make_transient_to_detached(instance)
+        with _user_cache_lock:
+            cache[user_id] = (user.cache_version, cached)
+            cache.move_to_end(user_id)
+            while len(cache) > current_app.config.get("USER_CACHE_SIZE", 1000):
+                cache.popitem(last=False)
+        return user
+
+    @staticmethod
+    def invalidate_cache(user_id):
+        """Bump a user's cache_version after its password, role, active flag or privileges change.
+
+        Runs in the caller's transaction, so call it before committing the change it describes.
+        """
+        db.session.execute(
+            update(User).where(User.id == user_id).values(cache_version=User.cache_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        with _user_cache_lock:
+            current_app.extensions.get("user_cache", {}).pop(user_id, None)
+
 class AdminPrivilege(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,101 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+
+class VerifierBusy(Exception):
+    """Raised instead of queueing a password check when the verifier already has its maximum backlog."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password verifier saturated; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def hash_cost(password_hash):
+    """The log rounds recorded in a bcrypt hash such as $2b$12$..., or None if it isn't one."""
+    try:
+        return int(password_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordVerifier:
+    """Check login passwords on a small bcrypt thread pool instead of on the request thread.
+
+    At most LOGIN_HASH_MAX_PENDING checks are running or queued; beyond that verify() raises VerifierBusy at once
+    so a login storm gets fast 503s rather than tying up every web worker. bcrypt releases the GIL, so the
+    pool's LOGIN_HASH_WORKERS threads (default one per CPU) hash in parallel.
+    """
+
+    def __init__(self, app=None):
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from . import bcrypt
+
+        self.bcrypt = bcrypt
+        self.log_rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self.workers = app.config.get("LOGIN_HASH_WORKERS") or os.cpu_count() or 1
+        self.max_pending = app.config.get("LOGIN_HASH_MAX_PENDING", 16)
+        self.timeout = app.config.get("LOGIN_HASH_TIMEOUT", 10)
+        self.retry_after = app.config.get("LOGIN_RETRY_AFTER", 5)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        app.extensions["password_verifier"] = self
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise VerifierBusy(self.retry_after)
+            self._pending += 1
+
+        def run():
+            # Free the slot before the result is published, so the caller can immediately submit a follow-up
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            return self.executor.submit(run)
+        except Exception:
+            self._release()
+            raise
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                self._release()
+            raise VerifierBusy(self.retry_after)
+
+    def pending(self):
+        """Checks currently running or queued."""
+        return self._pending
+
+    def verify(self, user, password):
+        """Check a user's password, upgrading its hash to BCRYPT_LOG_ROUNDS on success.
+
+        The new hash is set on user, not committed. Raises VerifierBusy when saturated; a rehash that can't get
+        a slot is just left for the next login.
+        """
+        if not self._result(self._submit(self.bcrypt.check_password_hash, user.password_hash, password)):
+            return False
+        if hash_cost(user.password_hash) != self.log_rounds:
+            try:
+                user.password_hash = self._result(self._submit(self.bcrypt.generate_password_hash, password)).decode("utf-8")
+            except VerifierBusy:
+                pass
+        return True
+
+
+password_verifier = PasswordVerifier()
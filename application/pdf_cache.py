@@ -0,0 +1,136 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+REPORT_CARD_TEMPLATE = os.path.join("student", "pdf_results.html")
+
+
+class PdfCache:
+    """Disk cache for rendered report card PDFs, addressed by a hash of everything that goes into them.
+
+    Files are named {session_id}_{term}_{class_id}_{student_id}_{digest}.pdf so a student's or a class's
+    entries can be dropped when their results change; least recently served files are evicted past the size cap.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._file_digests = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("PDF_CACHE_ENABLED", True)
+        self.cache_dir = app.config.get("PDF_CACHE_DIR")
+        self.max_bytes = app.config.get("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024)
+        app.extensions["pdf_cache"] = self
+
+    def _file_digest(self, path):
+        # Re-hash a template or image only when its size or mtime changes
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self._file_digests.get(path)
+        if cached and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._file_digests[path] = ((stat.st_size, stat.st_mtime_ns), digest)
+        return digest
+
+    def key(self, student, results, term_summary, term, session_obj, class_id, class_name):
+        """Hash the rows, template and images that determine a report card's bytes."""
+        root = self.app.root_path
+        payload = {
+            "template": self._file_digest(os.path.join(root, "templates", REPORT_CARD_TEMPLATE)),
+            "logo": self._file_digest(os.path.join(root, "static", "images", "school_logo.png")),
+            "signature": self._file_digest(os.path.join(root, "static", "images", "signature_anne.png")),
+            "school_name": self.app.config.get("SCHOOL_NAME"),
+            # The card prints today's date, so entries roll over daily
+            "date_printed": datetime.now().strftime('%Y-%m-%d'),
+            "student": [student.id, student.first_name, student.middle_name, student.last_name, student.reg_no, student.gender],
+            "class": [class_id, class_name],
+            "session": [session_obj.id, session_obj.year, term],
+            "results": sorted(
+                [r.id, r.subject_id, r.subject.name, r.class_assessment, r.summative_test, r.exam, r.total, r.grade, r.remark]
+                for r in results
+            ),
+            "summary": None if term_summary is None else [
+                term_summary.term_average, term_summary.cumulative_average, term_summary.last_term_average,
+                term_summary.position, term_summary.principal_remark, term_summary.teacher_remark,
+                term_summary.next_term_begins, term_summary.date_issued,
+            ],
+        }
+        digest = hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+        return f"{session_obj.id}_{term}_{class_id}_{student.id}_{digest}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get(self, key):
+        """Return cached PDF bytes, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for eviction
+            return data
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self.app.logger.warning(f"Could not cache report card {key}: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for path in glob.glob(os.path.join(self.cache_dir, "*.pdf")):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def invalidate(self, session_id, term, class_id=None, student_id=None):
+        """Drop cached cards for a student or, without a student_id, a whole class (or every class)."""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        pattern = f"{session_id}_{term}_{class_id if class_id is not None else '*'}_{student_id if student_id is not None else '*'}_*.pdf"
+        removed = 0
+        for path in glob.glob(os.path.join(self.cache_dir, pattern)):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+pdf_cache = PdfCache()
@@ -0,0 +1,162 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from . import db
+from .enrollment import _chunks, refresh_enrollment_snapshot
+from .models import Classes, Student, StudentClassHistory, TermEnum
+
+PROMOTE, REPEAT, COMPLETED = "promote", "repeat", "completed"
+
+
+class PlannedMove:
+    """One student's outcome in a promotion plan: promoted, repeating their class, or already in the top class."""
+
+    def __init__(self, student_id, student_name, history_id, from_class, to_class, outcome):
+        self.student_id = student_id
+        self.student_name = student_name
+        self.history_id = history_id
+        self.from_class = from_class
+        self.to_class = to_class
+        self.outcome = outcome
+
+
+class PromotionPlan:
+    """Every move a promotion would make, computed up front so it can be previewed (dry run) or applied as-is."""
+
+    def __init__(self, current_session, target_session, term, moves):
+        self.current_session = current_session
+        self.target_session = target_session
+        self.term = term
+        self.moves = moves
+        self.same_session = target_session.id == current_session.id
+
+    def count(self, outcome):
+        return sum(1 for move in self.moves if move.outcome == outcome)
+
+    def fingerprint(self):
+        """Digest of the enrollments the plan starts from, so a confirm can be checked against a fresh plan.
+
+        Repeater choices are left out on purpose: they may change between preview and confirm. Applying the
+        plan changes (same session) or closes (next session) every enrollment in it, so a replayed confirm
+        no longer matches.
+        """
+        state = [self.current_session.id, self.target_session.id, self.term] + sorted(
+            (move.history_id, move.student_id, move.from_class.id) for move in self.moves
+        )
+        return hashlib.sha256(repr(state).encode()).hexdigest()
+
+    def summary(self):
+        return (
+            f"{self.count(PROMOTE)} promoted, {self.count(REPEAT)} repeating, {self.count(COMPLETED)} in the top class "
+            f"({self.current_session.year} -> {self.target_session.year})"
+        )
+
+
+def plan_promotion(current_session, target_session, term, class_ids=None, repeater_ids=()):
+    """Plan promoting every active student of the given classes (default: the whole school) up one class.
+
+    Next classes follow Classes.hierarchy, as in Classes.get_next_class. Students in repeater_ids keep their
+    class; students in the highest class are reported but left alone, as the single-student route does.
+    """
+    classes = Classes.query.order_by(Classes.hierarchy).all()
+    next_class = {cls.id: following for cls, following in zip(classes, classes[1:] + [None])}
+    classes_by_id = {cls.id: cls for cls in classes}
+    repeater_ids = set(repeater_ids)
+
+    enrollments = (
+        db.session.query(
+            StudentClassHistory.id, StudentClassHistory.student_id, StudentClassHistory.class_id,
+            Student.first_name, Student.last_name
+        )
+        .join(Student, Student.id == StudentClassHistory.student_id)
+        .join(Classes, Classes.id == StudentClassHistory.class_id)
+        .filter(
+            StudentClassHistory.session_id == current_session.id,
+            StudentClassHistory.is_active == True,
+            StudentClassHistory.leave_date.is_(None)
+        )
+        .order_by(Classes.hierarchy, Student.last_name, Student.first_name, Student.id)
+    )
+    if class_ids is not None:
+        enrollments = enrollments.filter(StudentClassHistory.class_id.in_(class_ids))
+
+    moves, seen = [], set()
+    for history_id, student_id, class_id, first_name, last_name in enrollments:
+        if student_id in seen:
+            continue
+        seen.add(student_id)
+        current_class = classes_by_id[class_id]
+        if student_id in repeater_ids:
+            to_class, outcome = current_class, REPEAT
+        elif next_class[class_id] is None:
+            to_class, outcome = None, COMPLETED
+        else:
+            to_class, outcome = next_class[class_id], PROMOTE
+        moves.append(PlannedMove(student_id, f"{first_name} {last_name}", history_id, current_class, to_class, outcome))
+    return PromotionPlan(current_session, target_session, term, moves)
+
+
+def _update_class_ids(history_ids_by_class):
+    for class_id, history_ids in history_ids_by_class.items():
+        for chunk in _chunks(history_ids):
+            db.session.execute(
+                update(StudentClassHistory).where(StudentClassHistory.id.in_(chunk)).values(class_id=class_id)
+            )
+
+
+def apply_promotion(plan):
+    """Write a plan's class history changes with a handful of set-based statements, inside the caller's transaction.
+
+    Within the current session promoted enrollments simply change class. Into another session, current
+    enrollments are closed at the plan's term and each student gets an enrollment in their new (or, for
+    repeaters, same) class - reusing an active one already in the target session. Returns the students moved.
+    """
+    moves = [move for move in plan.moves if move.outcome != COMPLETED]
+    if plan.same_session:
+        moves = [move for move in moves if move.outcome == PROMOTE]
+        history_ids_by_class = defaultdict(list)
+        for move in moves:
+            history_ids_by_class[move.to_class.id].append(move.history_id)
+        _update_class_ids(history_ids_by_class)
+    elif moves:
+        now = datetime.utcnow()
+        for chunk in _chunks([move.history_id for move in moves]):
+            db.session.execute(
+                update(StudentClassHistory)
+                .where(StudentClassHistory.id.in_(chunk))
+                .values(end_term=plan.term, leave_date=now, is_active=False)
+            )
+
+        existing = {}
+        for chunk in _chunks([move.student_id for move in moves]):
+            existing.update(
+                db.session.query(StudentClassHistory.student_id, StudentClassHistory.id).filter(
+                    StudentClassHistory.session_id == plan.target_session.id,
+                    StudentClassHistory.student_id.in_(chunk),
+                    StudentClassHistory.is_active == True,
+                    StudentClassHistory.leave_date.is_(None)
+                )
+            )
+        history_ids_by_class = defaultdict(list)
+        new_rows = []
+        for move in moves:
+            if move.student_id in existing:
+                history_ids_by_class[move.to_class.id].append(existing[move.student_id])
+            else:
+                new_rows.append({
+                    "student_id": move.student_id,
+                    "session_id": plan.target_session.id,
+                    "class_id": move.to_class.id,
+                    "start_term": TermEnum.FIRST.value,
+                    "join_date": now,
+                    "is_active": True,
+                })
+        _update_class_ids(history_ids_by_class)
+        for chunk in _chunks(new_rows):
+            db.session.execute(insert(StudentClassHistory), chunk)
+
+    refresh_enrollment_snapshot([move.student_id for move in moves])
+    return len(moves)
@@ -0,0 +1,236 @@
+import io
+import multiprocessing
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import click
+from flask import current_app as app, render_template
+from flask.cli import AppGroup
+from sqlalchemy.orm import joinedload
+
+from .pdf_cache import pdf_cache
+from .models import Classes, Result, Session, StudentClassHistory, StudentTermSummary, TermEnum
+
+
+def report_card_assets():
+    """Return the file:// URLs of the logo and signature images embedded in report cards."""
+    images_dir = os.path.join(app.root_path, "static", "images")
+    logo_path = os.path.join(images_dir, "school_logo.png")
+    signature_path = os.path.join(images_dir, "signature_anne.png")
+    return {
+        "logo_url": f"file://{logo_path}" if os.path.exists(logo_path) else "",
+        "signature_url": f"file://{signature_path}" if os.path.exists(signature_path) else "",
+    }
+
+
+def report_card_filename(student, term, session_year):
+    # The reg_no (or id) keeps two students with the same name from overwriting each other in the archive
+    return f"{student.first_name}_{student.last_name}_{student.reg_no or student.id}_{term}_{session_year}_Result".replace("/", "-")
+
+
+def build_report_card_context(student, results, term_summary, term, session_obj, class_name, assets=None):
+    """Build the template context for student/pdf_results.html."""
+    grand_total = {
+        "class_assessment": sum(result.class_assessment or 0 for result in results),
+        "summative_test": sum(result.summative_test or 0 for result in results),
+        "exam": sum(result.exam or 0 for result in results),
+        "total": sum(result.total or 0 for result in results),
+    }
+    return {
+        "title": f"{student.first_name}_{student.last_name}_{term}_{session_obj.year}_Result",
+        "student": student,
+        "results": results,
+        "term": term,
+        "session_id": session_obj.id,
+        "session_year": session_obj.year,
+        "grand_total": grand_total,
+        "school_name": app.config.get("SCHOOL_NAME", "Aunty Anne's Int'l School"),
+        "average": term_summary.term_average if term_summary else None,
+        "cumulative_average": term_summary.cumulative_average if term_summary else None,
+        "next_term_begins": term_summary.next_term_begins if term_summary else None,
+        "last_term_average": term_summary.last_term_average if term_summary else None,
+        "position": term_summary.position if term_summary else None,
+        "date_issued": term_summary.date_issued if term_summary else None,
+        "date_printed": datetime.now().strftime('%dth %B, %Y'),
+        "class_name": class_name,
+        "principal_remark": term_summary.principal_remark if term_summary else None,
+        "teacher_remark": term_summary.teacher_remark if term_summary else None,
+        **(assets if assets is not None else report_card_assets()),
+    }
+
+
+def load_class_report_cards(class_record, session_obj, term):
+    """Load everything needed for a class's report cards in three queries, in class-list order.
+
+    Students without any results for the term are skipped, as on the single-student download.
+    """
+    histories = (
+        StudentClassHistory.query.filter(
+            StudentClassHistory.session_id == session_obj.id,
+            StudentClassHistory.class_id == class_record.id,
+            StudentClassHistory.is_active == True,
+            StudentClassHistory.leave_date.is_(None)
+        ).options(joinedload(StudentClassHistory.student)).all()
+    )
+    students = sorted({history.student_id: history.student for history in histories}.values(),
+                      key=lambda s: (s.last_name or "", s.first_name or "", s.id))
+    student_ids = [student.id for student in students]
+    if not student_ids:
+        return []
+
+    results_by_student = defaultdict(list)
+    results = Result.query.filter(
+        Result.class_id == class_record.id,
+        Result.session_id == session_obj.id,
+        Result.term == term,
+        Result.student_id.in_(student_ids)
+    ).options(joinedload(Result.subject)).order_by(Result.student_id, Result.subject_id).all()
+    for result in results:
+        results_by_student[result.student_id].append(result)
+
+    summaries = {
+        summary.student_id: summary
+        for summary in StudentTermSummary.query.filter(
+            StudentTermSummary.class_id == class_record.id,
+            StudentTermSummary.session_id == session_obj.id,
+            StudentTermSummary.term == term,
+            StudentTermSummary.student_id.in_(student_ids)
+        ).all()
+    }
+    return [
+        (student, results_by_student[student.id], summaries.get(student.id))
+        for student in students if results_by_student[student.id]
+    ]
+
+
+def _write_pdf(html, base_url):
+    """Render one report card; runs in a worker process."""
+    from weasyprint import HTML
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def _pool_context():
+    # Never fork: the job runs on a thread of a multi-threaded web worker, and a forked child can inherit
+    # locks (logging, the database pool) held by other threads. A forkserver starts clean and stays cheap.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _render_pdfs(pages):
+    """Render (name, html) pairs to PDFs on a process pool, yielding (name, pdf) in completion order."""
+    base_url = app.root_path
+    workers = min(app.config.get("REPORT_CARD_WORKERS", os.cpu_count() or 1), len(pages))
+    if workers <= 1:
+        for name, html in pages:
+            yield name, _write_pdf(html, base_url)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+        futures = {executor.submit(_write_pdf, html, base_url): name for name, html in pages}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def _merge_pdf(pages, progress):
+    """Lay out every report card and write them as one PDF document."""
+    from weasyprint import HTML
+    documents = []
+    for done, (name, html) in enumerate(pages, start=1):
+        documents.append(HTML(string=html, base_url=app.root_path).render())
+        progress(done, len(pages))
+    all_pages = [page for document in documents for page in document.pages]
+    return documents[0].copy(all_pages).write_pdf()
+
+
+def generate_class_report_cards(class_id, session_id, term, output_format="zip", progress=None):
+    """Render report cards for every student in a class and return (filename, mimetype, data).
+
+    output_format is "zip" (one PDF per student, rendered in parallel) or "pdf" (a single merged document).
+    """
+    progress = progress or (lambda done, total: None)
+    class_record = Classes.query.get(class_id)
+    session_obj = Session.query.get(session_id)
+    if class_record is None or session_obj is None or term not in [t.value for t in TermEnum]:
+        raise ValueError("Unknown class, session or term.")
+
+    cards = load_class_report_cards(class_record, session_obj, term)
+    if not cards:
+        raise ValueError(f"No results found for {class_record.name} in {term} Term, {session_obj.year}.")
+
+    assets = report_card_assets()
+
+    def render(student, results, term_summary):
+        return render_template(
+            "student/pdf_results.html",
+            **build_report_card_context(student, results, term_summary, term, session_obj, class_record.name, assets)
+        )
+
+    base_name = f"Report_Cards_{class_record.name}_{term}_{session_obj.year}".replace("/", "-").replace(" ", "_")
+    app.logger.info(f"Rendering {len(cards)} report cards for {class_record.name}, {term} Term {session_obj.year}")
+
+    if output_format == "pdf":
+        pages = [(report_card_filename(student, term, session_obj.year), render(student, results, term_summary))
+                 for student, results, term_summary in cards]
+        progress(0, len(pages))
+        return f"{base_name}.pdf", "application/pdf", _merge_pdf(pages, progress)
+
+    # Cards already in the PDF cache go straight into the archive; only the rest are rendered
+    cached, pages, cache_keys = [], [], {}
+    for student, results, term_summary in cards:
+        name = report_card_filename(student, term, session_obj.year)
+        cache_key = pdf_cache.key(student, results, term_summary, term, session_obj, class_record.id, class_record.name)
+        pdf = pdf_cache.get(cache_key)
+        if pdf is not None:
+            cached.append((name, pdf))
+        else:
+            cache_keys[name] = cache_key
+            pages.append((name, render(student, results, term_summary)))
+    progress(len(cached), len(cards))
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, pdf in cached:
+            archive.writestr(f"{name}.pdf", pdf)
+        for done, (name, pdf) in enumerate(_render_pdfs(pages), start=len(cached) + 1):
+            archive.writestr(f"{name}.pdf", pdf)
+            pdf_cache.put(cache_keys[name], pdf)
+            progress(done, len(cards))
+    return f"{base_name}.zip", "application/zip", buffer.getvalue()
+
+
+report_cards_cli = AppGroup("report-cards", help="Generate report cards in bulk.")
+
+
+@report_cards_cli.command("generate")
+@click.argument("class_name")
+@click.option("--session", "session_year", help="Session year, e.g. 2024/2025. Defaults to the current session.")
+@click.option("--term", type=click.Choice([t.value for t in TermEnum]), help="Defaults to the current term.")
+@click.option("--format", "output_format", type=click.Choice(["zip", "pdf"]), default="zip", show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Defaults to the generated file name.")
+def generate_command(class_name, session_year, term, output_format, output):
+    """Write report cards for every student in CLASS_NAME."""
+    class_record = Classes.query.filter_by(name=class_name).first()
+    if class_record is None:
+        raise click.ClickException(f"Class {class_name!r} not found.")
+    if session_year:
+        session_obj = Session.query.filter_by(year=session_year).first()
+    else:
+        session_obj = Session.query.filter_by(is_current=True).first()
+    if session_obj is None:
+        raise click.ClickException("Session not found.")
+    term = term or session_obj.current_term
+
+    def progress(done, total):
+        click.echo(f"\r{done}/{total} report cards rendered", nl=done == total)
+
+    try:
+        filename, _, data = generate_class_report_cards(class_record.id, session_obj.id, term, output_format, progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    with open(output or filename, "wb") as f:
+        f.write(data)
+    click.echo(f"Wrote {output or filename}")
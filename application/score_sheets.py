@@ -0,0 +1,306 @@
+import hashlib
+import hmac
+import json
+from io import BytesIO
+
+import openpyxl
+from flask import current_app as app
+from openpyxl.styles import Alignment, Font, PatternFill, Protection
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+from . import db
+from .helpers import SCORE_LIMITS, get_subjects_by_class_name, save_results_bulk
+from .models import Classes, Result, Session, Student, StudentClassHistory
+
+TEMPLATE_FORMAT = "score-template-1"
+SCORE_FIELDS = list(SCORE_LIMITS)
+FIELD_LABELS = {"class_assessment": "C/A", "summative_test": "S/T", "exam": "Exam"}
+SCORES_SHEET, META_SHEET, BASELINE_SHEET = "Scores", "Template", "Baseline"
+# Title, subject names, column labels; students start on the next row
+HEADER_ROWS = 3
+# Hidden student id, reg no, name; scores start in the next column
+FIRST_SCORE_COLUMN = 4
+EDITABLE_FILL = PatternFill("solid", fgColor="FFF2CC")
+
+
+class ScoreSheet:
+    """A parsed score template: what it covers, the scores it was generated with and the scores entered."""
+
+    def __init__(self, class_id, session_id, term, subject_ids, baseline):
+        self.class_id = class_id
+        self.session_id = session_id
+        self.term = term
+        self.subject_ids = subject_ids
+        self.baseline = baseline
+        self.entries = {}
+        self.errors = []
+
+
+class ScoreSheetReport:
+    """Outcome of applying a score sheet: cells written, edits skipped because the saved score moved on, errors."""
+
+    def __init__(self):
+        self.changed = 0
+        self.conflicts = []
+        self.errors = []
+
+    def add_conflict(self, student_id, subject_id, field, uploaded, current):
+        self.conflicts.append((student_id, subject_id, field, uploaded, current))
+
+    def summary(self):
+        if self.errors:
+            shown = "; ".join(self.errors[:10])
+            more = f" (and {len(self.errors) - 10} more)" if len(self.errors) > 10 else ""
+            return f"No scores were saved. Fix these cells and upload again: {shown}{more}"
+        message = f"{self.changed} score(s) updated."
+        if self.conflicts:
+            message += f" {len(self.conflicts)} edit(s) skipped because the score was changed by someone else after download."
+        return message
+
+
+def _columns(subject_ids):
+    """(subject_id, field) for each score column, left to right."""
+    return [(subject_id, field) for subject_id in subject_ids for field in SCORE_FIELDS]
+
+
+def _checksum(class_id, session_id, term, subject_ids, baseline_rows):
+    payload = json.dumps([TEMPLATE_FORMAT, class_id, session_id, term, subject_ids, baseline_rows], separators=(",", ":"))
+    return hmac.new(app.config["SECRET_KEY"].encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _roster(class_id, session_id):
+    return (
+        db.session.query(Student)
+        .join(StudentClassHistory, StudentClassHistory.student_id == Student.id)
+        .filter(
+            StudentClassHistory.session_id == session_id,
+            StudentClassHistory.class_id == class_id,
+            StudentClassHistory.is_active == True,
+            StudentClassHistory.leave_date.is_(None)
+        )
+        .order_by(Student.last_name, Student.first_name, Student.id)
+        .distinct()
+        .all()
+    )
+
+
+def _saved_scores(class_id, session_id, term, student_ids):
+    """{(student_id, subject_id): {field: score}} for the class/term's existing Result rows."""
+    results = db.session.query(Result.student_id, Result.subject_id, *[getattr(Result, field) for field in SCORE_FIELDS]).filter(
+        Result.class_id == class_id,
+        Result.session_id == session_id,
+        Result.term == term,
+        Result.student_id.in_(student_ids)
+    )
+    return {(row[0], row[1]): dict(zip(SCORE_FIELDS, row[2:])) for row in results}
+
+
+def build_score_template(class_id, session_id, term, subjects=None):
+    """Build an XLSX score template for a class/term; returns (filename, BytesIO).
+
+    The visible sheet lists the active roster with one C/A, S/T and Exam column per subject (default: every
+    subject of the class), pre-filled with saved scores; only score cells are editable. Hidden sheets keep the
+    ids, the scores as generated and a keyed checksum over both, so an upload can be matched back and diffed.
+    """
+    cls = db.session.get(Classes, class_id)
+    session_obj = db.session.get(Session, session_id)
+    if cls is None or session_obj is None:
+        raise ValueError("Class or session not found.")
+    subjects = get_subjects_by_class_name(class_id) if subjects is None else subjects
+    students = _roster(class_id, session_id)
+    if not students or not subjects:
+        raise ValueError(f"No active students or subjects for {cls.name}.")
+
+    subject_ids = [subject.id for subject in subjects]
+    columns = _columns(subject_ids)
+    saved = _saved_scores(class_id, session_id, term, [student.id for student in students])
+    baseline_rows = [
+        [student.id] + [saved.get((student.id, subject_id), {}).get(field) for subject_id, field in columns]
+        for student in students
+    ]
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = SCORES_SHEET
+    sheet.append(["", f"{cls.name} - {term} Term, {session_obj.year}"])
+    sheet.append(["", "", ""] + [name for subject in subjects for name in (subject.name, "", "")])
+    sheet.append(["Student ID", "Reg No", "Student"] + [
+        f"{FIELD_LABELS[field]} ({SCORE_LIMITS[field]})" for _, field in columns
+    ])
+    sheet["B1"].font = Font(bold=True, size=13)
+    for index in range(len(subjects)):
+        start = FIRST_SCORE_COLUMN + index * len(SCORE_FIELDS)
+        sheet.merge_cells(start_row=2, start_column=start, end_row=2, end_column=start + len(SCORE_FIELDS) - 1)
+        sheet.cell(row=2, column=start).alignment = Alignment(horizontal="center")
+    for row in sheet.iter_rows(min_row=2, max_row=HEADER_ROWS):
+        for cell in row:
+            cell.font = Font(bold=True)
+
+    for student, baseline_row in zip(students, baseline_rows):
+        sheet.append([student.id, student.reg_no, f"{student.last_name} {student.first_name}"] + baseline_row[1:])
+
+    last_row = HEADER_ROWS + len(students)
+    for column, (_, field) in enumerate(columns, start=FIRST_SCORE_COLUMN):
+        letter = get_column_letter(column)
+        sheet.column_dimensions[letter].width = 8
+        validation = DataValidation(
+            type="whole", operator="between", formula1="0", formula2=str(SCORE_LIMITS[field]), allow_blank=True,
+            showErrorMessage=True, error=f"Enter a whole number from 0 to {SCORE_LIMITS[field]}."
+        )
+        validation.add(f"{letter}{HEADER_ROWS + 1}:{letter}{last_row}")
+        sheet.add_data_validation(validation)
+        for row in range(HEADER_ROWS + 1, last_row + 1):
+            cell = sheet.cell(row=row, column=column)
+            cell.protection = Protection(locked=False)
+            cell.fill = EDITABLE_FILL
+    sheet.column_dimensions["A"].hidden = True
+    sheet.column_dimensions["B"].width = 18
+    sheet.column_dimensions["C"].width = 30
+    sheet.freeze_panes = sheet.cell(row=HEADER_ROWS + 1, column=FIRST_SCORE_COLUMN)
+    # Locks ids, names and layout (no inserted rows or columns) while leaving the score cells editable
+    sheet.protection.sheet = True
+
+    meta = workbook.create_sheet(META_SHEET)
+    for row in [
+        ["format", TEMPLATE_FORMAT],
+        ["class_id", class_id],
+        ["session_id", session_id],
+        ["term", term],
+        ["subject_ids", ",".join(str(subject_id) for subject_id in subject_ids)],
+        ["checksum", _checksum(class_id, session_id, term, subject_ids, baseline_rows)],
+    ]:
+        meta.append(row)
+    baseline = workbook.create_sheet(BASELINE_SHEET)
+    for row in baseline_rows:
+        baseline.append(row)
+    meta.sheet_state = baseline.sheet_state = "veryHidden"
+
+    output = BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    filename = f"Scores_{cls.name}_{term}_{session_obj.year}.xlsx".replace("/", "-").replace(" ", "_")
+    return filename, output
+
+
+def _score(value):
+    """A spreadsheet cell as a score, raising ValueError for anything but a blank or a whole number."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    if isinstance(value, int):
+        return value
+    return int(str(value).strip())
+
+
+def read_score_sheet(stream):
+    """Parse a filled score template, streaming the score rows; raises ValueError if it isn't an intact template.
+
+    Cell-level problems (non-numeric or out-of-range scores, unknown rows) are collected in ScoreSheet.errors.
+    """
+    try:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Not a readable .xlsx file: {e}")
+    try:
+        if not {SCORES_SHEET, META_SHEET, BASELINE_SHEET} <= set(workbook.sheetnames):
+            raise ValueError("This file is not a score template; download a fresh one.")
+        meta = {str(key): value for key, value in workbook[META_SHEET].iter_rows(max_col=2, values_only=True) if key}
+        try:
+            class_id, session_id = int(meta["class_id"]), int(meta["session_id"])
+            term = str(meta["term"])
+            subject_ids = [int(subject_id) for subject_id in str(meta["subject_ids"]).split(",")]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("This file is not a score template; download a fresh one.")
+        columns = _columns(subject_ids)
+        width = len(columns) + 1
+        # Trailing blank cells aren't stored, so rows are padded back to the template's width
+        baseline_rows = [
+            (list(row) + [None] * width)[:width] for row in workbook[BASELINE_SHEET].iter_rows(values_only=True)
+        ]
+        expected = _checksum(class_id, session_id, term, subject_ids, baseline_rows)
+        if meta.get("format") != TEMPLATE_FORMAT or not hmac.compare_digest(str(meta.get("checksum", "")), expected):
+            raise ValueError("The template's hidden data was changed or it was not issued by this school; download a fresh one.")
+
+        sheet = ScoreSheet(class_id, session_id, term, subject_ids, {
+            row[0]: dict(zip(columns, row[1:])) for row in baseline_rows
+        })
+        for row_number, values in enumerate(
+            workbook[SCORES_SHEET].iter_rows(min_row=HEADER_ROWS + 1, values_only=True), start=HEADER_ROWS + 1
+        ):
+            values = list(values) + [None] * (FIRST_SCORE_COLUMN - 1 + len(columns))
+            scores = values[FIRST_SCORE_COLUMN - 1:FIRST_SCORE_COLUMN - 1 + len(columns)]
+            student_id = values[0]
+            if student_id not in sheet.baseline:
+                if any(_is_filled(value) for value in scores):
+                    sheet.errors.append(f"Row {row_number}: not a student from this template")
+                continue
+            entry = {}
+            for column, ((subject_id, field), value) in enumerate(zip(columns, scores), start=FIRST_SCORE_COLUMN):
+                reference = f"{get_column_letter(column)}{row_number}"
+                try:
+                    score = _score(value)
+                except ValueError:
+                    sheet.errors.append(f"{reference}: '{value}' is not a whole number")
+                    continue
+                if score is not None and not 0 <= score <= SCORE_LIMITS[field]:
+                    sheet.errors.append(f"{reference}: {FIELD_LABELS[field]} must be between 0 and {SCORE_LIMITS[field]}")
+                    continue
+                entry[(subject_id, field)] = score
+            sheet.entries[student_id] = entry
+        return sheet
+    finally:
+        workbook.close()
+
+
+def _is_filled(value):
+    return value is not None and not (isinstance(value, str) and not value.strip())
+
+
+def apply_score_sheet(sheet, class_id, session_id, term, allowed_subject_ids=None):
+    """Diff a parsed sheet against the saved Result rows and write only the edited cells, without committing.
+
+    A cell counts as edited when it differs from the score the template was generated with. If the saved score
+    has also changed since then (someone else edited it), the saved score is kept and the cell is reported as a
+    conflict. Nothing is written when the sheet has errors. The edits go through save_results_bulk as one batch.
+    """
+    if (sheet.class_id, sheet.session_id, sheet.term) != (class_id, session_id, term):
+        raise ValueError("This template was generated for a different class, session or term.")
+    if allowed_subject_ids is not None and not set(sheet.subject_ids) <= set(allowed_subject_ids):
+        raise ValueError("This template includes subjects you can no longer edit; download a fresh one.")
+
+    report = ScoreSheetReport()
+    report.errors.extend(sheet.errors)
+    if report.errors:
+        return report
+
+    current = _saved_scores(class_id, session_id, term, list(sheet.entries))
+    cells = {}
+    for student_id, entry in sheet.entries.items():
+        baseline = sheet.baseline[student_id]
+        for (subject_id, field), uploaded in entry.items():
+            saved = current.get((student_id, subject_id), {}).get(field)
+            if uploaded == baseline[(subject_id, field)] or uploaded == saved:
+                continue
+            if saved != baseline[(subject_id, field)]:
+                report.add_conflict(student_id, subject_id, field, uploaded, saved)
+                continue
+            cell = cells.setdefault(
+                (student_id, subject_id),
+                dict(current.get((student_id, subject_id)) or dict.fromkeys(SCORE_FIELDS), student_id=student_id, subject_id=subject_id)
+            )
+            cell[field] = uploaded
+            report.changed += 1
+
+    if cells:
+        save_results_bulk(class_id=class_id, session_id=session_id, term=term, cells=list(cells.values()))
+    app.logger.info(
+        f"Score sheet for class {class_id}, session {session_id}, term {term}: {report.changed} cells changed, "
+        f"{len(report.conflicts)} conflicts"
+    )
+    return report
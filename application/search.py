@@ -0,0 +1,210 @@
+import re
+import unicodedata
+
+import click
+from flask import current_app as app
+from flask.cli import AppGroup
+from sqlalchemy import case, func, insert
+
+from . import db
+from .models import Classes, Student, StudentSearchToken
+
+WORD, DELETION = StudentSearchToken.WORD, StudentSearchToken.DELETION
+
+# Scores per query term; a student's rank is the sum over terms of the best match
+EXACT_SCORE, PREFIX_SCORE, FUZZY_SCORE = 3, 2, 1
+# Shorter words produce too many one-edit neighbours to be useful
+FUZZY_MIN_LENGTH = 4
+INDEX_CHUNK_SIZE = 500
+# Index entries scanned when estimating how selective a query term is
+ESTIMATE_LIMIT = 1000
+
+_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_terms(text):
+    """Lowercase, strip accents and split text into alphanumeric terms."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+    return [term for term in _SPLIT.split(text) if term]
+
+
+def _deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def student_tokens(student):
+    """Return the (kind, token) search keys for a student's names and registration number.
+
+    Names contribute each word plus its one-letter deletions for typo tolerance; the reg_no contributes
+    its segments, its digits without leading zeros (so "12" finds .../012) and the whole number run together.
+    """
+    tokens = set()
+    for word in normalize_terms(" ".join(filter(None, [student.first_name, student.middle_name, student.last_name]))):
+        tokens.add((WORD, word))
+        if len(word) >= FUZZY_MIN_LENGTH and not word.isdigit():
+            tokens.update((DELETION, deletion) for deletion in _deletions(word))
+    reg_terms = normalize_terms(student.reg_no)
+    for term in reg_terms:
+        tokens.add((WORD, term))
+        if term.isdigit() and term.lstrip("0"):
+            tokens.add((WORD, term.lstrip("0")))
+    if len(reg_terms) > 1:
+        tokens.add((WORD, "".join(reg_terms)))
+    return tokens
+
+
+def index_students(students):
+    """Rewrite the search tokens of the given students inside the caller's transaction."""
+    students = [student for student in students if student.id is not None]
+    for offset in range(0, len(students), INDEX_CHUNK_SIZE):
+        chunk = students[offset:offset + INDEX_CHUNK_SIZE]
+        remove_students_from_index([student.id for student in chunk])
+        rows = [
+            {"kind": kind, "token": token[:StudentSearchToken.MAX_LENGTH], "student_id": student.id}
+            for student in chunk for kind, token in student_tokens(student)
+        ]
+        if rows:
+            db.session.execute(insert(StudentSearchToken), rows)
+
+
+def remove_students_from_index(student_ids):
+    if student_ids:
+        db.session.execute(StudentSearchToken.__table__.delete().where(StudentSearchToken.student_id.in_(student_ids)))
+
+
+def rebuild_search_index():
+    """Re-tokenize every student; returns the number indexed."""
+    db.session.execute(StudentSearchToken.__table__.delete())
+    count = 0
+    last_id = 0
+    while True:
+        batch = Student.query.filter(Student.id > last_id).order_by(Student.id).limit(INDEX_CHUNK_SIZE).all()
+        if not batch:
+            break
+        index_students(batch)
+        count += len(batch)
+        last_id = batch[-1].id
+    db.session.commit()
+    return count
+
+
+def _prefix_upper_bound(term):
+    # The smallest string greater than every string starting with term, so prefix lookups are index range scans
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+def _prefix_filter(term):
+    return (
+        StudentSearchToken.kind == WORD,
+        StudentSearchToken.token >= term,
+        StudentSearchToken.token < _prefix_upper_bound(term)
+    )
+
+
+def _estimated_matches(term):
+    """Prefix matches for term, counted no further than ESTIMATE_LIMIT index entries."""
+    matches = db.session.query(StudentSearchToken.student_id).filter(*_prefix_filter(term)).limit(ESTIMATE_LIMIT)
+    return db.session.query(func.count()).select_from(matches.subquery()).scalar()
+
+
+def _term_scores(term, candidates=None):
+    """Best score per student for one query term: exact or prefix word matches, then one-edit fuzzy matches.
+
+    candidates, when given, restricts the lookups to those student ids.
+    """
+    scores = {}
+    prefix_matches = db.session.query(
+        StudentSearchToken.student_id,
+        func.max(case((StudentSearchToken.token == term, EXACT_SCORE), else_=PREFIX_SCORE))
+    ).filter(*_prefix_filter(term))
+    if candidates is not None:
+        prefix_matches = prefix_matches.filter(StudentSearchToken.student_id.in_(candidates))
+    for student_id, score in prefix_matches.group_by(StudentSearchToken.student_id):
+        scores[student_id] = score
+
+    if len(term) >= FUZZY_MIN_LENGTH and not term.isdigit():
+        # A stored word or deletion equal to the term or one of its deletions is at most one edit away
+        keys = _deletions(term) | {term}
+        fuzzy_matches = db.session.query(StudentSearchToken.student_id).filter(
+            StudentSearchToken.kind.in_([WORD, DELETION]),
+            StudentSearchToken.token.in_(keys)
+        )
+        if candidates is not None:
+            fuzzy_matches = fuzzy_matches.filter(StudentSearchToken.student_id.in_(candidates))
+        for (student_id,) in fuzzy_matches.distinct():
+            scores.setdefault(student_id, FUZZY_SCORE)
+    return scores
+
+
+class SearchResults(dict):
+    """{student_id: score} for the best matches; truncated is set when more students matched than were kept."""
+
+    def __init__(self, items=(), truncated=False):
+        super().__init__(items)
+        self.truncated = truncated
+
+
+def search_student_ids(query, student_ids=None):
+    """Rank students matching every term of query; returns SearchResults with the best SEARCH_MAX_RESULTS only.
+
+    student_ids optionally restricts the candidates (e.g. to a class roster).
+    """
+    terms = normalize_terms(query)
+    if not terms:
+        return SearchResults()
+    terms = list(dict.fromkeys(terms))
+    if len(terms) > 1:
+        # Most selective term first, so common terms (a shared reg_no segment, a popular name) only re-check survivors
+        terms.sort(key=_estimated_matches)
+    ranked = None
+    for term in terms:
+        candidates = list(ranked) if ranked is not None and len(ranked) <= INDEX_CHUNK_SIZE else None
+        scores = _term_scores(term, candidates)
+        if ranked is None:
+            ranked = scores
+        else:
+            ranked = {student_id: ranked[student_id] + score for student_id, score in scores.items() if student_id in ranked}
+        if not ranked:
+            return SearchResults()
+    if student_ids is not None:
+        allowed = set(student_ids)
+        ranked = {student_id: score for student_id, score in ranked.items() if student_id in allowed}
+    limit = app.config.get("SEARCH_MAX_RESULTS", 500)
+    best = sorted(ranked.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return SearchResults(best, truncated=len(ranked) > limit)
+
+
+def matching_class_ids(query):
+    """Ids of classes whose normalized name starts with the normalized query, e.g. "jss1" or "JSS 1"."""
+    wanted = "".join(normalize_terms(query))
+    if not wanted:
+        return []
+    return [
+        class_id for class_id, name in db.session.query(Classes.id, Classes.name)
+        if "".join(normalize_terms(name)).startswith(wanted)
+    ]
+
+
+def rank_column(ranked, column=Student.id):
+    """A sort column that orders ranked students best first (lower is better) ahead of unranked ones."""
+    return case({student_id: -score for student_id, score in ranked.items()}, value=column, else_=0)
+
+
+def ranked_sort_key(ranked, student_of, base_key):
+    """Prefix a keyset sort key with the rank_column value of the row's student."""
+    def key(row):
+        return [-ranked.get(student_of(row).id, 0)] + base_key(row)
+    return key
+
+
+search_cli = AppGroup("search-index", help="Maintain the student search index.")
+
+
+@search_cli.command("rebuild")
+def rebuild_command():
+    """Re-tokenize every student into student_search_token."""
+    count = rebuild_search_index()
+    app.logger.info(f"Rebuilt student search index for {count} students")
+    click.echo(f"Indexed {count} students")
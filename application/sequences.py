@@ -0,0 +1,70 @@
+import re
+
+from flask import current_app as app
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import IdSequence, Student, Teacher
+
+
+def reserve(name, count=1, seed=None):
+    """Reserve count consecutive values of a named counter inside the caller's transaction; returns a range.
+
+    The relative UPDATE locks the counter row until the caller commits or rolls back, so concurrent
+    registrations queue on that one row instead of racing on a max() of the table they insert into, and a
+    rolled-back reservation gives its numbers back. A missing counter is created starting at seed() (default 1).
+    """
+    if count < 1:
+        return range(0)
+    bumped = db.session.execute(
+        update(IdSequence).where(IdSequence.name == name).values(next_value=IdSequence.next_value + count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not bumped:
+        start = seed() if seed else 1
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(IdSequence).values(name=name, next_value=start + count))
+            return range(start, start + count)
+        except IntegrityError:
+            # Another registration created the counter first; take the next block from it instead
+            return reserve(name, count, seed)
+    next_value = db.session.query(IdSequence.next_value).filter_by(name=name).scalar()
+    return range(next_value - count, next_value)
+
+
+def _highest_suffix(values, prefix):
+    pattern = re.compile(re.escape(prefix) + r"(\d*)$")
+    highest = None
+    for value in values:
+        match = pattern.match(value or "")
+        if match:
+            highest = max(highest or 0, int(match.group(1) or 0))
+    return highest
+
+
+def allocate_reg_nos(count=1, prefix=None):
+    """Registration numbers for count new students: prefix (default REG_NO_PREFIX) plus a zero-padded number."""
+    prefix = prefix if prefix is not None else app.config.get("REG_NO_PREFIX", "AAIS/0559/")
+
+    def seed():
+        # One-off scan when the counter is created; reg_nos used to be derived from student ids, so stay above both
+        taken = db.session.query(Student.reg_no).filter(Student.reg_no.like(f"{prefix}%"))
+        highest = _highest_suffix((reg_no for (reg_no,) in taken), prefix) or 0
+        return max(highest, db.session.query(func.max(Student.id)).scalar() or 0) + 1
+
+    return [f"{prefix}{number:03}" for number in reserve(f"reg_no:{prefix}", count, seed)]
+
+
+def allocate_employee_id(first_name, last_name):
+    """first_name.last_name for the first teacher with that name, then first_name.last_name1, 2, ..."""
+    base_id = f"{first_name.lower()}.{last_name.lower()}"
+
+    def seed():
+        taken = db.session.query(Teacher.employee_id).filter(Teacher.employee_id.like(f"{base_id}%"))
+        highest = _highest_suffix((employee_id for (employee_id,) in taken), base_id)
+        return 0 if highest is None else highest + 1
+
+    number = reserve(f"employee_id:{base_id}", 1, seed)[0]
+    return f"{base_id}{number}" if number else base_id
@@ -17,6 +17,7 @@ from werkzeug.utils import secure_filename
 from sqlalchemy.exc import OperationalError
 from datetime import datetime
 from sqlalchemy import func, desc
+from sqlalchemy.orm import joinedload
 from flask_wtf.csrf import CSRFError, generate_csrf
 from ..models import Student, Result, Session, Subject, FeePayment, StudentTermSummary, StudentClassHistory, RoleEnum, Classes, TermEnum
 from ..auth.forms import ResultForm
@@ -29,6 +30,9 @@ from ..helpers import (
     generate_excel_broadsheet,
     prepare_broadsheet_data,
 )
+from ..report_cards import build_report_card_context
+from ..pdf_cache import pdf_cache
+from ..search import index_students
 from weasyprint import HTML
 
 @student_bp.route("/dashboard")
@@ -112,25 +116,16 @@ def student_portal():
                 Result.session_id == current_session.id
             ).scalar() or 0
 
-            rank_query = db.session.query(
-                Student.id,
-                func.avg(Result.total).label('avg_score')
-            ).join(
-                Result,
-                Student.id == Result.student_id
-            ).join(
-                Classes,
-                Result.class_id == Classes.id
-            ).join(
-                StudentTermSummary,
-                StudentTermSummary.class_id == Classes.id
-            ).filter(
-                Result.session_id == current_session.id,
-                Result.term == current_term,
-                StudentTermSummary.class_id == current_enrollment.class_id
-            ).group_by(Student.id).order_by(func.avg(Result.total).desc()).all()
-            student_rank = next((i + 1 for i, (sid, _) in enumerate(rank_query) if sid == student.id), None)
-            total_students = len(rank_query)
+            # Positions are precomputed per class/term by update_class_positions
+            class_summaries = StudentTermSummary.query.filter(
+                StudentTermSummary.class_id == current_enrollment.class_id,
+                StudentTermSummary.session_id == current_session.id,
+                StudentTermSummary.term == current_term,
+                StudentTermSummary.subjects_offered > 0
+            )
+            own_summary = class_summaries.filter(StudentTermSummary.student_id == student.id).first()
+            student_rank = own_summary.position if own_summary else None
+            total_students = class_summaries.count()
         else:
             class_average = 0
             student_rank = None
@@ -346,20 +341,12 @@ def download_results_pdf(student_id):
             student_id=student.id,
             term=term,
             session_id=session_obj.id  # Use session_id
-        ).all()
+        ).options(joinedload(Result.subject)).all()
         if not results:
             flash(f"No results found for {term} in {session_obj.year}", "alert-info")
             app.logger.info(f"No results found for student_id: {student_id}, term: {term}, session_id: {session_id}")
             return redirect(url_for("students.select_results", student_id=student.id))
 
-        # Calculate grand_total from subject-specific totals
-        grand_total = {
-            "class_assessment": sum(result.class_assessment or 0 for result in results),
-            "summative_test": sum(result.summative_test or 0 for result in results),
-            "exam": sum(result.exam or 0 for result in results),
-            "total": sum(result.total or 0 for result in results),
-        }
-
         # Fetch term summary for aggregates
         term_summary = StudentTermSummary.query.filter_by(
             student_id=student.id,
@@ -367,47 +354,16 @@ def download_results_pdf(student_id):
             session_id=session_obj.id
         ).first()
 
-        last_term_average = term_summary.last_term_average if term_summary else None
-        average = term_summary.term_average if term_summary else None
-        cumulative_average = term_summary.cumulative_average if term_summary else None
-        subjects_offered = term_summary.subjects_offered if term_summary else len(results)
-        next_term_begins = term_summary.next_term_begins if term_summary else None
-        position = term_summary.position if term_summary else None
-        date_issued = term_summary.date_issued if term_summary else None
-        principal_remark = term_summary.principal_remark if term_summary else None
-        teacher_remark = term_summary.teacher_remark if term_summary else None
-        date_printed = datetime.now().strftime('%dth %B, %Y')
-
-        logo_path = os.path.join(app.root_path, "static", "images", "school_logo.png")
-        logo_url = f"file://{logo_path}" if os.path.exists(logo_path) else ""
-        signature_path = os.path.join(app.root_path, "static", "images", "signature_anne.png")
-        signature_url = f"file://{signature_path}" if os.path.exists(signature_path) else ""
-
-        rendered = render_template(
-            "student/pdf_results.html",
-            title=f"{student.first_name}_{student.last_name}_{term}_{session_obj.year}_Result",
-            student=student,
-            results=results,
-            term=term,
-            session_id=session_obj.id,
-            session_year=session_obj.year,  # For display
-            grand_total=grand_total,
-            school_name=app.config.get("SCHOOL_NAME", "Aunty Anne's Int'l School"),
-            average=average,
-            cumulative_average=cumulative_average,
-            next_term_begins=next_term_begins,
-            last_term_average=last_term_average,
-            position=position,
-            date_issued=date_issued,
-            date_printed=date_printed,
-            logo_url=logo_url,
-            signature_url=signature_url,
-            class_name=class_name,
-            principal_remark=principal_remark,
-            teacher_remark=teacher_remark,
-        )
-
-        pdf = HTML(string=rendered).write_pdf()
+        # Identical inputs give identical bytes, so repeat downloads skip rendering entirely
+        cache_key = pdf_cache.key(student, results, term_summary, term, session_obj, results[0].class_id, class_name)
+        pdf = pdf_cache.get(cache_key)
+        if pdf is None:
+            rendered = render_template(
+                "student/pdf_results.html",
+                **build_report_card_context(student, results, term_summary, term, session_obj, class_name)
+            )
+            pdf = HTML(string=rendered).write_pdf()
+            pdf_cache.put(cache_key, pdf)
         response = make_response(pdf)
         response.headers["Content-Type"] = "application/pdf"
         response.headers["Content-Disposition"] = (
@@ -496,6 +452,7 @@ def edit_profile(student_id):
                     file.save(os.path.join(upload_folder, filename))
                     student.profile_pic = url_for('static', filename=f'images/uploads/profile_pics/{filename}')
 
+            index_students([student])
             db.session.commit()
             flash("Profile updated successfully!", "alert-success")
 
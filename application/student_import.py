@@ -0,0 +1,332 @@
+import codecs
+import csv
+import io
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from itertools import islice
+
+import click
+import openpyxl
+from flask import current_app as app
+from flask.cli import AppGroup
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from . import bcrypt, db
+from .audit import record_audit
+from .enrollment import refresh_enrollment_snapshot
+from .models import Classes, RoleEnum, Session, Student, StudentClassHistory, TermEnum, User, cipher
+from .search import index_students
+from .sequences import allocate_reg_nos
+
+IMPORT_COLUMNS = [
+    "first_name", "middle_name", "last_name", "gender", "date_of_birth", "class", "term", "parent_name",
+    "parent_phone_number", "address", "parent_occupation", "state_of_origin", "local_government_area", "religion",
+]
+REQUIRED_COLUMNS = ["first_name", "last_name", "gender", "class"]
+# Column limits from the Student model, checked up front so one long value can't fail a whole batch insert
+MAX_LENGTHS = {
+    "first_name": 50, "middle_name": 50, "last_name": 50, "parent_name": 70, "address": 255,
+    "parent_occupation": 100, "state_of_origin": 50, "local_government_area": 50, "religion": 50,
+}
+GENDERS = {"m": "male", "male": "male", "f": "female", "female": "female"}
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"]
+
+
+class ImportReport:
+    """Outcome of an import: registered students, per-row errors (by spreadsheet row number) and throughput.
+
+    stopped explains why the import ended before the last row (an unreadable file or a lost database); rows
+    registered before that stay registered and are listed in imported.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = []
+        self.errors = []
+        self.stopped = None
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    @property
+    def rows_per_minute(self):
+        return round(self.rows / self.elapsed * 60) if self.elapsed else 0
+
+
+def read_rows(stream, filename):
+    """Yield (row_number, {column: value}) from a CSV or XLSX upload without loading it all into memory."""
+    if filename.lower().endswith(".xlsx"):
+        try:
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError):
+            raise ValueError(f"{filename} is not a readable .xlsx file")
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell or "").strip().lower() for cell in next(rows, [])]
+            for row_number, values in enumerate(rows, start=2):
+                if any(value not in (None, "") for value in values):
+                    yield row_number, dict(zip(header, values))
+        finally:
+            workbook.close()
+        return
+    try:
+        reader = csv.DictReader(codecs.iterdecode(stream, "utf-8-sig"))
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for row in reader:
+            if any((value or "").strip() for value in row.values() if isinstance(value, str)):
+                yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ValueError(f"{filename} is not a readable UTF-8 CSV file ({e})")
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date of birth '{value}'; use YYYY-MM-DD")
+
+
+def validate_row(raw, classes_by_name, default_term):
+    """Normalize one row into Student/StudentClassHistory values, raising ValueError listing every problem."""
+    values = {column: _text(raw.get(column)) for column in IMPORT_COLUMNS}
+    problems = [f"{column} is required" for column in REQUIRED_COLUMNS if not values[column]]
+    problems.extend(
+        f"{column} is longer than {limit} characters"
+        for column, limit in MAX_LENGTHS.items() if values[column] and len(values[column]) > limit
+    )
+    gender = GENDERS.get((values["gender"] or "").lower())
+    if values["gender"] and not gender:
+        problems.append(f"gender must be Male or Female, not '{values['gender']}'")
+    cls = classes_by_name.get((values["class"] or "").lower())
+    if values["class"] and not cls:
+        problems.append(f"unknown class '{values['class']}'")
+    term = (values["term"] or default_term).title().replace(" Term", "")
+    if term not in {t.value for t in TermEnum}:
+        problems.append(f"term must be First, Second or Third, not '{values['term']}'")
+    date_of_birth = None
+    if values["date_of_birth"]:
+        try:
+            date_of_birth = _parse_date(raw["date_of_birth"])
+        except ValueError as e:
+            problems.append(str(e))
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    student = {column: values[column] for column in MAX_LENGTHS}
+    phone = values["parent_phone_number"]
+    student.update(
+        gender=gender, date_of_birth=date_of_birth, approved=False,
+        _parent_phone_number=cipher.encrypt(phone.encode()).decode() if phone else None,
+    )
+    return student, cls.id, term
+
+
+def _hash_passwords(passwords):
+    workers = app.config.get("IMPORT_HASH_WORKERS") or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [hashed.decode("utf-8") for hashed in pool.map(bcrypt.generate_password_hash, passwords)]
+
+
+def _known_duplicates(batch):
+    """Row numbers whose name and date of birth match an existing student, with that student's reg_no."""
+    keys = {
+        (student["first_name"].lower(), student["last_name"].lower(), student["date_of_birth"]): row_number
+        for row_number, student, _, _ in batch if student["date_of_birth"]
+    }
+    if not keys:
+        return {}
+    existing = db.session.query(
+        func.lower(Student.first_name), func.lower(Student.last_name), Student.date_of_birth, Student.reg_no
+    ).filter(
+        tuple_(func.lower(Student.first_name), func.lower(Student.last_name), Student.date_of_birth).in_(list(keys))
+    )
+    return {keys[(first, last, born)]: reg_no for first, last, born, reg_no in existing}
+
+
+def _insert_batch(batch, session_id):
+    """Bulk insert users, students and enrollments for validated rows; returns [(row_number, student_id, reg_no)].
+
+    The batch's registration numbers are reserved and committed first, like a database sequence: the counter
+    row is locked only for that short transaction, and a batch that fails later leaves a gap in the numbers.
+    """
+    reg_nos = allocate_reg_nos(len(batch))
+    db.session.commit()
+    taken = {username for (username,) in db.session.query(User.username).filter(User.username.in_(reg_nos))}
+    if taken:
+        raise ValueError(f"Registration numbers already used as usernames: {', '.join(sorted(taken))}")
+
+    # New students log in with their reg_no as the initial password, as with single registration
+    password_hashes = _hash_passwords(reg_nos)
+    now = datetime.utcnow()
+    # The database assigns ids; they are read back by the unique username and user_id columns
+    db.session.execute(insert(User), [
+        {"username": reg_no, "password_hash": password_hash, "role": RoleEnum.STUDENT.value, "active": True}
+        for reg_no, password_hash in zip(reg_nos, password_hashes)
+    ])
+    user_id_by_username = dict(db.session.query(User.username, User.id).filter(User.username.in_(reg_nos)))
+    user_ids = [user_id_by_username[reg_no] for reg_no in reg_nos]
+    db.session.execute(insert(Student), [
+        dict(student, reg_no=reg_no, user_id=user_id)
+        for (_, student, _, _), reg_no, user_id in zip(batch, reg_nos, user_ids)
+    ])
+    student_id_by_user_id = dict(db.session.query(Student.user_id, Student.id).filter(Student.user_id.in_(user_ids)))
+    student_ids = [student_id_by_user_id[user_id] for user_id in user_ids]
+    db.session.execute(insert(StudentClassHistory), [
+        {"student_id": student_id, "session_id": session_id, "class_id": class_id, "start_term": term,
+         "join_date": now, "is_active": True}
+        for (_, _, class_id, term), student_id in zip(batch, student_ids)
+    ])
+    refresh_enrollment_snapshot(student_ids)
+    index_students(Student.query.filter(Student.id.in_(student_ids)).all())
+    return [(row_number, student_id, reg_no) for (row_number, _, _, _), student_id, reg_no in zip(batch, student_ids, reg_nos)]
+
+
+def import_students(rows, session, term, dry_run=False, progress=None):
+    """Validate and register students from (row_number, row) pairs, committing one batch at a time.
+
+    Rows that fail validation are reported and skipped; the rest are enrolled in session, from term unless a
+    row names its own, with bulk inserts. A batch the database rejects is rolled back and its rows reported as
+    errors; earlier batches stay committed. With dry_run nothing is written.
+    """
+    report = ImportReport(dry_run)
+    started = time.perf_counter()
+    classes_by_name = {cls.name.lower(): cls for cls in Classes.query.all()}
+    batch_size = app.config.get("IMPORT_BATCH_SIZE", 500)
+    seen = {}
+
+    rows = iter(rows)
+    while True:
+        try:
+            chunk = list(islice(rows, batch_size))
+        except ValueError as e:
+            report.stopped = str(e)
+            break
+        if not chunk:
+            break
+        report.rows += len(chunk)
+        batch = []
+        for row_number, raw in chunk:
+            try:
+                student, class_id, start_term = validate_row(raw, classes_by_name, term)
+            except ValueError as e:
+                report.add_error(row_number, str(e))
+                continue
+            if student["date_of_birth"]:
+                key = (student["first_name"].lower(), student["last_name"].lower(), student["date_of_birth"])
+                if key in seen:
+                    report.add_error(row_number, f"duplicate of row {seen[key]}")
+                    continue
+                seen[key] = row_number
+            batch.append((row_number, student, class_id, start_term))
+
+        duplicates = _known_duplicates(batch)
+        for row_number, reg_no in duplicates.items():
+            report.add_error(row_number, f"already registered as {reg_no}")
+        batch = [entry for entry in batch if entry[0] not in duplicates]
+        if not batch or dry_run:
+            report.imported.extend((row_number, None, None) for row_number, _, _, _ in batch)
+            continue
+        try:
+            report.imported.extend(_insert_batch(batch, session.id))
+            db.session.commit()
+        except (ValueError, IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            app.logger.error(f"Student import batch of rows {batch[0][0]}-{batch[-1][0]} rolled back: {str(e)}")
+            message = str(e) if isinstance(e, ValueError) else "the database rejected this batch"
+            for row_number, _, _, _ in batch:
+                report.add_error(row_number, f"not imported: {message}")
+            if isinstance(e, OperationalError):
+                report.stopped = "Database error; rows after this batch were not read."
+                break
+        if progress:
+            progress(report.rows, 0)
+
+    report.errors.sort()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def save_upload(upload):
+    """Keep an uploaded file in EXPORT_DIR for a background import; returns its path."""
+    export_dir = app.config.get("EXPORT_DIR")
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"import-{uuid.uuid4().hex}{os.path.splitext(upload.filename)[1].lower()}")
+    upload.save(path)
+    return path
+
+
+def report_csv(report):
+    """The report as CSV: one line per spreadsheet row with its reg_no or error."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["row", "status", "reg_no_or_error"])
+    lines = [(row_number, "registered", reg_no) for row_number, _, reg_no in report.imported]
+    lines.extend((row_number, "error", message) for row_number, message in report.errors)
+    writer.writerows(sorted(lines))
+    if report.stopped:
+        writer.writerow(["", "stopped", report.stopped])
+    return output.getvalue().encode("utf-8")
+
+
+def run_import_job(path, filename, session_id, term, user_id, progress=None):
+    """Background job: import a saved upload, then delete it; returns the report as a CSV artifact."""
+    try:
+        session = db.session.get(Session, session_id)
+        with open(path, "rb") as f:
+            report = import_students(read_rows(f, filename), session, term, progress=progress)
+        if report.imported:
+            record_audit(user_id, f"Imported {len(report.imported)} students from {filename}")
+            db.session.commit()
+    finally:
+        os.remove(path)
+    app.logger.info(f"Student import job for {filename}: {len(report.imported)} of {report.rows} rows, {len(report.errors)} errors")
+    return f"import_report_{os.path.splitext(filename)[0]}.csv", "text/csv", report_csv(report)
+
+
+student_import_cli = AppGroup("student-import", help="Register students in bulk from a spreadsheet.")
+
+
+@student_import_cli.command("run")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Validate and report without registering anyone.")
+def run_command(path, dry_run):
+    """Import students from a CSV or XLSX file with a header row."""
+    session = Session.get_current_session()
+    if not session:
+        raise click.ClickException("No current session set.")
+    with open(path, "rb") as f:
+        report = import_students(read_rows(f, path), session, session.current_term, dry_run=dry_run)
+    for row_number, message in report.errors:
+        click.echo(f"Row {row_number}: {message}")
+    if report.stopped:
+        click.echo(f"Stopped early: {report.stopped}")
+    verb = "Validated" if dry_run else "Imported"
+    click.echo(
+        f"{verb} {len(report.imported)} of {report.rows} rows in {report.elapsed:.1f}s "
+        f"({report.rows_per_minute} rows/minute), {len(report.errors)} errors"
+    )
+    app.logger.info(f"Student import from {path}: {len(report.imported)} of {report.rows} rows, dry_run={dry_run}")
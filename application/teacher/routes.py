@@ -9,7 +9,7 @@ from sqlalchemy.orm import joinedload
 from itertools import groupby
 from operator import itemgetter
 from flask import (
-    render_template, redirect, url_for, flash, request, jsonify, Response, current_app as app,
+    render_template, redirect, url_for, flash, request, jsonify, Response, current_app as app, send_file,
 )
 from flask_login import login_required, current_user
 from flask_wtf.csrf import CSRFError, generate_csrf
@@ -18,12 +18,17 @@ from ..helpers import (
     get_subjects_by_class_name, update_results_helper, save_result, calculate_average,
     calculate_cumulative_average, calculate_results, db, populate_form_with_results,
     generate_excel_broadsheet, prepare_broadsheet_data, group_students_by_class,
-    get_teacher_classes, save_class_wide_fields
+    get_teacher_classes, save_class_wide_fields, save_results_bulk
 )
 from ..models import (
     Student, User, Subject, Result, Session, StudentClassHistory, RoleEnum, Classes,
-    Teacher, TermEnum, class_teacher, AuditLog, class_subject, StudentTermSummary
+    Teacher, TermEnum, class_teacher, class_subject, StudentTermSummary
 )
+from ..audit import record_audit
+from ..enrollment import refresh_enrollment_snapshot
+from ..search import index_students
+from ..catalogue import teacher_subjects, teacher_subject_ids
+from ..score_sheets import build_score_template, read_score_sheet, apply_score_sheet
 from ..auth.forms import (
     ResultForm, ManageResultsForm, DeleteForm, TeacherForm, EditStudentForm,
     classForm, SubjectForm,
@@ -70,7 +75,7 @@ def teacher_dashboard():
      .order_by(Session.year.desc(), class_teacher.c.term)\
      .all()
 
-    assigned_subjects = teacher.subjects.all()
+    assigned_subjects = teacher_subjects(teacher.id)
     current_classes = get_teacher_classes(teacher.id, current_session.id, current_term.value)
 
     return render_template(
@@ -108,7 +113,7 @@ def view_classes():
 @teacher_bp.route("/subjects")
 def view_subjects():
     teacher = Teacher.query.filter_by(user_id=current_user.id).first_or_404()
-    assigned_subjects = teacher.subjects.all()
+    assigned_subjects = teacher_subjects(teacher.id)
     return render_template(
         "teacher/view_subjects.html",
         teacher=teacher,
@@ -191,6 +196,8 @@ def manage_students(class_id, session_id, term):
             ).first()
             if history:
                 history.class_id = form.class_id.data
+            refresh_enrollment_snapshot([student.id])
+            index_students([student])
             db.session.commit()
             flash("Student details updated successfully.", "alert-success")
         except OperationalError as e:
@@ -251,7 +258,7 @@ def view_class(class_id, session_id, term):
     students = [h.student for h in student_class_histories]
 
     subjects = get_subjects_by_class_name(cls.id) if is_form_teacher else [
-        s for s in get_subjects_by_class_name(cls.id) if s in teacher.subjects
+        s for s in get_subjects_by_class_name(cls.id) if s.id in teacher_subject_ids(teacher.id)
     ]
 
     return render_template(
@@ -334,7 +341,7 @@ def manage_results(class_id, student_id, session_id, term):
         return redirect(url_for("teachers.view_class", class_id=class_id, session_id=session_id, term=term))
 
     subjects = get_subjects_by_class_name(class_id) if is_form_teacher else [
-        s for s in get_subjects_by_class_name(class_id) if s in teacher.subjects
+        s for s in get_subjects_by_class_name(class_id) if s.id in teacher_subject_ids(teacher.id)
     ]
     result_form = ResultForm(term=term, session=session_id)
     form = ManageResultsForm()  # Unbound form for display
@@ -454,7 +461,6 @@ class ResultUpdateSchema(Schema):
     class_assessment = fields.Integer(allow_none=True, load_default=None)
     summative_test = fields.Integer(allow_none=True, load_default=None)
     exam = fields.Integer(allow_none=True, load_default=None)
-    position = fields.Str(allow_none=True, load_default=None)
 
     @validates_schema
     def validate_student_specific_fields(self, data, **kwargs):
@@ -471,7 +477,6 @@ def update_result_field(session_id, term):
     try:
         data = ResultUpdateSchema().load(request.get_json())
         data['next_term_begins'] = bleach.clean(data.get('next_term_begins', '')) if data.get('next_term_begins') else None
-        data['position'] = bleach.clean(data.get('position', '')) if data.get('position') else None
         data['date_issued'] = bleach.clean(data.get('date_issued', '')) if data.get('date_issued') else None
 
         # Save the result and get the updated object
@@ -483,7 +488,7 @@ def update_result_field(session_id, term):
             data=data,
             class_id=data["class_id"]
         )
-        db.session.add(AuditLog(user_id=current_user.id, action=f"Updated result for student {data['student_id']} in subject {data['subject_id']}"))
+        record_audit(current_user.id, f"Updated result for student {data['student_id']} in subject {data['subject_id']}")
         db.session.commit()
         app.logger.info(f"Result updated for student {data['student_id']} in subject {data['subject_id']} by user {current_user.username}")
 
@@ -507,7 +512,8 @@ def update_result_field(session_id, term):
             "grand_total": term_summary.grand_total if term_summary else None,
             "term_average": term_summary.term_average if term_summary else None,
             "cumulative_average": term_summary.cumulative_average if term_summary else None,
-            "subjects_offered": term_summary.subjects_offered if term_summary else None
+            "subjects_offered": term_summary.subjects_offered if term_summary else None,
+            "position": term_summary.position if term_summary else None
         })
     except ValidationError as e:
         app.logger.error(f"Validation error in update_result_field: {str(e.messages)}")
@@ -601,7 +607,7 @@ def broadsheet(class_id, session_id, term):
     #     session_id=session_id, class_id=class_id
     # ).join(Student).order_by(Student.last_name.asc()).all()]
     subjects = get_subjects_by_class_name(cls.id) if is_form_teacher else [
-        s for s in get_subjects_by_class_name(cls.id) if s in teacher.subjects
+        s for s in get_subjects_by_class_name(cls.id) if s.id in teacher_subject_ids(teacher.id)
     ]
 
     if not students or not subjects:
@@ -673,22 +679,14 @@ def update_broadsheet(class_id, session_id, term):
         flash("No data submitted for update.", "alert-danger")
         return redirect(url_for('teachers.broadsheet', form=form, class_id=class_id, session_id=session_id, term=term))
 
+    cells = [
+        {"student_id": student_id, "subject_id": subject_id, **scores}
+        for student_id, subject_scores in results_data.items()
+        for subject_id, scores in subject_scores.items()
+    ]
+
     try:
-        for student_id, subject_scores in results_data.items():
-            for subject_id, scores in subject_scores.items():
-                data = {
-                    "class_assessment": scores.get("class_assessment"),
-                    "summative_test": scores.get("summative_test"),
-                    "exam": scores.get("exam")
-                }
-                save_result(
-                    student_id=student_id,
-                    subject_id=subject_id,
-                    term=term,
-                    data=data,
-                    class_id=class_id,
-                    session_id=session_id
-                )
+        save_results_bulk(class_id=class_id, session_id=session_id, term=term, cells=cells)
         db.session.commit()
         flash("Broadsheet updated successfully.", "alert-success")
     except ValueError as e:
@@ -701,6 +699,77 @@ def update_broadsheet(class_id, session_id, term):
         flash("Database error occurred.", "alert-danger")
     return redirect(url_for('teachers.broadsheet', class_id=class_id, session_id=session_id, term=term))
 
+def editable_subjects(teacher, class_id, session_id, term):
+    """Subjects a teacher may enter scores for in a class/term (all of them for the form teacher), or None if unassigned."""
+    assignment = db.session.query(class_teacher).filter_by(
+        class_id=class_id, teacher_id=teacher.id, session_id=session_id, term=term
+    ).first()
+    if not assignment:
+        return None
+    subjects = get_subjects_by_class_name(class_id)
+    if assignment.is_form_teacher:
+        return subjects
+    return [s for s in subjects if s.id in teacher_subject_ids(teacher.id)]
+
+@teacher_bp.route("/score_template/<int:class_id>/<int:session_id>/<term>", methods=["GET"])
+@login_required
+def download_score_template(class_id, session_id, term):
+    """Download an Excel template pre-filled with the class roster and saved scores for offline entry."""
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first_or_404()
+    subjects = editable_subjects(teacher, class_id, session_id, term)
+    if subjects is None:
+        flash("You are not assigned to this class for this session and term.", "alert-danger")
+        return redirect(url_for("teachers.teacher_dashboard"))
+
+    try:
+        filename, output = build_score_template(class_id, session_id, term, subjects)
+    except ValueError as e:
+        flash(str(e), "alert-info")
+        return redirect(url_for("teachers.broadsheet", class_id=class_id, session_id=session_id, term=term))
+    except OperationalError as e:
+        app.logger.error(f"Database error building score template for class {class_id}: {str(e)}")
+        flash("Database error occurred.", "alert-danger")
+        return redirect(url_for("teachers.broadsheet", class_id=class_id, session_id=session_id, term=term))
+    return send_file(
+        output,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=filename
+    )
+
+@teacher_bp.route("/upload_scores/<int:class_id>/<int:session_id>/<term>", methods=["POST"])
+@login_required
+def upload_scores(class_id, session_id, term):
+    """Apply the edited cells of a filled score template in one transaction."""
+    teacher = Teacher.query.filter_by(user_id=current_user.id).first_or_404()
+    subjects = editable_subjects(teacher, class_id, session_id, term)
+    if subjects is None:
+        flash("You are not assigned to this class for this session and term.", "alert-danger")
+        return redirect(url_for("teachers.teacher_dashboard"))
+
+    upload = request.files.get("file")
+    if not upload or not upload.filename.lower().endswith(".xlsx"):
+        flash("Upload the filled .xlsx score template.", "alert-danger")
+        return redirect(url_for("teachers.broadsheet", class_id=class_id, session_id=session_id, term=term))
+
+    try:
+        report = apply_score_sheet(
+            read_score_sheet(upload.stream), class_id, session_id, term, allowed_subject_ids=[s.id for s in subjects]
+        )
+        if report.changed:
+            record_audit(current_user.id, f"Uploaded {report.changed} scores for class {class_id} from {upload.filename}")
+        db.session.commit()
+        flash(report.summary(), "alert-danger" if report.errors else "alert-warning" if report.conflicts else "alert-success")
+    except ValueError as e:
+        db.session.rollback()
+        app.logger.error(f"Score upload for class {class_id} rejected: {str(e)}")
+        flash(str(e), "alert-danger")
+    except OperationalError as e:
+        db.session.rollback()
+        app.logger.error(f"Database error uploading scores for class {class_id}: {str(e)}")
+        flash("Database error occurred. No scores were saved.", "alert-danger")
+    return redirect(url_for("teachers.broadsheet", class_id=class_id, session_id=session_id, term=term))
+
 @teacher_bp.route("/update_broadsheet_field/<int:session_id>/<term>", methods=["POST"])
 @login_required
 @limiter.limit("20 per minute")
@@ -719,8 +788,6 @@ def update_broadsheet_field(session_id, term):
         if not assignment:
             return jsonify({"status": "error", "message": "You are not assigned to this class for this session and term."}), 403
 
-        position = data.get('position')
-        data['position'] = bleach.clean(position) if position is not None else None
         student_id = data["student_id"]
         subject_id = data.get("subject_id")
 
@@ -749,7 +816,7 @@ def update_broadsheet_field(session_id, term):
             data=data,
             class_id=class_id
         )
-        db.session.add(AuditLog(user_id=current_user.id, action=f"Updated broadsheet field for student {student_id} {'in subject ' + str(subject_id) if subject_id else 'position'}"))
+        record_audit(current_user.id, f"Updated broadsheet field for student {student_id} {'in subject ' + str(subject_id) if subject_id else 'term summary'}")
         db.session.commit()
         # app.logger.info(f"Broadsheet field updated for student {data['student_id']} in subject {data['subject_id']} by teacher {teacher.id}")
 
@@ -838,7 +905,7 @@ def update_broadsheet_class_fields(session_id, term):
         )
 
         if updated_count > 0:
-            db.session.add(AuditLog(user_id=current_user.id, action=f"Updated next_term_begins/date_issued for class {class_id}"))
+            record_audit(current_user.id, f"Updated next_term_begins/date_issued for class {class_id}")
             db.session.commit()
             return jsonify({"status": "success", "message": "Class-wide update successful."})
         else:
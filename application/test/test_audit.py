@@ -0,0 +1,94 @@
+import pytest
+import os
+from sqlalchemy import event
+from application import create_app, db
+from application.audit import AuditWriter
+from application.models import User, AuditLog, RoleEnum
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def create_user():
+    user = User(username="audited", role=RoleEnum.ADMIN.value, active=True)
+    user.set_password("AdminPass123!")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def test_audit_writer_batches_entries_into_one_insert(app):
+    """Queued entries are written together in one multi-row INSERT on flush."""
+    app.config.update(AUDIT_ASYNC=True, AUDIT_FLUSH_INTERVAL=60)
+    writer = AuditWriter(app)
+    user_id = create_user()
+
+    for i in range(5):
+        writer.record(user_id, f"Action {i}")
+    db.session.commit()
+    assert AuditLog.query.count() == 0
+
+    inserts = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO audit_log"):
+            inserts.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        writer.shutdown()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    assert len(inserts) == 1
+    assert [log.action for log in AuditLog.query.order_by(AuditLog.id)] == [f"Action {i}" for i in range(5)]
+
+def test_audit_writer_falls_back_to_session_when_queue_is_full(app):
+    """A full queue degrades to a synchronous write instead of dropping the entry."""
+    app.config.update(AUDIT_ASYNC=True, AUDIT_QUEUE_SIZE=1, AUDIT_FLUSH_INTERVAL=60)
+    writer = AuditWriter(app)
+    user_id = create_user()
+
+    writer.record(user_id, "Queued")
+    writer.record(user_id, "Overflow")
+    db.session.commit()
+    assert [log.action for log in AuditLog.query] == ["Overflow"]
+
+    writer.shutdown()
+    assert {log.action for log in AuditLog.query} == {"Queued", "Overflow"}
+
+def test_audit_entries_are_dropped_when_the_transaction_rolls_back(app):
+    """Entries only reach the writer once the request's transaction commits."""
+    app.config.update(AUDIT_ASYNC=True, AUDIT_FLUSH_INTERVAL=60)
+    writer = AuditWriter(app)
+    user_id = create_user()
+
+    writer.record(user_id, "Rolled back")
+    db.session.rollback()
+    writer.record(user_id, "Committed")
+    nested = db.session.begin_nested()
+    nested.commit()
+    assert writer._queue.empty()
+    db.session.commit()
+
+    writer.shutdown()
+    assert [log.action for log in AuditLog.query] == ["Committed"]
+
+def test_init_app_keeps_a_queue_with_entries(app):
+    app.config.update(AUDIT_ASYNC=True, AUDIT_FLUSH_INTERVAL=60)
+    writer = AuditWriter(app)
+    user_id = create_user()
+    writer.record(user_id, "Before reinit")
+    db.session.commit()
+
+    writer.init_app(app)
+    writer.shutdown()
+    assert [log.action for log in AuditLog.query] == ["Before reinit"]
@@ -0,0 +1,398 @@
+import pytest
+import logging
+import os
+from contextlib import contextmanager
+from flask import url_for, g
+from sqlalchemy import event
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, Subject, Result, StudentTermSummary, StudentClassHistory,
+    Teacher, AdminPrivilege, RoleEnum, class_subject, class_teacher
+)
+from application.helpers import (
+    prepare_broadsheet_data, get_subjects_by_class_name, save_result, rebuild_term_summaries, save_results_bulk,
+    update_class_positions, ordinal, generate_excel_broadsheet, generate_school_broadsheet
+)
+from application.catalogue import subjects_by_class
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+@contextmanager
+def count_queries():
+    """Count SQL statements issued against the engine inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def seed_class(class_name, hierarchy, student_count, subject_count=4):
+    """Create a session, class, subjects and enrolled students with results and term summaries."""
+    session = Session.query.filter_by(year="2024/2025").first()
+    if not session:
+        session = Session(year="2024/2025", is_current=True, current_term="First")
+        db.session.add(session)
+        db.session.flush()
+
+    cls = Classes(name=class_name, section="Basic", hierarchy=hierarchy)
+    db.session.add(cls)
+    db.session.flush()
+
+    subjects = []
+    for i in range(subject_count):
+        subject = Subject(name=f"{class_name} Subject {i}", section="Basic")
+        db.session.add(subject)
+        db.session.flush()
+        db.session.execute(class_subject.insert().values(class_id=cls.id, subject_id=subject.id))
+        subjects.append(subject)
+
+    for i in range(student_count):
+        student = Student(first_name=f"First{i}", last_name=f"{class_name}{i}", gender="Male")
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(StudentClassHistory(student_id=student.id, session_id=session.id, class_id=cls.id, start_term="First"))
+        for subject in subjects:
+            db.session.add(Result(
+                student_id=student.id, subject_id=subject.id, class_id=cls.id, session_id=session.id,
+                term="First", class_assessment=10, summative_test=10, exam=40 + i % 20, total=60 + i % 20
+            ))
+        db.session.add(StudentTermSummary(
+            student_id=student.id, class_id=cls.id, session_id=session.id, term="First",
+            grand_total=(60 + i % 20) * subject_count, term_average=60.0 + i % 20, subjects_offered=subject_count
+        ))
+    db.session.commit()
+    return session, cls, subjects
+
+def login(client, username, password):
+    response = client.post(url_for("auth.login"), data={"username": username, "password": password})
+    assert response.status_code == 302
+
+def test_prepare_broadsheet_data_pivots_results(app):
+    """The set-based loader produces the same per-student and per-subject structures."""
+    session, cls, subjects = seed_class("JSS 1", 1, 3)
+    students = [h.student for h in StudentClassHistory.query.filter_by(class_id=cls.id).all()]
+
+    broadsheet_data, subject_averages = prepare_broadsheet_data(
+        students, subjects, "First", session.year, cls.id, session.id
+    )
+
+    assert len(broadsheet_data) == 3
+    assert [row["average"] for row in broadsheet_data] == [62.0, 61.0, 60.0]
+    for row in broadsheet_data:
+        assert all(row["results"][subject.id] is not None for subject in subjects)
+    assert all(values["average"] == 61.0 for values in subject_averages.values())
+
+def test_prepare_broadsheet_data_query_count_is_constant(app):
+    """Loading a broadsheet costs the same number of queries regardless of class size."""
+    session, small_cls, _ = seed_class("JSS 1", 1, 2)
+    _, large_cls, _ = seed_class("JSS 2", 2, 25)
+    session_id, session_year = session.id, session.year
+
+    counts = []
+    for class_id in (small_cls.id, large_cls.id):
+        db.session.expire_all()
+        students = [h.student for h in StudentClassHistory.query.filter_by(class_id=class_id).all()]
+        subjects = get_subjects_by_class_name(class_id)
+        with count_queries() as statements:
+            prepare_broadsheet_data(students, subjects, "First", session_year, class_id, session_id)
+        counts.append(len(statements))
+
+    logger.debug(f"Broadsheet loader query counts: {counts}")
+    assert counts[0] == counts[1]
+    assert counts[1] <= 2
+
+def test_admin_broadsheet_route_query_count_is_constant(app, client):
+    """The admin broadsheet page stays O(1) in database round trips as the class grows."""
+    seed_class("JSS 1", 1, 2)
+    seed_class("JSS 2", 2, 25)
+
+    admin = User(username="broadsheetadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id, can_manage_results=True))
+    db.session.commit()
+    login(client, "broadsheetadmin", "AdminPass123!")
+    # Warm up twice: the first request also creates the session preference and refreshes the user cache
+    for _ in range(2):
+        g.pop("_login_user", None)
+        client.get(url_for("admins.broadsheet", class_name="JSS 1", action="view"))
+
+    counts = []
+    for class_name in ("JSS 1", "JSS 2"):
+        # The fixture's app context outlives requests, so drop what a fresh request would not have
+        db.session.expunge_all()
+        g.pop("_login_user", None)
+        with count_queries() as statements:
+            response = client.get(url_for("admins.broadsheet", class_name=class_name, action="view"))
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    logger.debug(f"Admin broadsheet query counts: {counts}")
+    assert counts[0] == counts[1]
+
+def test_teacher_broadsheet_route_query_count_is_constant(app, client):
+    """The teacher broadsheet page stays O(1) in database round trips as the class grows."""
+    session, small_cls, _ = seed_class("JSS 1", 1, 2)
+    _, large_cls, _ = seed_class("JSS 2", 2, 25)
+
+    user = User(username="broadsheetteacher", role=RoleEnum.TEACHER.value, active=True)
+    user.set_password("TeacherPass123!")
+    db.session.add(user)
+    db.session.flush()
+    teacher = Teacher(first_name="Form", last_name="Teacher", user_id=user.id, employee_id="form.teacher", section="Basic")
+    db.session.add(teacher)
+    db.session.flush()
+    for cls in (small_cls, large_cls):
+        db.session.execute(class_teacher.insert().values(
+            class_id=cls.id, teacher_id=teacher.id, session_id=session.id, term="First", is_form_teacher=True
+        ))
+    db.session.commit()
+    session_id, class_ids = session.id, (small_cls.id, large_cls.id)
+    login(client, "broadsheetteacher", "TeacherPass123!")
+    for _ in range(2):
+        g.pop("_login_user", None)
+        client.get(url_for("teachers.broadsheet", class_id=class_ids[0], session_id=session_id, term="First"))
+
+    counts = []
+    for class_id in class_ids:
+        # The fixture's app context outlives requests, so drop what a fresh request would not have
+        db.session.expunge_all()
+        g.pop("_login_user", None)
+        with count_queries() as statements:
+            response = client.get(url_for("teachers.broadsheet", class_id=class_id, session_id=session_id, term="First"))
+        assert response.status_code == 200
+        counts.append(len(statements))
+
+    logger.debug(f"Teacher broadsheet query counts: {counts}")
+    assert counts[0] == counts[1]
+
+def test_save_result_updates_summary_incrementally(app):
+    """Saving one score shifts the term summary by that result's change without recomputing the term."""
+    session, cls, subjects = seed_class("JSS 1", 1, 1)
+    student_id = StudentClassHistory.query.filter_by(class_id=cls.id).first().student_id
+    StudentTermSummary.query.filter_by(student_id=student_id).update({"principal_remark": "Good", "teacher_remark": "Good"})
+    db.session.commit()
+    session_id, class_id, subject_ids = session.id, cls.id, [subject.id for subject in subjects]
+
+    with count_queries() as statements:
+        save_result(student_id, subject_ids[0], "First", session_id, {"class_assessment": 10, "summative_test": 10, "exam": 50}, class_id)
+    selects = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    assert len(selects) <= 2
+
+    term_summary = StudentTermSummary.query.filter_by(student_id=student_id, class_id=class_id, term="First").one()
+    assert (term_summary.grand_total, term_summary.subjects_offered, term_summary.term_average) == (250, 4, 62.5)
+    assert term_summary.cumulative_average == 62.5
+
+    save_result(student_id, subject_ids[1], "First", session_id, {"class_assessment": None, "summative_test": None, "exam": None}, class_id)
+    assert (term_summary.grand_total, term_summary.subjects_offered, term_summary.term_average) == (190, 3, 63.3)
+
+def test_positions_are_ranked_by_bulk_saves_only(app, client):
+    """Single-cell saves leave positions alone and refuse a typed position; the bulk save re-ranks the class."""
+    session, cls, subjects = seed_class("JSS 1", 1, 2)
+    first_id, second_id = [h.student_id for h in StudentClassHistory.query.filter_by(class_id=cls.id).order_by(StudentClassHistory.student_id)]
+    rebuild_term_summaries(cls.id, session.id, "First")
+    db.session.commit()
+    ranked = {first_id: "2nd", second_id: "1st"}
+
+    save_result(first_id, subjects[0].id, "First", session.id, {"class_assessment": 20, "summative_test": 20, "exam": 60}, cls.id)
+    assert {s.student_id: s.position for s in StudentTermSummary.query.filter_by(class_id=cls.id)} == ranked
+
+    admin = User(username="rankadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    assert client.post(url_for("auth.login"), data={"username": "rankadmin", "password": "AdminPass123!"}).status_code == 302
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.update_broadsheet_field"), json={
+        "student_id": first_id, "class_id": cls.id, "position": "1st"
+    })
+    assert response.status_code == 400
+    assert {s.student_id: s.position for s in StudentTermSummary.query.filter_by(class_id=cls.id)} == ranked
+
+    save_results_bulk(cls.id, session.id, "First", [
+        {"student_id": first_id, "subject_id": subjects[0].id, "class_assessment": 20, "summative_test": 20, "exam": 60}
+    ])
+    db.session.commit()
+    assert {s.student_id: s.position for s in StudentTermSummary.query.filter_by(class_id=cls.id)} == {
+        first_id: "1st", second_id: "2nd"
+    }
+
+def test_rebuild_term_summaries_restores_aggregates(app):
+    """The explicit rebuild recomputes summaries from Result rows, creating missing ones."""
+    session, cls, _ = seed_class("JSS 1", 1, 2)
+    summaries = StudentTermSummary.query.filter_by(class_id=cls.id).order_by(StudentTermSummary.student_id).all()
+    summaries[0].grand_total, summaries[0].term_average, summaries[0].subjects_offered = 0, 0, 0
+    db.session.delete(summaries[1])
+    db.session.commit()
+
+    assert rebuild_term_summaries(cls.id, session.id, "First") == 2
+    db.session.commit()
+
+    rebuilt = StudentTermSummary.query.filter_by(class_id=cls.id).order_by(StudentTermSummary.student_id).all()
+    assert [(s.grand_total, s.subjects_offered, s.term_average) for s in rebuilt] == [(240, 4, 60.0), (244, 4, 61.0)]
+    assert all(s.principal_remark for s in rebuilt)
+
+def test_save_results_bulk_upserts_and_summarises_once(app):
+    """A bulk save updates existing cells, creates new ones and recomputes each student's summary."""
+    session, cls, subjects = seed_class("JSS 1", 1, 2, subject_count=2)
+    student_ids = [h.student_id for h in StudentClassHistory.query.filter_by(class_id=cls.id).order_by(StudentClassHistory.student_id)]
+    extra = Subject(name="JSS 1 Extra", section="Basic")
+    db.session.add(extra)
+    db.session.flush()
+    db.session.execute(class_subject.insert().values(class_id=cls.id, subject_id=extra.id))
+    db.session.commit()
+
+    cells = [
+        {"student_id": student_ids[0], "subject_id": subjects[0].id, "class_assessment": 20, "summative_test": 20, "exam": 60},
+        {"student_id": student_ids[1], "subject_id": extra.id, "class_assessment": 10, "summative_test": 10, "exam": 30},
+    ]
+    saved = save_results_bulk(cls.id, session.id, "First", cells, student_fields={student_ids[0]: {"date_issued": "2025-04-01"}})
+    db.session.commit()
+
+    assert saved == 2
+    summaries = {s.student_id: s for s in StudentTermSummary.query.filter_by(class_id=cls.id)}
+    assert (summaries[student_ids[0]].grand_total, summaries[student_ids[0]].term_average) == (160, 80.0)
+    assert summaries[student_ids[0]].date_issued == "2025-04-01"
+    assert [summaries[student_id].position for student_id in student_ids] == ["1st", "2nd"]
+    assert (summaries[student_ids[1]].grand_total, summaries[student_ids[1]].subjects_offered) == (172, 3)
+
+def test_save_results_bulk_rejects_invalid_cells(app):
+    """Out-of-range scores and students outside the class fail the whole batch."""
+    session, cls, subjects = seed_class("JSS 1", 1, 1, subject_count=1)
+    student_id = StudentClassHistory.query.filter_by(class_id=cls.id).first().student_id
+
+    with pytest.raises(ValueError):
+        save_results_bulk(cls.id, session.id, "First", [
+            {"student_id": student_id, "subject_id": subjects[0].id, "exam": 75},
+            {"student_id": student_id + 100, "subject_id": subjects[0].id, "exam": 10},
+        ])
+    assert Result.query.filter_by(student_id=student_id).one().total == 60
+
+def test_update_class_positions_ranks_with_ties(app):
+    """Positions follow RANK() ordering with shared places for ties and ordinal suffixes."""
+    session, cls, _ = seed_class("JSS 1", 1, 4)
+    summaries = StudentTermSummary.query.filter_by(class_id=cls.id).order_by(StudentTermSummary.student_id).all()
+    for summary, average in zip(summaries, [70.0, 85.0, 70.0, 55.0]):
+        summary.term_average = average
+    db.session.commit()
+
+    assert update_class_positions(cls.id, session.id, "First") == 4
+    db.session.commit()
+
+    assert [s.position for s in StudentTermSummary.query.filter_by(class_id=cls.id).order_by(StudentTermSummary.student_id)] == [
+        "2nd", "1st", "2nd", "4th"
+    ]
+    assert [ordinal(n) for n in (1, 2, 3, 4, 11, 12, 13, 21, 22, 101, 111)] == [
+        "1st", "2nd", "3rd", "4th", "11th", "12th", "13th", "21st", "22nd", "101st", "111th"
+    ]
+
+def test_generate_excel_broadsheet_streams_styled_workbook(app):
+    """The write-only writer keeps the broadsheet layout, merges and named styles."""
+    import openpyxl
+    session, cls, subjects = seed_class("JSS 1", 1, 3, subject_count=2)
+    students = [h.student for h in StudentClassHistory.query.filter_by(class_id=cls.id).all()]
+    broadsheet_data, subject_averages = prepare_broadsheet_data(
+        students, subjects, "First", session.year, cls.id, session.id
+    )
+
+    output = generate_excel_broadsheet("JSS 1", "First", session.year, broadsheet_data, subjects, subject_averages)
+    sheet = openpyxl.load_workbook(output).active
+
+    assert sheet.title == "Broadsheet_JSS 1_First"
+    assert sheet["B1"].value == "Broadsheet for JSS 1 - Term: First, Session: 2024/2025"
+    assert {str(r) for r in sheet.merged_cells.ranges} == {"B1:N1", "B2:E2", "F2:I2", "J2:M2"}
+    assert [sheet.cell(row=4, column=c).value for c in (1, 2, 5, 14)] == [subjects[0].name, 10, 62, 61]
+    assert [row[0].value for row in sheet.iter_rows(min_row=7)] == ["Grand Total", "Average", "Cumulative Average", "Position"]
+    assert sheet.cell(row=8, column=5).value == 62
+    assert sheet["A4"].style == "broadsheet_label"
+    assert sheet["B4"].style == "broadsheet_cell"
+    assert sheet["A4"].border.left.style == "thin"
+    assert sheet.column_dimensions["A"].width == 30
+
+def test_download_broadsheet_streams_xlsx(app, client):
+    """The admin download returns the spooled workbook as an attachment."""
+    import io
+    import openpyxl
+    seed_class("JSS 1", 1, 3)
+    admin = User(username="downloadadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id, can_manage_results=True))
+    db.session.commit()
+    login(client, "downloadadmin", "AdminPass123!")
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.download_broadsheet", class_name="JSS 1", action="generate_broadsheet"))
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment;")
+    assert response.mimetype == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    assert openpyxl.load_workbook(io.BytesIO(response.data)).active["A3"].value == "Subjects"
+    response.close()
+
+def test_school_broadsheet_has_summary_and_sheet_per_class(app):
+    """The school export loads every class in a fixed number of queries and orders sheets by hierarchy."""
+    import io
+    import openpyxl
+    session, _, _ = seed_class("SS 1", 5, 2)
+    seed_class("JSS 1", 1, 3)
+    seed_class("Nursery 1", 0, 0)  # No students, so no sheet
+    session_id = session.id
+    db.session.expire_all()
+    subjects_by_class()  # Warm the subject catalogue, which later exports read from memory
+
+    progress = []
+    with count_queries() as statements:
+        filename, _, data = generate_school_broadsheet(session_id, "First", lambda done, total: progress.append(done))
+
+    assert len(statements) == 5
+    assert not any("class_subject" in statement for statement in statements)
+    assert filename == "School_Broadsheet_First_2024-2025.xlsx"
+    assert progress == [0, 1, 2]
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    assert workbook.sheetnames == ["Summary", "JSS 1", "SS 1"]
+    summary = [[cell.value for cell in row] for row in workbook["Summary"].iter_rows(min_row=2)]
+    assert summary == [["JSS 1", 3, 3, 61.0, 62.0, 60.0], ["SS 1", 2, 2, 60.5, 61.0, 60.0]]
+    assert workbook["JSS 1"]["B1"].value == "Broadsheet for JSS 1 - Term: First, Session: 2024/2025"
+
+def test_sheet_titles_are_sanitised_and_unique(app):
+    """Class names with characters Excel forbids, long names and names differing only in case get valid titles."""
+    import io
+    import openpyxl
+    from application.helpers import BroadsheetWriter
+    writer = BroadsheetWriter()
+    for title in ["Summary", "JSS 1/A", "JSS 1?A", "jss 1-a", "Primary [Science]: Gold*", "A" * 40, "A" * 35, "//"]:
+        writer.add_table(title, ["Class"], [])
+    workbook = openpyxl.load_workbook(io.BytesIO(writer.save().read()))
+    assert workbook.sheetnames == [
+        "Summary", "JSS 1-A", "JSS 1-A (2)", "jss 1-a (3)", "Primary -Science-- Gold-", "A" * 31, "A" * 27 + " (2)", "--"
+    ]
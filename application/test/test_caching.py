@@ -0,0 +1,135 @@
+import pytest
+import os
+from contextlib import contextmanager
+from flask_login import login_user
+from sqlalchemy import event
+from application import create_app, db
+from application.models import User, Session, UserSessionPreference, RoleEnum, TermEnum
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@contextmanager
+def count_queries():
+    """Count SQL statements issued against the engine inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def create_admin(username="cacheadmin"):
+    user = User(username=username, role=RoleEnum.ADMIN.value, active=True)
+    user.set_password("AdminPass123!")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def test_current_session_and_term_is_resolved_once_per_request(app):
+    """Repeated lookups in one request reuse the resolved session and term until invalidated."""
+    session = Session(year="2024/2025", is_current=True, current_term="Second")
+    db.session.add(session)
+    user = create_admin()
+
+    with app.test_request_context():
+        login_user(user)
+        first = Session.get_current_session_and_term(include_term=True)
+        with count_queries() as statements:
+            for _ in range(5):
+                assert Session.get_current_session_and_term(include_term=True) == first
+        assert statements == []
+        assert first[1] == TermEnum.SECOND
+
+        preference = UserSessionPreference.query.filter_by(user_id=user.id).one()
+        preference.current_term = TermEnum.THIRD.value
+        db.session.commit()
+        Session.invalidate_current_session_cache()
+        assert Session.get_current_session_and_term(include_term=True)[1] == TermEnum.THIRD
+
+def test_current_session_is_cached_across_requests(app):
+    """The is_current session row is served from the process cache until it expires or is cleared."""
+    db.session.add(Session(year="2024/2025", is_current=True, current_term="First"))
+    db.session.commit()
+
+    assert Session.get_current_session().year == "2024/2025"
+    db.session.expunge_all()
+    with count_queries() as statements:
+        cached = Session.get_current_session()
+    assert statements == []
+    assert cached.year == "2024/2025" and cached in db.session
+
+    Session.query.update({"year": "2025/2026"})
+    db.session.commit()
+    Session.invalidate_current_session_cache(include_process_cache=True)
+    db.session.expunge_all()
+    assert Session.get_current_session().year == "2025/2026"
+
+def test_load_user_uses_cached_identity_until_invalidated(app):
+    """The user loader serves privileges from cache after one version check and reloads after invalidation."""
+    from application import load_user
+    from application.models import AdminPrivilege
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    db.session.add(session)
+    user = create_admin()
+    db.session.add(AdminPrivilege(user_id=user.id, can_manage_users=True))
+    db.session.add(UserSessionPreference(user_id=user.id, session_id=session.id, current_term="First"))
+    db.session.commit()
+    user_id = user.id
+
+    assert load_user(str(user_id)).privileges.can_manage_users
+    db.session.expunge_all()
+    with count_queries() as statements:
+        cached = load_user(str(user_id))
+        assert cached.privileges.can_manage_users
+    assert len(statements) == 1 and "cache_version" in statements[0]
+    # The preference isn't cached, so a change to it is seen at once
+    UserSessionPreference.query.filter_by(user_id=user_id).update({"current_term": "Second"})
+    db.session.commit()
+    assert cached.session_preference.current_term == "Second"
+
+    AdminPrivilege.query.filter_by(user_id=user_id).update({"can_manage_users": False})
+    User.invalidate_cache(user_id)
+    db.session.commit()
+    db.session.expunge_all()
+    assert not load_user(str(user_id)).privileges.can_manage_users
+
+def test_invalidation_reaches_other_processes(app):
+    """Another worker's invalidation (a cache_version bump) is seen without clearing this process's cache."""
+    from application import load_user
+    user = create_admin()
+    user_id = user.id
+    assert load_user(str(user_id)).active
+
+    # As done by another worker: the row changes and its version moves, this process's dict is untouched
+    User.query.filter_by(id=user_id).update({"active": False, "cache_version": User.cache_version + 1})
+    db.session.commit()
+    db.session.expunge_all()
+    assert load_user(str(user_id)) is None
+
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+    assert User.load_cached(user_id) is None and user_id not in app.extensions["user_cache"]
+
+def test_user_cache_is_bounded(app):
+    app.config["USER_CACHE_SIZE"] = 2
+    user_ids = [create_admin(f"cacheadmin{i}").id for i in range(3)]
+    for user_id in user_ids:
+        User.load_cached(user_id)
+    User.load_cached(user_ids[1])
+    assert list(app.extensions["user_cache"]) == [user_ids[2], user_ids[1]]
@@ -0,0 +1,115 @@
+import pytest
+import logging
+import os
+from flask import url_for, g
+from application import create_app, db
+from application.models import (
+    User, Classes, Subject, Teacher, CatalogueVersion, AdminPrivilege, RoleEnum, class_subject
+)
+from application.catalogue import class_subjects, teacher_subjects, teacher_subject_ids, bump_subject_catalogue
+from application.helpers import get_subjects_by_class_name
+from application.test.test_report_cards import count_queries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_catalogue():
+    """JSS 1 offering Mathematics, English and a deactivated Music; a teacher of English; returns the ids."""
+    jss1 = Classes(name="JSS 1", section="Secondary", hierarchy=1)
+    maths = Subject(name="Mathematics", section="Secondary")
+    english = Subject(name="English", section="Secondary")
+    music = Subject(name="Music", section="Secondary", deactivated=True)
+    user = User(username="teacher1", role=RoleEnum.TEACHER.value, active=True)
+    user.set_password("TeacherPass123!")
+    db.session.add_all([jss1, maths, english, music, user])
+    db.session.flush()
+    teacher = Teacher(first_name="Ada", last_name="Obi", user_id=user.id, employee_id="T001", section="Secondary")
+    db.session.add(teacher)
+    jss1.subjects.extend([maths, english, music])
+    teacher.subjects.append(english)
+    db.session.commit()
+    return jss1.id, teacher.id, {subject.name: subject.id for subject in (maths, english, music)}
+
+def login_admin(client):
+    admin = User(username="catalogueadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id, can_manage_subjects=True))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "catalogueadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+def test_catalogue_reads_from_memory_once_loaded(app):
+    class_id, teacher_id, subject_ids = seed_catalogue()
+    assert [subject.name for subject in get_subjects_by_class_name(class_id)] == ["English", "Mathematics"]
+
+    with count_queries() as statements:
+        subjects = get_subjects_by_class_name(class_id, include_deactivated=True)
+        assigned = teacher_subject_ids(teacher_id)
+        names = [subject.name for subject in teacher_subjects(teacher_id)]
+    assert statements == []
+    assert [subject.name for subject in subjects] == ["English", "Mathematics", "Music"]
+    assert assigned == {subject_ids["English"]} and names == ["English"]
+    # Cached subjects are merged into the request's session like any loaded row
+    assert subjects[0] is db.session.get(Subject, subject_ids["English"])
+
+def test_bump_reloads_this_process_at_once(app):
+    class_id, teacher_id, subject_ids = seed_catalogue()
+    assert len(class_subjects(class_id)) == 2
+    db.session.execute(class_subject.delete().where(class_subject.c.subject_id == subject_ids["English"]))
+    bump_subject_catalogue()
+    db.session.commit()
+    assert [subject.name for subject in class_subjects(class_id)] == ["Mathematics"]
+    assert CatalogueVersion.query.get(CatalogueVersion.SUBJECTS).version == 1
+
+def test_other_processes_reload_on_their_next_version_check(app):
+    app.config["SUBJECT_CATALOGUE_CHECK_INTERVAL"] = 3600
+    class_id, _, subject_ids = seed_catalogue()
+    assert len(class_subjects(class_id)) == 2
+
+    # Another worker's change: the rows and version move without touching this process's cache
+    db.session.execute(class_subject.delete().where(class_subject.c.subject_id == subject_ids["Mathematics"]))
+    db.session.add(CatalogueVersion(name=CatalogueVersion.SUBJECTS, version=7))
+    db.session.commit()
+    assert len(class_subjects(class_id)) == 2
+
+    app.extensions["subject_catalogue"]["check_after"] = 0
+    assert [subject.name for subject in class_subjects(class_id)] == ["English"]
+
+def test_admin_changes_invalidate_catalogue(app, client):
+    class_id, teacher_id, subject_ids = seed_catalogue()
+    login_admin(client)
+    assert len(class_subjects(class_id)) == 2
+
+    g.pop("_login_user", None)
+    client.post(url_for("admins.remove_subject_from_class"), data={"class_id": class_id, "subject_id": subject_ids["Mathematics"]})
+    assert [subject.name for subject in class_subjects(class_id)] == ["English"]
+
+    g.pop("_login_user", None)
+    client.post(url_for("admins.assign_subject_to_teacher"), data={"teacher": teacher_id, "subject": subject_ids["Mathematics"]})
+    assert teacher_subject_ids(teacher_id) == {subject_ids["English"], subject_ids["Mathematics"]}
+
+    g.pop("_login_user", None)
+    client.post(url_for("admins.delete_subject", subject_id=subject_ids["English"]))
+    assert class_subjects(class_id) == []
+    assert teacher_subject_ids(teacher_id) == {subject_ids["Mathematics"]}
@@ -29,4 +29,40 @@ def test_app_config(app):
     assert app.config["SQLALCHEMY_DATABASE_URI"] == "sqlite:///:memory:"
     assert app.config["WTF_CSRF_ENABLED"] is False
     assert app.config["SECRET_KEY"] == "test-secret-key"
-    logger.debug("App configuration test passed")
\ No newline at end of file
+    logger.debug("App configuration test passed")
+
+def test_logging_writes_compact_json_through_queue(app, tmp_path):
+    """File logs are single-line JSON carrying request details, written by the queue listener."""
+    import json
+    from application import setup_logging, stop_log_listener
+    app.config.update(LOG_DIR=str(tmp_path), LOG_SAMPLING={"application.sampled": 0.0})
+    setup_logging(app)
+
+    with app.test_request_context("/admin/students"):
+        app.logger.info("Queued message %s", 42)
+        logging.getLogger("application.sampled").info("Dropped by sampling")
+    stop_log_listener()
+
+    lines = (tmp_path / "flask_app.log").read_text().splitlines()
+    records = [json.loads(line) for line in lines]
+    queued = next(r for r in records if r["message"] == "Queued message 42")
+    assert queued["url"] == "http://localhost/admin/students"
+    assert not any(r["message"] == "Dropped by sampling" for r in records)
+
+def test_log_listener_starts_lazily_in_each_process(app, tmp_path):
+    """The listener thread is started by a process's first record, so a forked worker starts its own."""
+    import application
+    from application import setup_logging, stop_log_listener
+    app.config.update(LOG_DIR=str(tmp_path))
+    setup_logging(app)
+    listener = application._log_listener
+    assert listener.running()  # Started by setup_logging's own "setup complete" record
+
+    # As seen from a forked worker: the parent's thread didn't come along
+    stop_log_listener()
+    listener._pid = -1
+    assert not listener.running()
+    app.logger.warning("Record from the child")
+    assert listener.running()
+    stop_log_listener()
+    assert "Record from the child" in (tmp_path / "flask_app.log").read_text()
@@ -0,0 +1,244 @@
+import pytest
+import importlib.util
+import logging
+import os
+from flask import url_for, g
+from sqlalchemy import text
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, StudentClassHistory, FeePayment, EnrollmentSnapshot, EnrollmentCounter,
+    AdminPrivilege, RoleEnum
+)
+from application.enrollment import (
+    snapshot_rows, refresh_enrollment_snapshot, rebuild_enrollment_snapshot, enrollment_stats,
+    count_enrollments, reconcile_enrollment_counters
+)
+from application.test.test_report_cards import count_queries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__), "..", "..", "migrations", "versions", "5c7e9d1a3b64_add_enrollment_snapshot_table.py"
+)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_school():
+    """Two classes in the current session: three JSS 1 students (one left mid-session) and one in JSS 2."""
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    next_session = Session(year="2025/2026", is_current=False, current_term="First")
+    jss1 = Classes(name="JSS 1", section="Secondary", hierarchy=1)
+    jss2 = Classes(name="JSS 2", section="Secondary", hierarchy=2)
+    students = [Student(first_name=f"First{i}", last_name=f"Last{i}", gender="Female", approved=i % 2 == 0) for i in range(4)]
+    db.session.add_all([session, next_session, jss1, jss2, *students])
+    db.session.flush()
+    for student in students[:3]:
+        db.session.add(StudentClassHistory(student_id=student.id, session_id=session.id, class_id=jss1.id, start_term="First"))
+    db.session.add(StudentClassHistory(
+        student_id=students[3].id, session_id=session.id, class_id=jss2.id, start_term="First", end_term="Second"
+    ))
+    db.session.add(FeePayment(student_id=students[0].id, session_id=session.id, term="First", has_paid_fee=True))
+    db.session.add(FeePayment(student_id=students[1].id, session_id=session.id, term="First", has_paid_fee=False))
+    db.session.commit()
+    rebuild_enrollment_snapshot()
+    return session.id, [jss1.id, jss2.id], [student.id for student in students]
+
+def login_admin(client):
+    admin = User(username="snapadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "snapadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+def snapshot_for(student_id):
+    return {(row.session_id, row.term, row.class_id) for row in EnrollmentSnapshot.query.filter_by(student_id=student_id)}
+
+def test_rows_cover_terms_of_latest_active_enrollment(app):
+    session_id, (jss1_id, jss2_id), student_ids = seed_school()
+    rows = {(row["student_id"], row["term"]): row for row in snapshot_rows()}
+
+    assert len(rows) == 3 * 3 + 2
+    assert (student_ids[3], "Third") not in rows
+    assert rows[(student_ids[0], "First")]["fee_paid"] is True
+    assert rows[(student_ids[1], "First")]["fee_paid"] is False
+    assert rows[(student_ids[1], "First")]["approved"] is False
+    assert rows[(student_ids[3], "Second")]["hierarchy"] == 2
+
+def test_migration_backfill_matches_snapshot_rows(app):
+    """The migration's SQL backfill derives the same rows as the application code."""
+    seed_school()
+    spec = importlib.util.spec_from_file_location("snapshot_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    expected = sorted((row["session_id"], row["term"], row["student_id"], row["class_id"], row["hierarchy"],
+                       row["approved"], row["fee_paid"]) for row in snapshot_rows())
+    db.session.execute(text("DELETE FROM enrollment_snapshot"))
+    db.session.execute(text(migration.BACKFILL))
+    backfilled = sorted(
+        (r.session_id, r.term, r.student_id, r.class_id, r.hierarchy, bool(r.approved), bool(r.fee_paid))
+        for r in db.session.execute(text("SELECT * FROM enrollment_snapshot"))
+    )
+    assert backfilled == expected
+
+def test_refresh_rolls_back_with_the_transaction(app):
+    session_id, (jss1_id, _), student_ids = seed_school()
+    history = StudentClassHistory.query.filter_by(student_id=student_ids[0]).first()
+    history.mark_as_left("First")
+    refresh_enrollment_snapshot([student_ids[0]])
+    assert snapshot_for(student_ids[0]) == set()
+
+    db.session.rollback()
+    assert snapshot_for(student_ids[0]) == {(session_id, term, jss1_id) for term in ("First", "Second", "Third")}
+
+def test_stats_read_counters_in_one_query(app):
+    session_id, (jss1_id, _), _ = seed_school()
+    with count_queries() as statements:
+        stats = enrollment_stats(session_id, "First")
+    assert stats == {"total_students": 4, "approved_students": 2, "fees_paid": 1, "fees_unpaid": 3}
+    assert len(statements) == 1 and "enrollment_counter" in statements[0]
+    assert enrollment_stats(session_id, "Third", jss1_id)["total_students"] == 3
+
+    from application.test.test_indexes import indexes_used
+    query = EnrollmentSnapshot.query.filter_by(session_id=session_id, term="First", class_id=jss1_id)
+    assert "idx_enrollment_snapshot_class" in indexes_used(query)
+
+def test_routes_keep_snapshot_in_step(app, client):
+    """Promotion, fee and approval toggles rewrite the snapshot that the stats endpoints read."""
+    session_id, (jss1_id, jss2_id), student_ids = seed_school()
+    login_admin(client)
+    next_session_id = Session.query.filter_by(year="2025/2026").first().id
+
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.promote_student", class_name="JSS 1", student_id=student_ids[0], action="promote"),
+                           data={"session_choice": "next"})
+    assert response.status_code == 302
+    assert snapshot_for(student_ids[0]) == {(next_session_id, term, jss2_id) for term in ("First", "Second", "Third")}
+
+    g.pop("_login_user", None)
+    assert client.post(url_for("admins.toggle_fee_status", student_id=student_ids[1])).get_json()["has_paid_fee"] is True
+    g.pop("_login_user", None)
+    assert client.post(url_for("admins.toggle_approval_status", student_id=student_ids[1])).get_json()["approved"] is True
+
+    g.pop("_login_user", None)
+    stats = client.get(url_for("admins.get_student_stats_by_class", class_name="JSS 1")).get_json()
+    assert stats == {"total_students": 2, "approved_students": 2, "fees_paid": 1, "fees_unpaid": 1}
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.students", action="view", ajax=1))
+    assert response.status_code == 200
+    assert b"Last1" in response.data and b"Last0" not in response.data
+
+def test_counters_follow_routes_incrementally(app, client):
+    """Counter deltas applied by the routes agree with a full recount, so reconciling corrects nothing."""
+    session_id, (jss1_id, _), student_ids = seed_school()
+    login_admin(client)
+    for endpoint, student_id in [("admins.toggle_fee_status", student_ids[2]), ("admins.toggle_approval_status", student_ids[0]),
+                                 ("admins.toggle_fee_status", student_ids[0])]:
+        g.pop("_login_user", None)
+        assert client.post(url_for(endpoint, student_id=student_id)).get_json()["success"] is True
+    g.pop("_login_user", None)
+    client.post(url_for("admins.delete_student_class_record", class_name="JSS 1", student_id=student_ids[1], action="promote"))
+    g.pop("_login_user", None)
+    client.post(url_for("admins.delete_student", student_id=student_ids[3], action="view"))
+
+    assert enrollment_stats(session_id, "First") == {
+        "total_students": 2, "approved_students": 1, "fees_paid": 1, "fees_unpaid": 1
+    }
+    stored = {(c.session_id, c.term, c.class_id): (c.total, c.approved, c.fees_paid) for c in EnrollmentCounter.query}
+    recounted = count_enrollments()
+    assert {key: value for key, value in stored.items() if value != (0, 0, 0)} == recounted
+    assert reconcile_enrollment_counters() == 0
+
+def test_reconcile_corrects_drift(app):
+    session_id, (jss1_id, _), _ = seed_school()
+    counter = EnrollmentCounter.query.filter_by(session_id=session_id, term="First", class_id=jss1_id).one()
+    counter.total = 99
+    EnrollmentCounter.query.filter_by(session_id=session_id, term="Second").delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["enrollment-snapshot", "reconcile"])
+    assert result.exit_code == 0, result.output
+    assert "Corrected 3 enrollment counters" in result.output
+    assert enrollment_stats(session_id, "First", jss1_id)["total_students"] == 3
+    assert enrollment_stats(session_id, "Second")["total_students"] == 4
+
+def test_stats_do_not_reconcile(app):
+    """Reading stats never writes; drift stays until the reconcile command runs."""
+    session_id, _, _ = seed_school()
+    EnrollmentCounter.query.filter_by(session_id=session_id, term="Third").update({"total": 0})
+    db.session.commit()
+    with count_queries() as statements:
+        assert enrollment_stats(session_id, "Third")["total_students"] == 0
+    assert len(statements) == 1 and statements[0].lstrip().upper().startswith("SELECT")
+
+    assert app.test_cli_runner().invoke(args=["enrollment-snapshot", "reconcile"]).exit_code == 0
+    assert enrollment_stats(session_id, "Third")["total_students"] == 3
+
+def test_stats_endpoint_supports_etags(app, client):
+    session_id, _, student_ids = seed_school()
+    login_admin(client)
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.get_stats"))
+    etag = response.headers["ETag"]
+    assert response.get_json()["total_students"] == 4
+    # The blueprint's no-store default would stop browsers from revalidating
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert "Pragma" not in response.headers
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.get_stats"), headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    g.pop("_login_user", None)
+    client.post(url_for("admins.toggle_fee_status", student_id=student_ids[2]))
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.get_stats"), headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()["fees_paid"] == 2
+
+def test_delete_student_decrements_counters_with_foreign_keys_enforced(app, client):
+    """ON DELETE CASCADE must not remove the snapshot rows before the counters are taken down from them."""
+    session_id, (jss1_id, _), student_ids = seed_school()
+    user = User(username="first0.last0", role=RoleEnum.STUDENT.value, active=True, password_hash="x")
+    db.session.add(user)
+    db.session.flush()
+    db.session.get(Student, student_ids[0]).user_id = user.id
+    db.session.commit()
+    login_admin(client)
+    db.session.execute(text("PRAGMA foreign_keys=ON"))
+    try:
+        for student_id in (student_ids[0], student_ids[3]):
+            g.pop("_login_user", None)
+            client.post(url_for("admins.delete_student", student_id=student_id, action="view"))
+        assert db.session.execute(text("PRAGMA foreign_keys")).scalar() == 1
+        assert Student.query.count() == 2 and db.session.get(User, user.id) is None
+        assert enrollment_stats(session_id, "First", jss1_id) == {
+            "total_students": 2, "approved_students": 1, "fees_paid": 0, "fees_unpaid": 2
+        }
+        assert reconcile_enrollment_counters() == 0
+    finally:
+        db.session.execute(text("PRAGMA foreign_keys=OFF"))
@@ -0,0 +1,84 @@
+import pytest
+import logging
+import os
+import random
+from application import create_app, db
+from application.models import Result, StudentClassHistory
+from application.grading import (
+    GradeScale, PRINCIPAL_REMARKS, TEACHER_REMARKS, grade_scale, grade_totals, term_remarks, init_grade_scale
+)
+from application.helpers import calculate_grade, generate_remark, generate_principal_remark, get_threshold, save_results_bulk
+from application.test.test_broadsheet import seed_class
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+class Pupil:
+    first_name = "Ada"
+    last_name = "Obi"
+
+def test_default_scale_boundaries(app):
+    assert [calculate_grade(total) for total in (None, -1, 0, 29.9, 30, 49, 50, 60, 64.9, 65, 70, 80, 94.9, 95, 100)] == [
+        "", "F", "F", "F", "E", "D", "C", "C+", "C+", "B", "B+", "A", "A", "A+", "A+"
+    ]
+    assert generate_remark(55) == "Credit" and generate_remark(None) == ""
+    assert grade_totals([95, None, 30]) == [("A+", "Outstanding"), ("", ""), ("E", "Very Poor")]
+
+def test_configured_boundaries_replace_defaults(app):
+    app.config["GRADE_BOUNDARIES"] = '[[0, "F9", "Fail"], [75, "A1", "Excellent"], [50, "C5", "Credit"]]'
+    assert grade_totals([80, 74, 50, 49]) == [("A1", "Excellent"), ("C5", "Credit"), ("C5", "Credit"), ("F9", "Fail")]
+    assert grade_scale() is grade_scale()
+
+    app.config["GRADE_BOUNDARIES"] = [[40, "P", "Pass"], [0, "F", "Fail"]]
+    assert calculate_grade(45) == "P"
+    with pytest.raises(ValueError):
+        GradeScale([[40, "P", "Pass"], [40, "Q", "Pass"]])
+
+def test_malformed_boundaries_are_rejected_at_startup(app):
+    for malformed in ['[[70, "A"', '{"A": 70}', '[[70, "A"]]', '[["seventy", "A", "Good"]]', '[]']:
+        app.config["GRADE_BOUNDARIES"] = malformed
+        with pytest.raises(ValueError, match="Invalid GRADE_BOUNDARIES"):
+            init_grade_scale(app)
+
+    app.config["GRADE_BOUNDARIES"] = '[[0, "F9", "Fail"], [75, "A1", "Excellent"]]'
+    init_grade_scale(app)
+    assert app.extensions["grade_scale"][1] is grade_scale()
+
+def test_remarks_fill_templates_per_student(app):
+    remark = generate_principal_remark(96, Pupil())
+    assert "{" not in remark and "Ada" in remark
+    assert "Student" in PRINCIPAL_REMARKS.remark(96)
+    assert get_threshold(64.9) == 60 and get_threshold(None) is None
+    assert PRINCIPAL_REMARKS.remark(None) == TEACHER_REMARKS.remark(-1) == ""
+
+    pairs = [(97, Pupil()), (12, None)]
+    remarks = term_remarks(pairs, rng=random.Random(1))
+    expected_principal = PRINCIPAL_REMARKS.remark_many(pairs, random.Random(1))
+    assert len(remarks) == 2 and remarks[0][0] == expected_principal[0]
+    assert all(principal and teacher for principal, teacher in remarks)
+
+def test_bulk_save_grades_with_configured_scale(app):
+    app.config["GRADE_BOUNDARIES"] = [[0, "F9", "Fail"], [75, "A1", "Excellent"]]
+    session, cls, subjects = seed_class("JSS 1", 1, 1, subject_count=2)
+    student_id = StudentClassHistory.query.filter_by(class_id=cls.id).first().student_id
+    save_results_bulk(cls.id, session.id, "First", [
+        {"student_id": student_id, "subject_id": subjects[0].id, "class_assessment": 20, "summative_test": 20, "exam": 40},
+        {"student_id": student_id, "subject_id": subjects[1].id, "class_assessment": 5, "summative_test": 5, "exam": 5},
+    ])
+    db.session.commit()
+    grades = {result.subject_id: (result.grade, result.remark) for result in Result.query.filter_by(student_id=student_id)}
+    assert grades == {subjects[0].id: ("A1", "Excellent"), subjects[1].id: ("F9", "Fail")}
@@ -0,0 +1,99 @@
+import pytest
+import logging
+import os
+from sqlalchemy import text
+from application import create_app, db
+from application.models import Result, StudentTermSummary, StudentClassHistory, FeePayment
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def indexes_used(query):
+    """Return the EXPLAIN output naming the indexes the database picks for a query.
+
+    SQLite reports them in EXPLAIN QUERY PLAN details; MySQL in the ``key`` column of EXPLAIN.
+    """
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).mappings().all()
+        return " | ".join(row["detail"] for row in rows)
+    rows = db.session.execute(text(f"EXPLAIN {sql}")).mappings().all()
+    return " | ".join(str(row["key"]) for row in rows)
+
+HOT_QUERIES = {
+    # download_results_pdf / view_results
+    "idx_result_student_session_term": lambda: Result.query.filter_by(student_id=1, term="First", session_id=1),
+    # rebuild_term_summaries and the school broadsheet export
+    "idx_result_class_term": lambda: Result.query.filter_by(class_id=1, session_id=1, term="First"),
+    # save_result locks the student's summaries for the session
+    "idx_term_summary_student_session": lambda: StudentTermSummary.query.filter_by(student_id=1, session_id=1),
+    # update_class_positions and the broadsheet ranking
+    "idx_term_summary_class_term": lambda: StudentTermSummary.query.filter(
+        StudentTermSummary.class_id == 1, StudentTermSummary.session_id == 1, StudentTermSummary.term == "First"
+    ).order_by(StudentTermSummary.term_average.desc()),
+    # class rosters for broadsheets, report cards and students_by_class
+    "idx_class_history_session_class": lambda: StudentClassHistory.query.filter(
+        StudentClassHistory.session_id == 1,
+        StudentClassHistory.class_id == 1,
+        StudentClassHistory.is_active == True,
+        StudentClassHistory.leave_date.is_(None)
+    ),
+    # fees-paid counts in get_stats and get_student_stats_by_class
+    "idx_fee_payment_session_term_paid": lambda: FeePayment.query.filter_by(session_id=1, term="First", has_paid_fee=True),
+}
+
+@pytest.mark.parametrize("index_name", sorted(HOT_QUERIES))
+def test_hot_query_uses_composite_index(app, index_name):
+    plan = indexes_used(HOT_QUERIES[index_name]())
+    logger.debug(f"{index_name}: {plan}")
+    assert index_name in plan
+
+def test_enrollment_in_term_predicate_is_sargable(app):
+    """The term range filter runs against the stored ordinals through an index, with no CASE in the WHERE clause."""
+    query = StudentClassHistory.query.filter(
+        StudentClassHistory.session_id == 1,
+        StudentClassHistory.class_id == 1,
+        StudentClassHistory.is_active == True,
+        StudentClassHistory.leave_date.is_(None),
+        StudentClassHistory.enrolled_in_term(2)
+    )
+    sql = str(query.statement.compile(dialect=db.engine.dialect))
+    where_clause = sql.split("WHERE", 1)[1]
+    assert "CASE" not in where_clause
+    plan = indexes_used(query)
+    assert "idx_class_history_session_class" in plan
+    assert "start_term_ord<?" in plan.replace(" ", "")
+
+def test_term_ordinals_are_generated_from_terms(app):
+    from application.models import Student, Session
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    student = Student(first_name="Ada", last_name="Obi", gender="Female")
+    db.session.add_all([session, student])
+    db.session.flush()
+    open_ended = StudentClassHistory(student_id=student.id, session_id=session.id, start_term="Second")
+    closed = StudentClassHistory(student_id=student.id, session_id=session.id, start_term="First", end_term="Second")
+    db.session.add_all([open_ended, closed])
+    db.session.commit()
+
+    assert (open_ended.start_term_ord, open_ended.end_term_ord) == (2, 4)
+    assert (closed.start_term_ord, closed.end_term_ord) == (1, 2)
+    enrolled = {h.id for h in StudentClassHistory.query.filter(StudentClassHistory.enrolled_in_term(3))}
+    assert enrolled == {open_ended.id}
+
+    closed.end_term = "Third"
+    db.session.commit()
+    assert closed.end_term_ord == 3
@@ -0,0 +1,121 @@
+import pytest
+import logging
+import os
+import re
+from flask import url_for, g
+from application import create_app, db
+from application.models import User, Student, Session, Classes, StudentClassHistory, AdminPrivilege, RoleEnum
+from application.enrollment import rebuild_enrollment_snapshot
+from application.helpers import (
+    get_students_query, keyset_paginate, student_sort_columns, student_sort_key,
+    decode_page_cursor
+)
+from application.test.test_report_cards import count_queries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_students(per_class=12):
+    """Two classes with per_class students each, including duplicate first names; returns the session."""
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    classes = [Classes(name="JSS 2", section="Secondary", hierarchy=2), Classes(name="JSS 1", section="Secondary", hierarchy=1)]
+    db.session.add_all([session, *classes])
+    db.session.flush()
+    for cls in classes:
+        for i in range(per_class):
+            student = Student(first_name=f"Name{i % 5}", last_name=f"{cls.name}-{i:02d}", gender="Male")
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentClassHistory(student_id=student.id, session_id=session.id, class_id=cls.id, start_term="First"))
+    db.session.commit()
+    rebuild_enrollment_snapshot()
+    return session
+
+def students_page(session, cursor=None, per_page=10):
+    query = get_students_query(session, "First")
+    return keyset_paginate(query, student_sort_columns(), student_sort_key, cursor=cursor, per_page=per_page)
+
+def test_keyset_pages_walk_forward_and_back(app):
+    session = seed_students()
+    expected = [row[0].id for row in get_students_query(session, "First").order_by(*student_sort_columns()).all()]
+
+    pages, cursor = [], None
+    while True:
+        page = students_page(session, cursor)
+        pages.append(page)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+
+    assert [page.page for page in pages] == [1, 2, 3]
+    assert [row[0].id for page in pages for row in page.items] == expected
+    assert [row[2] for row in pages[0].items][:1] == [1]
+    assert not pages[0].has_prev
+
+    back = students_page(session, pages[2].prev_cursor)
+    assert back.page == 2
+    assert [row[0].id for row in back.items] == [row[0].id for row in pages[1].items]
+    first = students_page(session, back.prev_cursor)
+    assert first.page == 1 and not first.has_prev
+    assert [row[0].id for row in first.items] == [row[0].id for row in pages[0].items]
+
+def test_page_query_has_no_count(app):
+    session = seed_students()
+    cursor = students_page(session).next_cursor
+    with count_queries() as statements:
+        students_page(session, cursor)
+    # SQLite always renders LIMIT with an OFFSET placeholder, so only the absence of a COUNT is checked here
+    assert not any("COUNT(" in statement.upper() for statement in statements)
+    # The page itself plus one selectin query per collection
+    assert len(statements) == 3
+
+def test_malformed_cursor_starts_over(app):
+    assert decode_page_cursor("not-a-cursor", 4) == (None, "next", 1)
+    session = seed_students()
+    assert students_page(session, "bm90IGpzb24").page == 1
+
+def test_students_view_pages_by_cursor_with_counter_total(app, client):
+    seed_students()
+    admin = User(username="pageadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "pageadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+    seen, url = [], url_for("admins.students", action="view", ajax=1)
+    for page_number in (1, 2, 3):
+        g.pop("_login_user", None)
+        response = client.get(url)
+        html = response.get_data(as_text=True)
+        assert f"{page_number} of ~3" in html
+        seen.extend(name.lower() for name in re.findall(r"(?i)jss \d-\d\d", html))
+        cursors = re.findall(r"cursor=([A-Za-z0-9_-]+)", html)
+        if page_number < 3:
+            url = url_for("admins.students", action="view", ajax=1, cursor=cursors[-1])
+    assert len(set(seen)) == 24
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.students_by_class", class_name="JSS 1", action="view_students"))
+    assert "1 of ~3" in response.get_data(as_text=True)
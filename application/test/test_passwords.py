@@ -0,0 +1,95 @@
+import pytest
+import logging
+import os
+import threading
+from flask import url_for, g
+from application import create_app, db, bcrypt
+from application.models import User, RoleEnum
+from application.passwords import password_verifier, hash_cost, VerifierBusy
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration and a cheap bcrypt cost."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    app.config.update(BCRYPT_LOG_ROUNDS=4, LOGIN_HASH_WORKERS=1, LOGIN_HASH_MAX_PENDING=1)
+    bcrypt.init_app(app)
+    password_verifier.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def add_admin(password_hash):
+    user = User(username="storm", role=RoleEnum.ADMIN.value, active=True, password_hash=password_hash)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def occupy_verifier():
+    """Fill the verifier's only slot until the returned event is set."""
+    release, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+    password_verifier._submit(hold)
+    started.wait(5)
+    return release
+
+def test_verify_checks_and_upgrades_cost(app):
+    old_hash = bcrypt.generate_password_hash("Secret123!", rounds=5).decode("utf-8")
+    user = add_admin(old_hash)
+
+    assert not password_verifier.verify(user, "wrong")
+    assert user.password_hash == old_hash
+    assert password_verifier.verify(user, "Secret123!")
+    assert hash_cost(user.password_hash) == 4 and user.check_password("Secret123!")
+
+    current_hash = user.password_hash
+    assert password_verifier.verify(user, "Secret123!")
+    assert user.password_hash == current_hash
+    assert hash_cost("not-a-hash") is None
+
+def test_saturated_verifier_refuses_at_once(app):
+    user = add_admin(bcrypt.generate_password_hash("Secret123!").decode("utf-8"))
+    release = occupy_verifier()
+    try:
+        with pytest.raises(VerifierBusy) as busy:
+            password_verifier.verify(user, "Secret123!")
+        assert busy.value.retry_after == app.config["LOGIN_RETRY_AFTER"]
+        assert password_verifier.pending() == 1
+    finally:
+        release.set()
+    password_verifier.executor.submit(lambda: None).result(5)
+    assert password_verifier.verify(user, "Secret123!")
+    assert password_verifier.pending() == 0
+
+def test_login_returns_503_when_saturated_and_rehashes_on_success(app, client):
+    add_admin(bcrypt.generate_password_hash("Secret123!", rounds=5).decode("utf-8"))
+    release = occupy_verifier()
+    try:
+        response = client.post(url_for("auth.login"), data={"username": "storm", "password": "Secret123!"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(app.config["LOGIN_RETRY_AFTER"])
+    finally:
+        release.set()
+    password_verifier.executor.submit(lambda: None).result(5)
+
+    g.pop("_login_user", None)
+    response = client.post(url_for("auth.login"), data={"username": "storm", "password": "Secret123!"})
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert hash_cost(User.query.filter_by(username="storm").one().password_hash) == 4
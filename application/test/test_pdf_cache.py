@@ -0,0 +1,134 @@
+import pytest
+import logging
+import os
+from flask import url_for, g
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, Subject, Result, StudentTermSummary, StudentClassHistory,
+    AdminPrivilege, RoleEnum, class_subject
+)
+from application.helpers import save_result, save_class_wide_fields
+from application.pdf_cache import pdf_cache
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a test Flask app with testing configuration and a PDF cache under tmp_path."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    app.config.update(PDF_CACHE_ENABLED=True, PDF_CACHE_DIR=str(tmp_path / "pdf"))
+    pdf_cache.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_student():
+    """Create one enrolled student with a result and term summary; returns plain ids."""
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    cls = Classes(name="JSS 2", section="Secondary", hierarchy=2)
+    subject = Subject(name="Mathematics", section="Secondary")
+    student = Student(first_name="Ada", last_name="Obi", gender="Female")
+    db.session.add_all([session, cls, subject, student])
+    db.session.flush()
+    db.session.execute(class_subject.insert().values(class_id=cls.id, subject_id=subject.id))
+    db.session.add(StudentClassHistory(student_id=student.id, session_id=session.id, class_id=cls.id, start_term="First"))
+    db.session.add(Result(
+        student_id=student.id, subject_id=subject.id, class_id=cls.id, session_id=session.id, term="First",
+        class_assessment=15, summative_test=15, exam=40, total=70, grade="A", remark="Excellent"
+    ))
+    db.session.add(StudentTermSummary(
+        student_id=student.id, class_id=cls.id, session_id=session.id, term="First",
+        grand_total=70, term_average=70.0, subjects_offered=1, principal_remark="Good", teacher_remark="Good"
+    ))
+    db.session.commit()
+    return session.id, cls.id, subject.id, student.id
+
+def card_key(session_id, class_id, student_id):
+    session_obj = db.session.get(Session, session_id)
+    student = db.session.get(Student, student_id)
+    results = Result.query.filter_by(student_id=student_id, session_id=session_id, term="First").all()
+    summary = StudentTermSummary.query.filter_by(student_id=student_id, session_id=session_id, term="First").first()
+    return pdf_cache.key(student, results, summary, "First", session_obj, class_id, "JSS 2")
+
+def cached_files(app):
+    return sorted(os.listdir(app.config["PDF_CACHE_DIR"])) if os.path.isdir(app.config["PDF_CACHE_DIR"]) else []
+
+def test_key_follows_result_content(app):
+    """The key is stable for unchanged rows and changes when a score changes."""
+    session_id, class_id, _, student_id = seed_student()
+    key = card_key(session_id, class_id, student_id)
+    assert card_key(session_id, class_id, student_id) == key
+
+    Result.query.filter_by(student_id=student_id).update({"exam": 41, "total": 71})
+    db.session.commit()
+    assert card_key(session_id, class_id, student_id) != key
+
+def test_least_recently_used_entries_are_evicted(app):
+    pdf_cache.max_bytes = 25
+    for name in ("1_First_1_1_a", "1_First_1_2_b"):
+        pdf_cache.put(name, b"x" * 10)
+        os.utime(pdf_cache._path(name), (1, 1))
+    assert pdf_cache.get("1_First_1_1_a") is not None  # Touch a so that b is the oldest
+
+    pdf_cache.put("1_First_1_3_c", b"x" * 10)
+
+    assert cached_files(app) == ["1_First_1_1_a.pdf", "1_First_1_3_c.pdf"]
+
+def test_saves_invalidate_cached_cards(app):
+    """save_result drops the student's cards and save_class_wide_fields drops the class's."""
+    session_id, class_id, subject_id, student_id = seed_student()
+    pdf_cache.put(card_key(session_id, class_id, student_id), b"%PDF")
+    pdf_cache.put(f"{session_id}_First_{class_id}_999_other", b"%PDF")
+    pdf_cache.put(f"{session_id}_Second_{class_id}_{student_id}_other", b"%PDF")
+
+    save_result(student_id, subject_id, "First", session_id,
+                {"class_assessment": 10, "summative_test": 10, "exam": 30}, class_id)
+    assert cached_files(app) == [
+        f"{session_id}_First_{class_id}_999_other.pdf",
+        f"{session_id}_Second_{class_id}_{student_id}_other.pdf",
+    ]
+
+    save_class_wide_fields(class_id, session_id, "First", {"next_term_begins": "5th January"})
+    assert cached_files(app) == [f"{session_id}_Second_{class_id}_{student_id}_other.pdf"]
+
+def test_repeat_download_is_served_from_cache(app, client, monkeypatch):
+    """The second download of an unchanged report card skips WeasyPrint."""
+    import application.student.routes as student_routes
+    session_id, _, _, student_id = seed_student()
+    admin = User(username="pdfadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "pdfadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+    renders = []
+
+    class CountingHTML:
+        def __init__(self, string=None, **kwargs):
+            renders.append(string)
+
+        def write_pdf(self):
+            return b"%PDF-1.4 rendered"
+
+    monkeypatch.setattr(student_routes, "HTML", CountingHTML)
+    for _ in range(2):
+        g.pop("_login_user", None)
+        response = client.get(url_for("students.download_results_pdf", student_id=student_id, term="First", session_id=session_id))
+        assert response.status_code == 200
+        assert response.data == b"%PDF-1.4 rendered"
+    assert len(renders) == 1
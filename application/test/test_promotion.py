@@ -0,0 +1,138 @@
+import pytest
+import logging
+import os
+import re
+from flask import url_for, g
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, StudentClassHistory, EnrollmentSnapshot, AuditLog, AdminPrivilege, RoleEnum
+)
+from application.enrollment import rebuild_enrollment_snapshot
+from application.promotion import plan_promotion, apply_promotion, PROMOTE, REPEAT, COMPLETED
+from application.test.test_report_cards import count_queries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_school(per_class=3):
+    """JSS 1-3 with per_class students each in 2024/2025, and an empty 2025/2026; returns ids."""
+    current = Session(year="2024/2025", is_current=True, current_term="Third")
+    upcoming = Session(year="2025/2026", is_current=False, current_term="First")
+    classes = [Classes(name=f"JSS {level}", section="Secondary", hierarchy=level) for level in (3, 1, 2)]
+    db.session.add_all([current, upcoming, *classes])
+    db.session.flush()
+    students = {}
+    for cls in sorted(classes, key=lambda c: c.hierarchy):
+        for i in range(per_class):
+            student = Student(first_name=f"Pupil{i}", last_name=cls.name.replace(" ", ""), gender="Female")
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentClassHistory(student_id=student.id, session_id=current.id, class_id=cls.id, start_term="First"))
+            students.setdefault(cls.name, []).append(student.id)
+    db.session.commit()
+    rebuild_enrollment_snapshot()
+    return current, upcoming, {cls.name: cls.id for cls in classes}, students
+
+def active_class(student_id, session_id):
+    history = StudentClassHistory.query.filter_by(student_id=student_id, session_id=session_id, is_active=True).one_or_none()
+    return history.class_id if history else None
+
+def test_plan_orders_school_by_hierarchy_and_marks_outcomes(app):
+    current, upcoming, class_ids, students = seed_school()
+    plan = plan_promotion(current, upcoming, "Third", repeater_ids=[students["JSS 2"][0]])
+
+    assert [move.from_class.name for move in plan.moves] == ["JSS 1"] * 3 + ["JSS 2"] * 3 + ["JSS 3"] * 3
+    outcomes = {move.student_id: (move.outcome, move.to_class.name if move.to_class else None) for move in plan.moves}
+    assert outcomes[students["JSS 1"][0]] == (PROMOTE, "JSS 2")
+    assert outcomes[students["JSS 2"][0]] == (REPEAT, "JSS 2")
+    assert outcomes[students["JSS 3"][0]] == (COMPLETED, None)
+    assert plan.summary() == "5 promoted, 1 repeating, 3 in the top class (2024/2025 -> 2025/2026)"
+
+def test_apply_into_next_session_in_bulk(app):
+    current, upcoming, class_ids, students = seed_school(per_class=20)
+    repeater = students["JSS 1"][1]
+    plan = plan_promotion(current, upcoming, "Third", repeater_ids=[repeater])
+    with count_queries() as statements:
+        moved = apply_promotion(plan)
+    db.session.commit()
+
+    assert moved == 40
+    # Close, look up existing target rows, insert: nothing per student (the rest is the snapshot refresh)
+    history_writes = [statement for statement in statements if statement.startswith(("UPDATE student_class_history", "INSERT INTO student_class_history"))]
+    assert len(history_writes) == 2
+    assert active_class(students["JSS 1"][0], upcoming.id) == class_ids["JSS 2"]
+    assert active_class(repeater, upcoming.id) == class_ids["JSS 1"]
+    assert active_class(students["JSS 3"][0], upcoming.id) is None
+    assert active_class(students["JSS 3"][0], current.id) == class_ids["JSS 3"]
+    closed = StudentClassHistory.query.filter_by(student_id=students["JSS 2"][0], session_id=current.id).one()
+    assert (closed.is_active, closed.end_term) == (False, "Third") and closed.leave_date is not None
+    assert EnrollmentSnapshot.query.filter_by(session_id=upcoming.id, term="First").count() == 40
+
+def test_apply_within_current_session_reuses_enrollments(app):
+    current, _, class_ids, students = seed_school()
+    plan = plan_promotion(current, current, "Third", class_ids=[class_ids["JSS 1"]])
+    assert apply_promotion(plan) == 3
+    db.session.commit()
+    assert {active_class(student_id, current.id) for student_id in students["JSS 1"]} == {class_ids["JSS 2"]}
+    assert StudentClassHistory.query.count() == 9
+    # A confirm carrying the applied plan's fingerprint no longer matches, so JSS 1 can't be pushed on to JSS 3
+    again = plan_promotion(current, current, "Third", class_ids=[class_ids["JSS 1"]])
+    assert again.moves == [] and again.fingerprint() != plan.fingerprint()
+
+def test_route_previews_then_applies_with_one_audit_entry(app, client):
+    current, upcoming, class_ids, students = seed_school()
+    admin = User(username="promoadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id, can_manage_classes=True))
+    db.session.commit()
+    assert client.post(url_for("auth.login"), data={"username": "promoadmin", "password": "AdminPass123!"}).status_code == 302
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.promote_classes"))
+    assert b"6 promoted, 0 repeating, 3 in the top class" in response.data
+
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.promote_classes"), data={"class_name": "JSS 1", "confirm": "0"})
+    assert b"3 promoted, 0 repeating" in response.data
+    assert active_class(students["JSS 1"][0], upcoming.id) is None
+    fingerprint = re.search(r'name="plan_fingerprint" value="([0-9a-f]+)"', response.get_data(as_text=True)).group(1)
+
+    confirm = {
+        "class_name": "JSS 1", "session_choice": "next", "repeaters": [str(students["JSS 1"][2])], "confirm": "1",
+        "plan_fingerprint": fingerprint
+    }
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.promote_classes"), data=confirm)
+    assert response.status_code == 302
+    assert [active_class(student_id, upcoming.id) for student_id in students["JSS 1"]] == [
+        class_ids["JSS 2"], class_ids["JSS 2"], class_ids["JSS 1"]
+    ]
+    entries = [entry.action for entry in AuditLog.query.all() if "Bulk promotion" in entry.action]
+    assert entries == ["Bulk promotion of JSS 1: 2 promoted, 1 repeating, 0 in the top class (2024/2025 -> 2025/2026)"]
+
+    # Replaying the confirm is refused instead of promoting the class again
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.promote_classes"), data=confirm)
+    assert response.status_code == 200 and b"changed since the preview" in response.data
+    assert AuditLog.query.filter(AuditLog.action.like("Bulk promotion%")).count() == 1
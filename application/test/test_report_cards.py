@@ -0,0 +1,194 @@
+import pytest
+import io
+import logging
+import os
+import zipfile
+from contextlib import contextmanager
+from flask import url_for, g
+from sqlalchemy import event
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, Subject, Result, StudentTermSummary, StudentClassHistory,
+    AdminPrivilege, RoleEnum, class_subject
+)
+from application.report_cards import load_class_report_cards, generate_class_report_cards
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    app.config.update(EXPORT_DIR=str(tmp_path), REPORT_CARD_WORKERS=2)
+    app.extensions["job_runner"].init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+@contextmanager
+def count_queries():
+    """Count SQL statements issued against the engine inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def seed_class(student_count, students_without_results=0):
+    """Create a class with enrolled students, results and term summaries; returns plain ids."""
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    cls = Classes(name="JSS 1", section="Secondary", hierarchy=1)
+    db.session.add_all([session, cls])
+    db.session.flush()
+    subjects = [Subject(name=f"Subject {i}", section="Secondary") for i in range(3)]
+    db.session.add_all(subjects)
+    db.session.flush()
+    for subject in subjects:
+        db.session.execute(class_subject.insert().values(class_id=cls.id, subject_id=subject.id))
+
+    for i in range(student_count + students_without_results):
+        student = Student(first_name=f"First{i}", last_name=f"Last{i:02d}", gender="Female")
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(StudentClassHistory(student_id=student.id, session_id=session.id, class_id=cls.id, start_term="First"))
+        if i >= student_count:
+            continue
+        for subject in subjects:
+            db.session.add(Result(
+                student_id=student.id, subject_id=subject.id, class_id=cls.id, session_id=session.id,
+                term="First", class_assessment=15, summative_test=15, exam=40, total=70, grade="A", remark="Excellent"
+            ))
+        db.session.add(StudentTermSummary(
+            student_id=student.id, class_id=cls.id, session_id=session.id, term="First",
+            grand_total=210, term_average=70.0, subjects_offered=3, position="1st",
+            principal_remark="Good", teacher_remark="Good"
+        ))
+    db.session.commit()
+    return session.id, cls.id
+
+def test_load_class_report_cards_uses_three_queries(app):
+    """The roster, results (with subjects) and summaries load in a fixed number of queries."""
+    session_id, class_id = seed_class(5, students_without_results=2)
+    db.session.expire_all()
+    class_record = Classes.query.get(class_id)
+    session_obj = Session.query.get(session_id)
+
+    with count_queries() as statements:
+        cards = load_class_report_cards(class_record, session_obj, "First")
+        subject_names = [result.subject.name for _, results, _ in cards for result in results]
+
+    assert len(statements) == 3
+    assert len(cards) == 5
+    assert [student.last_name for student, _, _ in cards] == [f"Last{i:02d}" for i in range(5)]
+    assert len(subject_names) == 15
+    assert all(summary.term_average == 70.0 for _, _, summary in cards)
+
+def test_generate_class_report_cards_zip(app):
+    """A ZIP holds one PDF per student and progress reaches the total."""
+    session_id, class_id = seed_class(4)
+    progress = []
+
+    filename, mimetype, data = generate_class_report_cards(
+        class_id, session_id, "First", "zip", lambda done, total: progress.append((done, total))
+    )
+
+    assert filename == "Report_Cards_JSS_1_First_2024-2025.zip"
+    assert mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = archive.namelist()
+        assert len(names) == 4
+        assert all(archive.read(name).startswith(b"%PDF") for name in names)
+    assert progress[0] == (0, 4)
+    assert progress[-1] == (4, 4)
+
+def test_namesakes_get_separate_cards(app):
+    """Two students with the same name each keep their own PDF in the archive."""
+    session_id, class_id = seed_class(2)
+    first, second = Student.query.order_by(Student.id).all()
+    second.first_name, second.last_name = first.first_name, first.last_name
+    first.reg_no = "AAIS/0559/001"
+    db.session.commit()
+
+    _, _, data = generate_class_report_cards(class_id, session_id, "First")
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert sorted(archive.namelist()) == [
+            f"First0_Last00_{second.id}_First_2024-2025_Result.pdf",
+            "First0_Last00_AAIS-0559-001_First_2024-2025_Result.pdf",
+        ]
+
+def test_expired_exports_are_pruned(app, tmp_path):
+    runner = app.extensions["job_runner"]
+    old, fresh = tmp_path / "old.bin", tmp_path / "fresh.bin"
+    old.write_bytes(b"x")
+    fresh.write_bytes(b"x")
+    expired = os.path.getmtime(old) - app.config["EXPORT_RETENTION"] - 1
+    os.utime(old, (expired, expired))
+
+    assert runner.prune() == 1
+    assert not old.exists() and fresh.exists()
+
+def test_generate_class_report_cards_rejects_empty_class(app):
+    session_id, class_id = seed_class(0, students_without_results=2)
+    with pytest.raises(ValueError):
+        generate_class_report_cards(class_id, session_id, "First")
+
+def test_report_cards_cli_writes_zip(app, tmp_path):
+    """The CLI defaults to the current session and term and writes the artifact to --output."""
+    seed_class(2)
+    output = tmp_path / "cards.zip"
+    result = app.test_cli_runner().invoke(args=["report-cards", "generate", "JSS 1", "--output", str(output)])
+    assert result.exit_code == 0, result.output
+    assert "2/2 report cards rendered" in result.output
+    with zipfile.ZipFile(output) as archive:
+        assert len(archive.namelist()) == 2
+
+def test_admin_report_card_job(app, client):
+    """Admins start a report card job, poll its progress and download the artifact."""
+    seed_class(3)
+    admin = User(username="reportadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id, can_manage_results=True))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "reportadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+    g.pop("_login_user", None)
+    response = client.post(url_for("admins.generate_report_cards", class_name="JSS 1", action="generate_broadsheet"),
+                           data={"format": "zip"})
+    assert response.status_code == 302
+    job_id = response.headers["Location"].rstrip("/").split("/")[-1]
+
+    g.pop("_login_user", None)
+    status = client.get(url_for("admins.job_status", job_id=job_id, format="json")).get_json()
+    assert status["status"] == "finished"
+    assert status["done"] == status["total"] == 3
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.download_job", job_id=job_id))
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert len(archive.namelist()) == 3
+    response.close()
+
+    g.pop("_login_user", None)
+    assert client.get(url_for("admins.job_status", job_id="not-a-job")).status_code == 404
@@ -0,0 +1,167 @@
+import pytest
+import logging
+import os
+from io import BytesIO
+import openpyxl
+from flask import url_for, g
+from application import create_app, db
+from application.models import User, Result, Subject, AdminPrivilege, RoleEnum, class_subject
+from application.score_sheets import (
+    build_score_template, read_score_sheet, apply_score_sheet, HEADER_ROWS, FIRST_SCORE_COLUMN, SCORE_FIELDS
+)
+from application.test.test_broadsheet import seed_class
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+def seed_scores():
+    """JSS 1 with three students and two subjects with saved scores, plus a third subject with none yet."""
+    session, cls, subjects = seed_class("JSS 1", 1, 3, subject_count=2)
+    extra = Subject(name="JSS 1 Subject 2", section="Basic")
+    db.session.add(extra)
+    db.session.flush()
+    db.session.execute(class_subject.insert().values(class_id=cls.id, subject_id=extra.id))
+    db.session.commit()
+    return session, cls, subjects + [extra]
+
+def fill(output, edits):
+    """Apply {(row_index, subject_index, field): value} to a template's score cells; returns the saved file."""
+    workbook = openpyxl.load_workbook(output)
+    sheet = workbook["Scores"]
+    for (row_index, subject_index, field), value in edits.items():
+        column = FIRST_SCORE_COLUMN + subject_index * len(SCORE_FIELDS) + SCORE_FIELDS.index(field)
+        sheet.cell(row=HEADER_ROWS + 1 + row_index, column=column).value = value
+    filled = BytesIO()
+    workbook.save(filled)
+    filled.seek(0)
+    return filled
+
+def roster_ids(output):
+    workbook = openpyxl.load_workbook(output)
+    ids = [row[0] for row in workbook["Scores"].iter_rows(min_row=HEADER_ROWS + 1, values_only=True)]
+    output.seek(0)
+    return ids
+
+def result(student_id, subject_id):
+    return Result.query.filter_by(student_id=student_id, subject_id=subject_id, term="First").one_or_none()
+
+def test_template_is_prefilled_and_protected(app):
+    session, cls, subjects = seed_scores()
+    filename, output = build_score_template(cls.id, session.id, "First")
+    assert filename == "Scores_JSS_1_First_2024-2025.xlsx"
+
+    workbook = openpyxl.load_workbook(output)
+    sheet = workbook["Scores"]
+    assert sheet.protection.sheet and sheet.column_dimensions["A"].hidden
+    assert workbook["Template"].sheet_state == workbook["Baseline"].sheet_state == "veryHidden"
+    first_row = [cell.value for cell in sheet[HEADER_ROWS + 1]]
+    assert first_row[3:9] == [10, 10, 40, 10, 10, 40]
+    assert first_row[9:12] == [None, None, None]
+    assert not sheet.cell(row=HEADER_ROWS + 1, column=FIRST_SCORE_COLUMN).protection.locked
+    assert sheet.cell(row=HEADER_ROWS + 1, column=2).protection.locked
+
+def test_upload_writes_only_edited_cells(app):
+    session, cls, subjects = seed_scores()
+    _, output = build_score_template(cls.id, session.id, "First")
+    student_ids = roster_ids(output)
+    filled = fill(output, {(0, 0, "exam"): 55, (1, 2, "class_assessment"): 15, (1, 2, "exam"): 50.0})
+
+    report = apply_score_sheet(read_score_sheet(filled), cls.id, session.id, "First")
+    db.session.commit()
+
+    assert report.changed == 3 and not report.conflicts and not report.errors
+    edited = result(student_ids[0], subjects[0].id)
+    assert (edited.class_assessment, edited.summative_test, edited.exam, edited.total) == (10, 10, 55, 75)
+    created = result(student_ids[1], subjects[2].id)
+    assert (created.class_assessment, created.summative_test, created.exam, created.total) == (15, None, 50, 65)
+    assert result(student_ids[2], subjects[2].id) is None
+
+def test_concurrent_edit_is_kept_and_reported(app):
+    session, cls, subjects = seed_scores()
+    _, output = build_score_template(cls.id, session.id, "First")
+    student_ids = roster_ids(output)
+    result(student_ids[0], subjects[0].id).exam = 33
+    db.session.commit()
+
+    filled = fill(output, {(0, 0, "exam"): 45, (0, 1, "exam"): 47})
+    report = apply_score_sheet(read_score_sheet(filled), cls.id, session.id, "First")
+    db.session.commit()
+
+    assert report.changed == 1
+    assert report.conflicts == [(student_ids[0], subjects[0].id, "exam", 45, 33)]
+    assert result(student_ids[0], subjects[0].id).exam == 33
+    assert result(student_ids[0], subjects[1].id).exam == 47
+
+def test_bad_cells_save_nothing(app):
+    session, cls, subjects = seed_scores()
+    _, output = build_score_template(cls.id, session.id, "First")
+    filled = fill(output, {(0, 0, "exam"): 61, (1, 0, "class_assessment"): "ten", (2, 0, "exam"): 50})
+
+    report = apply_score_sheet(read_score_sheet(filled), cls.id, session.id, "First")
+    assert report.changed == 0
+    assert report.errors == ["F4: Exam must be between 0 and 60", "D5: 'ten' is not a whole number"]
+    assert "No scores were saved" in report.summary()
+    assert {r.exam for r in Result.query.filter_by(subject_id=subjects[0].id)} == {40, 41, 42}
+
+def test_tampered_or_foreign_template_is_rejected(app):
+    session, cls, subjects = seed_scores()
+    _, output = build_score_template(cls.id, session.id, "First")
+    workbook = openpyxl.load_workbook(output)
+    workbook["Baseline"]["B1"] = 0
+    tampered = BytesIO()
+    workbook.save(tampered)
+    tampered.seek(0)
+    with pytest.raises(ValueError, match="hidden data was changed"):
+        read_score_sheet(tampered)
+
+    output.seek(0)
+    sheet = read_score_sheet(output)
+    with pytest.raises(ValueError, match="different class"):
+        apply_score_sheet(sheet, cls.id, session.id, "Second")
+    with pytest.raises(ValueError, match="no longer edit"):
+        apply_score_sheet(sheet, cls.id, session.id, "First", allowed_subject_ids=[subjects[0].id])
+
+def test_admin_round_trip_through_routes(app, client):
+    session, cls, subjects = seed_scores()
+    admin = User(username="scoreadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "scoreadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.download_score_template", class_name="JSS 1", action="view"))
+    assert response.status_code == 200
+    output = BytesIO(response.data)
+    student_ids = roster_ids(output)
+
+    g.pop("_login_user", None)
+    response = client.post(
+        url_for("admins.upload_scores", class_name="JSS 1", action="view"),
+        data={"file": (fill(output, {(2, 1, "summative_test"): 18}), "scores.xlsx")},
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 302
+    assert result(student_ids[2], subjects[1].id).summative_test == 18
@@ -0,0 +1,181 @@
+import pytest
+import importlib.util
+import logging
+import os
+from flask import url_for, g
+from application import create_app, db
+from application.models import User, Student, Session, Classes, StudentClassHistory, StudentSearchToken, AdminPrivilege, RoleEnum
+from application.enrollment import rebuild_enrollment_snapshot
+from application.search import (
+    normalize_terms, student_tokens, search_student_ids, matching_class_ids, rebuild_search_index, index_students,
+    remove_students_from_index, _prefix_filter
+)
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+MIGRATION = os.path.join(
+    os.path.dirname(__file__), "..", "..", "migrations", "versions", "2b8e6f1c4d57_add_student_search_token_table.py"
+)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+NAMES = [
+    ("Chinedu", "Okafor", "AAIS/0559/012"),
+    ("Chioma", "Okonkwo", "AAIS/0559/013"),
+    ("Amaka", "Okafor", "AAIS/0559/120"),
+    ("Tunde", "Bello", "AAIS/0559/121"),
+]
+
+def seed_students():
+    """Two JSS 1 and two JSS 2 students in the current session, indexed; returns {first name: id}."""
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    classes = [Classes(name="JSS 1", section="Secondary", hierarchy=1), Classes(name="JSS 2", section="Secondary", hierarchy=2)]
+    students = [Student(first_name=first, last_name=last, reg_no=reg_no, gender="Male") for first, last, reg_no in NAMES]
+    db.session.add_all([session, *classes, *students])
+    db.session.flush()
+    for i, student in enumerate(students):
+        db.session.add(StudentClassHistory(
+            student_id=student.id, session_id=session.id, class_id=classes[i // 2].id, start_term="First"
+        ))
+    db.session.commit()
+    rebuild_enrollment_snapshot()
+    rebuild_search_index()
+    return {student.first_name: student.id for student in students}
+
+def login_admin(client):
+    admin = User(username="searchadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    response = client.post(url_for("auth.login"), data={"username": "searchadmin", "password": "AdminPass123!"})
+    assert response.status_code == 302
+
+def test_tokens_cover_names_and_reg_no_parts(app):
+    assert normalize_terms("  Adéọlá O'Brien ") == ["adeola", "o", "brien"]
+    student = Student(first_name="Amaka", last_name="Eze", reg_no="AAIS/0559/012")
+    tokens = student_tokens(student)
+    words = {token for kind, token in tokens if kind == StudentSearchToken.WORD}
+    assert words == {"amaka", "eze", "aais", "0559", "012", "12", "559", "aais0559012"}
+    assert (StudentSearchToken.DELETION, "amka") in tokens
+    assert not any(kind == StudentSearchToken.DELETION and token.startswith("ez") for kind, token in tokens)
+
+def test_prefix_exact_and_typo_matches_are_ranked(app):
+    ids = seed_students()
+    assert search_student_ids("okafor") == {ids["Chinedu"]: 3, ids["Amaka"]: 3}
+    assert list(search_student_ids("chi")) == [ids["Chinedu"], ids["Chioma"]]
+    # A dropped letter still finds "okafor", but not "okonkwo"
+    assert search_student_ids("okafr") == {ids["Chinedu"]: 1, ids["Amaka"]: 1}
+    assert search_student_ids("okafor amaka") == {ids["Amaka"]: 6}
+    assert search_student_ids("chinedu okafor") == {ids["Chinedu"]: 6}
+
+def test_reg_no_suffix_and_candidate_restriction(app):
+    ids = seed_students()
+    assert search_student_ids("12") == {ids["Chinedu"]: 3, ids["Tunde"]: 2, ids["Amaka"]: 2}
+    assert search_student_ids("0559/012") == {ids["Chinedu"]: 6}
+    assert search_student_ids("AAIS/0559/120") == {ids["Amaka"]: 9}
+    assert search_student_ids("okafor", [ids["Amaka"], ids["Tunde"]]) == {ids["Amaka"]: 3}
+    assert search_student_ids("   ") == {}
+    assert matching_class_ids("jss1") == matching_class_ids("JSS 1") != []
+
+def test_prefix_lookup_uses_primary_key_range(app):
+    from application.test.test_indexes import indexes_used
+    seed_students()
+    plan = indexes_used(StudentSearchToken.query.filter(*_prefix_filter("oka")))
+    assert "token>? AND token<?" in plan
+
+def test_index_follows_student_edits(app):
+    ids = seed_students()
+    student = db.session.get(Student, ids["Tunde"])
+    student.last_name = "Adeyemi"
+    index_students([student])
+    db.session.commit()
+    assert search_student_ids("bello") == {}
+    assert search_student_ids("adey") == {ids["Tunde"]: 2}
+    remove_students_from_index([ids["Tunde"]])
+    db.session.commit()
+    assert search_student_ids("adeyemi") == {}
+
+def test_search_endpoints_rank_index_matches(app, client):
+    seed_students()
+    login_admin(client)
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.search_students", action="view", query="okafr"))
+    assert response.status_code == 200
+    html = response.get_data(as_text=True).lower()
+    assert "chinedu" in html and "amaka" in html and "tunde" not in html
+
+    g.pop("_login_user", None)
+    html = client.get(url_for("admins.search_students", action="view", query="jss 2")).get_data(as_text=True).lower()
+    assert "amaka" in html and "tunde" in html and "chinedu" not in html
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.search_students_by_class", class_name="JSS 1", action="view_students", query="chinedu okafor"))
+    html = response.get_data(as_text=True).lower()
+    assert "chinedu" in html and "chioma" not in html
+
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.search_students_by_class", class_name="JSS 2", action="view_students", query="okafor"))
+    html = response.get_data(as_text=True).lower()
+    assert "amaka" in html and "chinedu" not in html
+
+def test_truncated_search_is_flagged(app, client):
+    """Results cut at SEARCH_MAX_RESULTS say so, and both search endpoints tell the user."""
+    seed_students()
+    app.config["SEARCH_MAX_RESULTS"] = 1
+    ranked = search_student_ids("okafor")
+    assert len(ranked) == 1 and ranked.truncated
+    assert not search_student_ids("okafor amaka").truncated
+    login_admin(client)
+
+    notice = "Only the best 1 matches are shown"
+    g.pop("_login_user", None)
+    assert notice in client.get(url_for("admins.search_students", action="view", query="okafor")).get_data(as_text=True)
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.search_students_by_class", class_name="JSS 1", action="view_students", query="chi"))
+    assert notice in response.get_data(as_text=True)
+    g.pop("_login_user", None)
+    response = client.get(url_for("admins.search_students_by_class", class_name="JSS 1", action="view_students", query="chinedu"))
+    assert notice not in response.get_data(as_text=True)
+
+def test_rebuild_command(app):
+    seed_students()
+    StudentSearchToken.query.delete()
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=["search-index", "rebuild"])
+    assert result.exit_code == 0, result.output
+    assert "Indexed 4 students" in result.output
+    assert len(search_student_ids("okafor")) == 2
+
+def test_migration_backfill_matches_index(app):
+    """The migration indexes existing students exactly as rebuild_search_index does."""
+    seed_students()
+    spec = importlib.util.spec_from_file_location("search_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    expected = sorted((t.kind, t.token, t.student_id) for t in StudentSearchToken.query)
+    StudentSearchToken.query.delete()
+    assert migration.backfill(db.session.connection()) == 4
+    assert sorted((t.kind, t.token, t.student_id) for t in StudentSearchToken.query) == expected
+    assert migration.TOKEN_MAX_LENGTH == StudentSearchToken.MAX_LENGTH
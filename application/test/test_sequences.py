@@ -0,0 +1,86 @@
+import pytest
+import logging
+import os
+from sqlalchemy.exc import IntegrityError
+from application import create_app, db
+from application.models import User, Student, Teacher, IdSequence, RoleEnum
+from application.helpers import generate_employee_id
+from application.sequences import reserve, allocate_reg_nos, allocate_employee_id
+from application.test.test_report_cards import count_queries
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app():
+    """Create a test Flask app with testing configuration."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def add_teacher(employee_id):
+    user = User(username=employee_id, role=RoleEnum.TEACHER.value)
+    user.set_password(employee_id)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Teacher(user_id=user.id, first_name="John", last_name="Doe", section="Secondary", employee_id=employee_id))
+    db.session.commit()
+
+def test_reserve_hands_out_consecutive_blocks(app):
+    assert list(reserve("demo", 3)) == [1, 2, 3]
+    assert list(reserve("demo")) == [4]
+    assert list(reserve("other", 2, seed=lambda: 10)) == [10, 11]
+    db.session.commit()
+
+    with count_queries() as statements:
+        assert list(reserve("demo", 500)) == list(range(5, 505))
+    # A block costs one UPDATE and one read back, however large
+    assert len(statements) == 2
+    assert db.session.get(IdSequence, "demo").next_value == 505
+
+def test_rolled_back_reservation_is_returned(app):
+    reserve("demo", 2)
+    db.session.commit()
+    assert list(reserve("demo", 5)) == [3, 4, 5, 6, 7]
+    db.session.rollback()
+    assert list(reserve("demo")) == [3]
+
+def test_reg_nos_continue_above_existing_students(app):
+    db.session.add_all([
+        Student(first_name="Old", last_name="One", gender="male", reg_no="AAIS/0559/007"),
+        Student(first_name="Old", last_name="Two", gender="male", reg_no="2024/2025/K3ZQ"),
+    ])
+    db.session.commit()
+
+    assert allocate_reg_nos(3) == ["AAIS/0559/008", "AAIS/0559/009", "AAIS/0559/010"]
+    assert allocate_reg_nos(1, prefix="2024/2025/") == ["2024/2025/003"]
+    assert Student.generate_reg_no("2024/2025") == "2024/2025/004"
+
+def test_reg_no_is_unique(app):
+    db.session.add_all([
+        Student(first_name="A", last_name="One", gender="male", reg_no="AAIS/0559/001"),
+        Student(first_name="B", last_name="Two", gender="male", reg_no="AAIS/0559/001"),
+    ])
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    db.session.add_all([Student(first_name="C", last_name="Three", gender="male"), Student(first_name="D", last_name="Four", gender="male")])
+    db.session.commit()
+
+def test_employee_ids_number_repeated_names(app):
+    assert generate_employee_id("John", "Doe") == "john.doe"
+    db.session.rollback()
+
+    add_teacher("john.doe")
+    add_teacher("john.doe3")
+    assert generate_employee_id("John", "Doe") == "john.doe4"
+    assert allocate_employee_id("John", "Doe") == "john.doe5"
+    assert allocate_employee_id("Jane", "Doe") == "jane.doe"
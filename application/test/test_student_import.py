@@ -0,0 +1,181 @@
+import pytest
+import io
+import logging
+import os
+import openpyxl
+from datetime import date
+from flask import url_for, g
+from application import create_app, db
+from application.models import (
+    User, Student, Session, Classes, StudentClassHistory, EnrollmentSnapshot, AdminPrivilege, AuditLog, RoleEnum
+)
+from application.jobs import job_runner
+from application.student_import import import_students, read_rows
+from application.search import search_student_ids
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a test Flask app with testing configuration and background jobs under tmp_path."""
+    os.environ["FLASK_ENV"] = "testing"
+    os.environ["SECRET_KEY"] = "test-secret-key"
+    os.environ["DB_NAME"] = ":memory:"
+
+    app = create_app(config_name="testing")
+    app.config.update(EXPORT_DIR=str(tmp_path))
+    job_runner.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """Provide a test client for the Flask app."""
+    return app.test_client()
+
+CSV = (
+    "First_Name,Last_Name,Gender,Class,Date_of_Birth,Term,Parent_Phone_Number\n"
+    "Ada,Obi,F,JSS 1,2012-03-04,,08031234567\n"
+    "Tunde,Bello,male,jss 1,,Second,\n"
+    ",Okafor,Female,JSS 1,,,\n"
+    "Emeka,Eze,Boy,SS 9,04/05/2011,,\n"
+    "Ada,Obi,Female,JSS 1,2012-03-04,,\n"
+    "\n"
+    "Ngozi,Nwosu,Female,JSS 1,31-12-2012,,\n"
+)
+
+def seed_session():
+    session = Session(year="2024/2025", is_current=True, current_term="First")
+    jss1 = Classes(name="JSS 1", section="Secondary", hierarchy=1)
+    db.session.add_all([session, jss1])
+    db.session.commit()
+    return session, jss1
+
+def run_import(session, text, dry_run=False):
+    return import_students(read_rows(io.BytesIO(text.encode()), "students.csv"), session, "First", dry_run=dry_run)
+
+def test_import_registers_valid_rows_and_reports_the_rest(app):
+    session, jss1 = seed_session()
+    existing = Student(first_name="Old", last_name="Student", gender="male", reg_no="AAIS/0559/001")
+    db.session.add(existing)
+    db.session.commit()
+
+    report = run_import(session, CSV)
+
+    assert report.rows == 6
+    assert report.errors == [
+        (4, "first_name is required"),
+        (5, "gender must be Male or Female, not 'Boy'; unknown class 'SS 9'"),
+        (6, "duplicate of row 2"),
+    ]
+    assert [reg_no for _, _, reg_no in report.imported] == ["AAIS/0559/002", "AAIS/0559/003", "AAIS/0559/004"]
+    assert report.rows_per_minute > 0
+
+    ada = Student.query.filter_by(reg_no="AAIS/0559/002").one()
+    assert (ada.first_name, ada.gender, ada.date_of_birth, ada.parent_phone_number) == ("Ada", "female", date(2012, 3, 4), "08031234567")
+    assert ada.user.username == "AAIS/0559/002" and ada.user.check_password("AAIS/0559/002")
+    assert ada.user.role == RoleEnum.STUDENT.value
+    tunde = StudentClassHistory.query.filter_by(student_id=Student.query.filter_by(last_name="Bello").one().id).one()
+    assert (tunde.class_id, tunde.start_term, tunde.is_active) == (jss1.id, "Second", True)
+    assert EnrollmentSnapshot.query.filter_by(session_id=session.id, term="First").count() == 2
+    assert list(search_student_ids("nwosu")) == [Student.query.filter_by(last_name="Nwosu").one().id]
+
+    again = run_import(session, "first_name,last_name,gender,class,date_of_birth\nAda,OBI,female,JSS 1,2012-03-04\n")
+    assert again.errors == [(2, "already registered as AAIS/0559/002")] and again.imported == []
+
+def test_dry_run_writes_nothing(app):
+    session, _ = seed_session()
+    report = run_import(session, CSV, dry_run=True)
+    assert len(report.imported) == 3 and len(report.errors) == 3
+    assert Student.query.count() == 0 and User.query.count() == 0
+
+def test_batches_and_xlsx_rows(app):
+    app.config["IMPORT_BATCH_SIZE"] = 2
+    session, _ = seed_session()
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["first_name", "last_name", "gender", "class", "date_of_birth"])
+    for i in range(5):
+        sheet.append([f"Pupil{i}", "Sheet", "Male", "JSS 1", date(2012, 1, i + 1)])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+
+    report = import_students(read_rows(buffer, "intake.xlsx"), session, "First")
+    assert report.errors == []
+    assert [row_number for row_number, _, _ in report.imported] == [2, 3, 4, 5, 6]
+    assert len({student_id for _, student_id, _ in report.imported}) == 5
+    assert Student.query.filter_by(last_name="Sheet").count() == 5
+    assert Student.query.filter_by(first_name="Pupil4").one().date_of_birth == date(2012, 1, 5)
+
+def test_failed_batch_is_reported_and_earlier_batches_kept(app):
+    app.config["IMPORT_BATCH_SIZE"] = 2
+    session, _ = seed_session()
+    # A stray account holding the third reg_no makes the last batch fail after the first has committed
+    db.session.add(User(username="AAIS/0559/003", role=RoleEnum.STUDENT.value, password_hash="x"))
+    db.session.commit()
+
+    report = run_import(session, CSV)
+    assert [reg_no for _, _, reg_no in report.imported] == ["AAIS/0559/001", "AAIS/0559/002"]
+    assert report.errors[-1] == (8, "not imported: Registration numbers already used as usernames: AAIS/0559/003")
+    assert report.stopped is None
+    assert Student.query.count() == 2
+
+def test_unreadable_file_stops_with_a_report(app):
+    session, _ = seed_session()
+    report = import_students(read_rows(io.BytesIO(b"not a workbook"), "intake.xlsx"), session, "First")
+    assert report.stopped == "intake.xlsx is not a readable .xlsx file"
+    assert report.imported == [] and report.rows == 0
+
+def login_admin(client):
+    admin = User(username="importadmin", role=RoleEnum.ADMIN.value, active=True)
+    admin.set_password("AdminPass123!")
+    db.session.add(admin)
+    db.session.flush()
+    db.session.add(AdminPrivilege(user_id=admin.id))
+    db.session.commit()
+    assert client.post(url_for("auth.login"), data={"username": "importadmin", "password": "AdminPass123!"}).status_code == 302
+
+def test_upload_route_renders_report(app, client):
+    seed_session()
+    login_admin(client)
+
+    g.pop("_login_user", None)
+    response = client.post(
+        url_for("admins.import_students_upload"),
+        data={"file": (io.BytesIO(CSV.encode()), "students.csv")},
+        content_type="multipart/form-data"
+    )
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert "3 of 6 rows registered" in html and "unknown class &#39;SS 9&#39;" in html
+    assert Student.query.count() == 3
+    assert AuditLog.query.filter_by(action="Imported 3 students from students.csv").count() == 1
+
+def test_large_upload_runs_as_background_job(app, client, tmp_path):
+    app.config["IMPORT_BACKGROUND_BYTES"] = 0
+    seed_session()
+    login_admin(client)
+
+    g.pop("_login_user", None)
+    response = client.post(
+        url_for("admins.import_students_upload"),
+        data={"file": (io.BytesIO(CSV.encode()), "students.csv")},
+        content_type="multipart/form-data"
+    )
+    assert response.status_code == 302 and "/jobs/" in response.headers["Location"]
+    job_id = response.headers["Location"].rstrip("/").split("/")[-1]
+
+    g.pop("_login_user", None)
+    job = client.get(url_for("admins.job_status", job_id=job_id, format="json")).get_json()
+    assert job["status"] == "finished" and job["filename"] == "import_report_students.csv"
+    g.pop("_login_user", None)
+    report = client.get(url_for("admins.download_job", job_id=job_id)).get_data(as_text=True).splitlines()
+    assert report[1] == "2,registered,AAIS/0559/001" and "4,error,first_name is required" in report
+    assert Student.query.count() == 3
+    assert AuditLog.query.filter_by(action="Imported 3 students from students.csv").count() == 1
+    assert not list(tmp_path.glob("import-*"))
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 import logging
 
@@ -22,6 +23,12 @@ class Config:
     DB_HOST = os.getenv("DB_HOST", "localhost")
     DB_NAME = os.getenv("DB_NAME", "school_database")
     LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.abspath(os.path.dirname(__file__)), "logs"))
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    # Per-logger overrides, e.g. LOG_LEVELS='{"sqlalchemy.pool": "ERROR"}' and LOG_SAMPLING='{"application": 0.25}'
+    LOG_LEVELS = json.loads(os.getenv("LOG_LEVELS", "{}"))
+    LOG_SAMPLING = json.loads(os.getenv("LOG_SAMPLING", "{}"))
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
@@ -36,6 +43,36 @@ class Config:
     SCHOOL_NAME = os.getenv("SCHOOL_NAME", "Aunty Anne's International School")
     REG_NO_PREFIX = os.getenv("REG_NO_PREFIX", "AAIS/0559/")
     PERMANENT_SESSION_LIFETIME = int(os.getenv("SESSION_LIFETIME", 86400))
+    CURRENT_SESSION_CACHE_TTL = int(os.getenv("CURRENT_SESSION_CACHE_TTL", 60))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1000))  # Users kept by each process's login cache
+    AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "True").lower() == "true"
+    AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 200))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 2.0))
+    EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.abspath(os.path.dirname(__file__)), "exports"))
+    JOBS_ASYNC = os.getenv("JOBS_ASYNC", "True").lower() == "true"
+    # Finished exports and their state files are deleted this many seconds after they were last written
+    EXPORT_RETENTION = int(os.getenv("EXPORT_RETENTION", 24 * 60 * 60))
+    REPORT_CARD_WORKERS = int(os.getenv("REPORT_CARD_WORKERS", os.cpu_count() or 1))
+    PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "True").lower() == "true"
+    PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.abspath(os.path.dirname(__file__)), "cache", "pdf"))
+    PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+    PAGINATION_TOTALS = os.getenv("PAGINATION_TOTALS", "True").lower() == "true"
+    PAGINATION_COUNT_TTL = int(os.getenv("PAGINATION_COUNT_TTL", 60))
+    SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 500))
+    SUBJECT_CATALOGUE_CHECK_INTERVAL = int(os.getenv("SUBJECT_CATALOGUE_CHECK_INTERVAL", 30))
+    # JSON list of [lowest total, grade, remark] bands, e.g. [[70, "A", "Excellent"], [0, "F", "Failed"]]
+    GRADE_BOUNDARIES = os.getenv("GRADE_BOUNDARIES")
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+    IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", 0)) or None  # None: one per CPU
+    # Uploads larger than this are imported as a background job instead of in the request
+    IMPORT_BACKGROUND_BYTES = int(os.getenv("IMPORT_BACKGROUND_BYTES", 256 * 1024))
+    # bcrypt cost for new hashes; older hashes are upgraded on the next successful login
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    LOGIN_HASH_WORKERS = int(os.getenv("LOGIN_HASH_WORKERS", 0)) or None  # None: one per CPU
+    LOGIN_HASH_MAX_PENDING = int(os.getenv("LOGIN_HASH_MAX_PENDING", 16))
+    LOGIN_HASH_TIMEOUT = float(os.getenv("LOGIN_HASH_TIMEOUT", 10))
+    LOGIN_RETRY_AFTER = int(os.getenv("LOGIN_RETRY_AFTER", 5))
 
     def __init__(self):
         if not self.SECRET_KEY or self.SECRET_KEY == "insecure_default_secret_key_please_change_me":
@@ -53,6 +90,9 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False
     SQLALCHEMY_ENGINE_OPTIONS = {}
     SERVER_NAME = "localhost"
+    AUDIT_ASYNC = False
+    JOBS_ASYNC = False
+    PDF_CACHE_ENABLED = False
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -0,0 +1,66 @@
+"""Add student_search_token table
+
+Revision ID: 2b8e6f1c4d57
+Revises: 9d2f4b6e8a13
+Create Date: 2026-10-18 14:05:12.604318
+
+Tokens are derived in Python (accent folding, typo deletions), so the upgrade indexes existing students with
+application.search.student_tokens rather than in SQL.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from application.search import student_tokens
+
+
+# revision identifiers, used by Alembic.
+revision = '2b8e6f1c4d57'
+down_revision = '9d2f4b6e8a13'
+branch_labels = None
+depends_on = None
+
+BACKFILL_CHUNK_SIZE = 500
+TOKEN_MAX_LENGTH = 64
+
+
+def backfill(bind):
+    """Index every existing student, reading and inserting in chunks; returns the number indexed."""
+    tokens = sa.table('student_search_token', sa.column('kind'), sa.column('token'), sa.column('student_id'))
+    count = 0
+    last_id = 0
+    while True:
+        students = bind.execute(sa.text(
+            "SELECT id, first_name, middle_name, last_name, reg_no FROM student WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BACKFILL_CHUNK_SIZE}).all()
+        if not students:
+            return count
+        rows = [
+            {"kind": kind, "token": token[:TOKEN_MAX_LENGTH], "student_id": student.id}
+            for student in students for kind, token in student_tokens(student)
+        ]
+        if rows:
+            bind.execute(tokens.insert(), rows)
+        count += len(students)
+        last_id = students[-1].id
+
+
+def upgrade():
+    op.create_table('student_search_token',
+    sa.Column('kind', sa.SmallInteger(), autoincrement=False, nullable=False),
+    sa.Column('token', sa.String(length=64), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('kind', 'token', 'student_id')
+    )
+    with op.batch_alter_table('student_search_token', schema=None) as batch_op:
+        batch_op.create_index('idx_search_token_student', ['student_id'], unique=False)
+
+    backfill(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('student_search_token', schema=None) as batch_op:
+        batch_op.drop_index('idx_search_token_student')
+
+    op.drop_table('student_search_token')
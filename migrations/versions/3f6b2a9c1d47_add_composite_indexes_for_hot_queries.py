@@ -0,0 +1,47 @@
+"""Add composite indexes for hot result, summary, enrollment and fee queries
+
+Revision ID: 3f6b2a9c1d47
+Revises: d8c5de272a73
+Create Date: 2026-10-18 09:12:41.503118
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2a9c1d47'
+down_revision = 'd8c5de272a73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('result', schema=None) as batch_op:
+        batch_op.create_index('idx_result_student_session_term', ['student_id', 'session_id', 'term', 'class_id'], unique=False)
+        batch_op.create_index('idx_result_class_term', ['session_id', 'term', 'class_id', 'student_id'], unique=False)
+
+    with op.batch_alter_table('student_term_summary', schema=None) as batch_op:
+        batch_op.create_index('idx_term_summary_student_session', ['student_id', 'session_id', 'term', 'class_id'], unique=False)
+        batch_op.create_index('idx_term_summary_class_term', ['session_id', 'term', 'class_id', 'term_average'], unique=False)
+
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.create_index('idx_class_history_session_class', ['session_id', 'class_id', 'is_active', 'leave_date'], unique=False)
+
+    with op.batch_alter_table('fee_payment', schema=None) as batch_op:
+        batch_op.create_index('idx_fee_payment_session_term_paid', ['session_id', 'term', 'has_paid_fee', 'student_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('fee_payment', schema=None) as batch_op:
+        batch_op.drop_index('idx_fee_payment_session_term_paid')
+
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.drop_index('idx_class_history_session_class')
+
+    with op.batch_alter_table('student_term_summary', schema=None) as batch_op:
+        batch_op.drop_index('idx_term_summary_class_term')
+        batch_op.drop_index('idx_term_summary_student_session')
+
+    with op.batch_alter_table('result', schema=None) as batch_op:
+        batch_op.drop_index('idx_result_class_term')
+        batch_op.drop_index('idx_result_student_session_term')
@@ -0,0 +1,42 @@
+"""Add id_sequence table and a unique index on student.reg_no
+
+Revision ID: 4c7d2a9e5f18
+Revises: 6e1a9c3f7b20
+Create Date: 2026-10-18 17:21:06.530912
+
+Counters are created and seeded from existing rows on first use, so no data migration is needed. The upgrade
+stops with the offending values if two students already share a registration number.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7d2a9e5f18'
+down_revision = '6e1a9c3f7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT reg_no FROM student WHERE reg_no IS NOT NULL GROUP BY reg_no HAVING COUNT(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Resolve duplicate registration numbers before upgrading: {', '.join(duplicates)}")
+
+    op.create_table('id_sequence',
+    sa.Column('name', sa.String(length=150), nullable=False),
+    sa.Column('next_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.create_index('uq_student_reg_no', ['reg_no'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('student', schema=None) as batch_op:
+        batch_op.drop_index('uq_student_reg_no')
+
+    op.drop_table('id_sequence')
@@ -0,0 +1,70 @@
+"""Add enrollment_snapshot table
+
+Revision ID: 5c7e9d1a3b64
+Revises: 8a41c7e2b5d9
+Create Date: 2026-10-18 11:02:36.871204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c7e9d1a3b64'
+down_revision = '8a41c7e2b5d9'
+branch_labels = None
+depends_on = None
+
+# Same rules as application.enrollment.snapshot_rows: a student's latest enrollment in a session,
+# if still active, yields one row for every term it covers.
+BACKFILL = """
+INSERT INTO enrollment_snapshot (session_id, term, student_id, class_id, hierarchy, approved, fee_paid)
+SELECT h.session_id, t.term, h.student_id, h.class_id, c.hierarchy, s.approved,
+       CASE WHEN EXISTS (
+           SELECT 1 FROM fee_payment f
+           WHERE f.student_id = h.student_id AND f.session_id = h.session_id
+             AND f.term = t.term AND f.has_paid_fee = 1
+       ) THEN 1 ELSE 0 END
+FROM student_class_history h
+JOIN student s ON s.id = h.student_id
+LEFT JOIN classes c ON c.id = h.class_id
+JOIN (SELECT 'First' AS term, 1 AS ord UNION ALL SELECT 'Second', 2 UNION ALL SELECT 'Third', 3) t
+  ON t.ord BETWEEN h.start_term_ord AND h.end_term_ord
+WHERE h.is_active = 1 AND h.leave_date IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM student_class_history n
+      WHERE n.student_id = h.student_id AND n.session_id = h.session_id
+        AND (n.join_date > h.join_date OR (n.join_date = h.join_date AND n.id > h.id))
+  )
+"""
+
+
+def upgrade():
+    op.create_table('enrollment_snapshot',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.Enum('First', 'Second', 'Third', name='termenum'), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=True),
+    sa.Column('hierarchy', sa.Integer(), nullable=True),
+    sa.Column('approved', sa.Boolean(), nullable=False),
+    sa.Column('fee_paid', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['session.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('session_id', 'term', 'student_id')
+    )
+    with op.batch_alter_table('enrollment_snapshot', schema=None) as batch_op:
+        batch_op.create_index('idx_enrollment_snapshot_class', ['session_id', 'term', 'class_id', 'approved', 'fee_paid'], unique=False)
+        batch_op.create_index('idx_enrollment_snapshot_hierarchy', ['session_id', 'term', 'hierarchy', 'student_id'], unique=False)
+        batch_op.create_index('idx_enrollment_snapshot_student', ['student_id'], unique=False)
+
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('idx_enrollment_snapshot_student')
+        batch_op.drop_index('idx_enrollment_snapshot_hierarchy')
+        batch_op.drop_index('idx_enrollment_snapshot_class')
+
+    op.drop_table('enrollment_snapshot')
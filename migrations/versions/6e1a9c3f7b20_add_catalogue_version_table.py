@@ -0,0 +1,28 @@
+"""Add catalogue_version table
+
+Revision ID: 6e1a9c3f7b20
+Revises: 2b8e6f1c4d57
+Create Date: 2026-10-18 15:32:40.118274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1a9c3f7b20'
+down_revision = '2b8e6f1c4d57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalogue_version',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('catalogue_version')
@@ -0,0 +1,26 @@
+"""Add user.cache_version
+
+Revision ID: 7b3e5d9a1c42
+Revises: 4c7d2a9e5f18
+Create Date: 2026-10-18 19:12:44.207315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e5d9a1c42'
+down_revision = '4c7d2a9e5f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('cache_version')
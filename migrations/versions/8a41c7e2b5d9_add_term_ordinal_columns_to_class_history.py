@@ -0,0 +1,50 @@
+"""Add generated term ordinal columns to student_class_history
+
+Revision ID: 8a41c7e2b5d9
+Revises: 3f6b2a9c1d47
+Create Date: 2026-10-18 10:05:17.228394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a41c7e2b5d9'
+down_revision = '3f6b2a9c1d47'
+branch_labels = None
+depends_on = None
+
+START_TERM_ORD = "CASE start_term WHEN 'First' THEN 1 WHEN 'Second' THEN 2 WHEN 'Third' THEN 3 ELSE 1 END"
+END_TERM_ORD = "CASE end_term WHEN 'First' THEN 1 WHEN 'Second' THEN 2 WHEN 'Third' THEN 3 ELSE 4 END"
+
+
+def upgrade():
+    # Stored generated columns are computed for every existing row when added, which backfills them
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('start_term_ord', sa.SmallInteger(), sa.Computed(START_TERM_ORD, persisted=True)))
+        batch_op.add_column(sa.Column('end_term_ord', sa.SmallInteger(), sa.Computed(END_TERM_ORD, persisted=True)))
+
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.drop_index('idx_class_history_session_class')
+        batch_op.create_index(
+            'idx_class_history_session_class',
+            ['session_id', 'class_id', 'is_active', 'leave_date', 'start_term_ord', 'end_term_ord'],
+            unique=False
+        )
+        batch_op.create_index(
+            'idx_class_history_session_term',
+            ['session_id', 'is_active', 'leave_date', 'start_term_ord', 'end_term_ord'],
+            unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.drop_index('idx_class_history_session_term')
+        batch_op.drop_index('idx_class_history_session_class')
+        batch_op.create_index('idx_class_history_session_class', ['session_id', 'class_id', 'is_active', 'leave_date'], unique=False)
+
+    with op.batch_alter_table('student_class_history', schema=None) as batch_op:
+        batch_op.drop_column('end_term_ord')
+        batch_op.drop_column('start_term_ord')
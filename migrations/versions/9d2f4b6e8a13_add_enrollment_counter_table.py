@@ -0,0 +1,43 @@
+"""Add enrollment_counter table
+
+Revision ID: 9d2f4b6e8a13
+Revises: 5c7e9d1a3b64
+Create Date: 2026-10-18 12:20:48.330517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f4b6e8a13'
+down_revision = '5c7e9d1a3b64'
+branch_labels = None
+depends_on = None
+
+BACKFILL = """
+INSERT INTO enrollment_counter (session_id, term, class_id, total, approved, fees_paid)
+SELECT session_id, term, COALESCE(class_id, 0), COUNT(*),
+       SUM(CASE WHEN approved = 1 THEN 1 ELSE 0 END),
+       SUM(CASE WHEN fee_paid = 1 THEN 1 ELSE 0 END)
+FROM enrollment_snapshot
+GROUP BY session_id, term, COALESCE(class_id, 0)
+"""
+
+
+def upgrade():
+    op.create_table('enrollment_counter',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('term', sa.Enum('First', 'Second', 'Third', name='termenum'), nullable=False),
+    sa.Column('class_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('approved', sa.Integer(), nullable=False),
+    sa.Column('fees_paid', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['session.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('session_id', 'term', 'class_id')
+    )
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('enrollment_counter')
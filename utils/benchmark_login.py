@@ -0,0 +1,66 @@
+"""Measure password checks (logins) per second per worker at several bcrypt costs, through the login verifier.
+
+Run with: FLASK_ENV=testing SECRET_KEY=x DB_NAME=":memory:" python -m utils.benchmark_login [SECONDS] [COSTS...]
+Each cost is run with LOGIN_HASH_WORKERS from 1 to the CPU count while twice as many clients as the verifier
+admits keep logging in, so the rejected column shows how many requests would have been turned away with a 503.
+"""
+import os
+import sys
+import threading
+import time
+
+from application import bcrypt, create_app
+from application.passwords import VerifierBusy, password_verifier
+
+PASSWORD = "AAIS/0559/001"
+
+
+class Account:
+    def __init__(self, password_hash):
+        self.password_hash = password_hash
+
+
+def run(app, cost, workers, seconds):
+    app.config.update(BCRYPT_LOG_ROUNDS=cost, LOGIN_HASH_WORKERS=workers, LOGIN_HASH_MAX_PENDING=workers * 2)
+    bcrypt.init_app(app)
+    password_verifier.init_app(app)
+    password_hash = bcrypt.generate_password_hash(PASSWORD).decode("utf-8")
+    counts = {"ok": 0, "rejected": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            try:
+                outcome = "ok" if password_verifier.verify(Account(password_hash), PASSWORD) else "failed"
+            except VerifierBusy:
+                outcome = "rejected"
+                time.sleep(0.01)
+            with lock:
+                counts[outcome] = counts.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(workers * 4)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return counts["ok"] / elapsed, counts["rejected"]
+
+
+def main(seconds, costs):
+    app = create_app(config_name="testing")
+    print(f"{'cost':>4} {'workers':>7} {'logins/s':>9} {'per worker':>10} {'rejected':>8}")
+    for cost in costs:
+        for workers in range(1, (os.cpu_count() or 1) + 1):
+            rate, rejected = run(app, cost, workers, seconds)
+            print(f"{cost:>4} {workers:>7} {rate:>9.1f} {rate / workers:>10.1f} {rejected:>8}")
+    password_verifier.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        [int(cost) for cost in sys.argv[2:]] or [8, 10, 12],
+    )
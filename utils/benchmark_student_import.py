@@ -0,0 +1,46 @@
+"""Measure bulk student import throughput (rows per minute) on a synthetic CSV.
+
+Run with: FLASK_ENV=testing SECRET_KEY=x DB_NAME=":memory:" python -m utils.benchmark_student_import [ROWS]
+Password hashing dominates; IMPORT_HASH_WORKERS and BCRYPT_LOG_ROUNDS change the result most.
+"""
+import io
+import random
+import sys
+
+from application import create_app, db
+from application.models import Classes, Session
+from application.student_import import import_students, read_rows
+from utils.benchmark_student_search import FIRST_NAMES, LAST_NAMES
+
+CLASSES = ["JSS 1", "JSS 2", "JSS 3", "SS 1", "SS 2", "SS 3"]
+
+
+def synthetic_csv(rows, rng):
+    lines = ["first_name,middle_name,last_name,gender,class,date_of_birth,parent_phone_number"]
+    for i in range(rows):
+        lines.append(",".join([
+            rng.choice(FIRST_NAMES), rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice(["Male", "Female"]),
+            rng.choice(CLASSES), f"20{rng.randint(8, 14):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            f"080{rng.randint(10000000, 99999999)}",
+        ]))
+    return "\n".join(lines).encode()
+
+
+def main(rows):
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        session = Session(year="2024/2025", is_current=True, current_term="First")
+        db.session.add(session)
+        db.session.add_all(Classes(name=name, section="Secondary", hierarchy=level) for level, name in enumerate(CLASSES, 1))
+        db.session.commit()
+
+        data = synthetic_csv(rows, random.Random(7))
+        report = import_students(read_rows(io.BytesIO(data), "bench.csv"), session, "First")
+        print(f"Imported {len(report.imported)} of {report.rows} rows in {report.elapsed:.1f}s "
+              f"({report.rows_per_minute} rows/minute), {len(report.errors)} errors")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,73 @@
+"""Compare the old substring filter with the indexed student search on a synthetic 20k-student school.
+
+Run with: FLASK_ENV=testing SECRET_KEY=x DB_NAME=":memory:" python -m utils.benchmark_student_search
+"""
+import random
+import time
+
+from sqlalchemy import func, insert, or_
+
+from application import create_app, db
+from application.models import Student
+from application.search import rebuild_search_index, search_student_ids
+
+STUDENTS = 20_000
+REPEATS = 20
+FIRST_NAMES = ["Chinedu", "Amaka", "Tunde", "Ngozi", "Emeka", "Aisha", "Ibrahim", "Funmilayo", "Kelechi", "Zainab",
+               "Obinna", "Yetunde", "Chiamaka", "Segun", "Halima", "Uchenna", "Bola", "Nneka", "Musa", "Temitope"]
+LAST_NAMES = ["Okafor", "Adeyemi", "Okonkwo", "Balogun", "Eze", "Bello", "Nwosu", "Adebayo", "Obi", "Abubakar",
+              "Chukwu", "Ogunleye", "Nnamdi", "Lawal", "Afolabi", "Ibekwe", "Danjuma", "Oyelaran", "Onyeka", "Yusuf"]
+QUERIES = ["okafor", "chin", "amaka okonkwo", "okafr", "0559/1234", "12345", "zainab yusuf", "temitop"]
+
+
+def seed(rng):
+    rows = [
+        {
+            "first_name": rng.choice(FIRST_NAMES),
+            "middle_name": rng.choice(FIRST_NAMES) if rng.random() < 0.5 else None,
+            "last_name": rng.choice(LAST_NAMES) + rng.choice(["", "", "-" + rng.choice(LAST_NAMES)]),
+            "reg_no": f"AAIS/0559/{i:05d}",
+            "gender": rng.choice(["Male", "Female"]),
+        }
+        for i in range(1, STUDENTS + 1)
+    ]
+    for offset in range(0, len(rows), 1000):
+        db.session.execute(insert(Student), rows[offset:offset + 1000])
+    db.session.commit()
+
+
+def substring_search(query):
+    q = query.lower()
+    return [student_id for (student_id,) in db.session.query(Student.id).filter(or_(
+        func.lower(Student.first_name).contains(q),
+        func.lower(Student.last_name).contains(q),
+        func.lower(Student.reg_no).contains(q),
+    ))]
+
+
+def timed(function, query):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = function(query)
+    return (time.perf_counter() - start) / REPEATS * 1000, len(result)
+
+
+def main():
+    app = create_app(config_name="testing")
+    with app.app_context():
+        db.create_all()
+        seed(random.Random(42))
+        start = time.perf_counter()
+        rebuild_search_index()
+        print(f"Indexed {STUDENTS} students in {time.perf_counter() - start:.2f}s")
+
+        print(f"{'query':<16}{'substring ms':>14}{'hits':>7}{'indexed ms':>12}{'hits':>7}")
+        for query in QUERIES:
+            old_ms, old_hits = timed(substring_search, query)
+            new_ms, new_hits = timed(search_student_ids, query)
+            print(f"{query:<16}{old_ms:>14.2f}{old_hits:>7}{new_ms:>12.2f}{new_hits:>7}")
+        db.drop_all()
+
+
+if __name__ == "__main__":
+    main()